@@ -0,0 +1,157 @@
+# admission.py
+import math
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from scheduler import GenerationScheduler
+
+logger = logging.getLogger(__name__)
+
+class Overloaded(Exception):
+    """A request was refused to keep latency bounded; retry after retry_after seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    """Retry-After header for a delay, in whole seconds and at least 1"""
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+class RateLimiter:
+    """
+    Per-client token buckets
+
+    Each client may send `burst` requests at once, refilled at `rate`
+    requests per second. Buckets of the least recently seen clients are
+    dropped past max_clients; a dropped client simply starts full again.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        # client -> (tokens, last refill)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def acquire(self, client: str) -> float:
+        """
+        Take one token for the client
+
+        Returns:
+            float: 0 if the request may proceed, else seconds until a token is available
+        """
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(client, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+            if tokens >= 1.0:
+                tokens -= 1.0
+                wait = 0.0
+                self.allowed += 1
+            else:
+                wait = (1.0 - tokens) / self.rate
+                self.limited += 1
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self) -> Dict[str, Any]:
+        return {"clients": len(self._buckets), "allowed": self.allowed, "limited": self.limited}
+
+class Reservation:
+    """
+    An admitted request's place in line before it reaches the generation queue
+
+    Counted by AdmissionController until released, which happens when the
+    request enters the scheduler (where it is counted as a waiter) or
+    finishes. Releasing twice is harmless; usable as a context manager.
+    """
+
+    def __init__(self, controller: Optional["AdmissionController"], degraded: bool = False):
+        self._controller = controller
+        self.degraded = degraded
+
+    def release(self) -> None:
+        if self._controller is not None:
+            self._controller.pending -= 1
+            self._controller = None
+
+    def __enter__(self) -> "Reservation":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+class AdmissionController:
+    """
+    Sheds load before the generation queue outgrows what can be served in time
+
+    A request is admitted while the scheduler's estimated wait for it,
+    derived from queue depth and recent generation time, stays under
+    max_queue_wait, and fewer than max_queue requests of the same or higher
+    priority are waiting, so a backlog of low-priority requests never sheds
+    high-priority ones that would be served ahead of it. Anything
+    beyond that would only wait until its deadline, so it is refused (or
+    degraded) right away instead. 0 disables either limit.
+
+    Requests admitted but still retrieving have not reached the queue yet;
+    their reservations are counted as waiters too, so a burst cannot get
+    past the limits before any of it is queued.
+    """
+
+    def __init__(self, scheduler: GenerationScheduler, max_queue_wait: float = 30.0, max_queue: int = 64):
+        self.scheduler = scheduler
+        self.max_queue_wait = max_queue_wait
+        self.max_queue = max_queue
+        self.admitted = 0
+        self.shed = 0
+        # Reservations not yet released
+        self.pending = 0
+
+    def check(self, priority: int = 0) -> Optional[float]:
+        """
+        Returns:
+            Optional[float]: None to admit, else a suggested retry delay in seconds
+        """
+        estimated = self.scheduler.estimated_wait(priority, self.pending)
+        # Pending requests that will find a free slot do not wait
+        free = max(0, self.scheduler.max_in_flight - self.scheduler.in_flight)
+        depth = self.scheduler.queue_depth_at(priority) + max(0, self.pending - free)
+        if self.max_queue_wait > 0 and estimated > self.max_queue_wait:
+            # Roughly when the queue will have drained below the limit
+            retry_after = estimated - self.max_queue_wait
+        elif self.max_queue > 0 and depth >= self.max_queue:
+            retry_after = (depth - self.max_queue + 1) / self.scheduler.max_in_flight * self.scheduler.service_time
+        else:
+            self.admitted += 1
+            return None
+        self.shed += 1
+        logger.info(f"Shedding request: queue_depth={depth} estimated_wait={estimated:.1f}s")
+        return max(1.0, retry_after)
+
+    def reserve(self, degraded: bool = False) -> Reservation:
+        """Count an admitted request until it is queued or done"""
+        self.pending += 1
+        return Reservation(self, degraded)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "pending": self.pending,
+            "estimated_wait_s": self.scheduler.estimated_wait(pending=self.pending)
+        }
@@ -0,0 +1 @@
+# benchmarks package: reproducible measurements of the chatbot pipeline
@@ -0,0 +1,90 @@
+# benchmarks/chunking.py
+"""
+Compare whole-file documents with token-budgeted chunks
+
+Usage:
+    python -m benchmarks.chunking --knowledge knowledge [--generate] [--output result.json]
+
+Reports the system prompt size (estimated tokens) per query and, with
+--generate, the end-to-end process_message latency against Ollama.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from chatbot import Chatbot, ChatbotConfig, load_knowledge_files
+from knowledge_loader import count_tokens
+
+DEFAULT_QUERIES = [
+    "When are you open?",
+    "How can I contact support?",
+    "How much does delivery cost?",
+    "How long does delivery take?",
+    "What does the company do?",
+]
+
+# A budget no file reaches reproduces the old one-document-per-file behaviour
+WHOLE_FILE_TOKENS = 10 ** 9
+
+async def run_variant(name: str, knowledge: str, max_tokens: int, overlap_tokens: int,
+                      queries: List[str], generate: bool) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as persist_dir:
+        config = ChatbotConfig(
+            KNOWLEDGE_BASE_DIR=persist_dir,
+            CHUNK_MAX_TOKENS=max_tokens,
+            CHUNK_OVERLAP_TOKENS=overlap_tokens,
+            KNOWLEDGE_WATCH=False
+        )
+        bot = Chatbot(config)
+        documents = load_knowledge_files(knowledge, max_tokens, overlap_tokens)
+        bot.sync_knowledge(documents)
+
+        prompt_tokens, latencies = [], []
+        for query in queries:
+            context_docs = await bot.search_knowledge(query)
+            messages, _ = bot._build_messages(query, context_docs, [])
+            prompt_tokens.append(sum(count_tokens(m["content"]) for m in messages))
+            if generate:
+                start = time.perf_counter()
+                await bot.process_message(query, session_id=f"bench-{name}")
+                latencies.append(time.perf_counter() - start)
+        bot.close()
+
+    result = {
+        "variant": name,
+        "chunks": len(documents),
+        "prompt_tokens_mean": statistics.mean(prompt_tokens),
+        "prompt_tokens_max": max(prompt_tokens),
+    }
+    if latencies:
+        result["latency_mean_s"] = statistics.mean(latencies)
+        result["latency_max_s"] = max(latencies)
+    return result
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--knowledge", default="knowledge", help="Directory with .txt knowledge files")
+    parser.add_argument("--max-tokens", type=int, default=ChatbotConfig().CHUNK_MAX_TOKENS)
+    parser.add_argument("--overlap-tokens", type=int, default=ChatbotConfig().CHUNK_OVERLAP_TOKENS)
+    parser.add_argument("--generate", action="store_true", help="Also measure end-to-end latency via Ollama")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = [
+        await run_variant("whole_file", args.knowledge, WHOLE_FILE_TOKENS, 0, DEFAULT_QUERIES, args.generate),
+        await run_variant("chunked", args.knowledge, args.max_tokens, args.overlap_tokens,
+                          DEFAULT_QUERIES, args.generate),
+    ]
+
+    for result in results:
+        print(json.dumps(result))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
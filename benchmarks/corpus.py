@@ -0,0 +1,86 @@
+# benchmarks/corpus.py
+"""
+Synthetic knowledge corpus for benchmarks
+
+Usage:
+    python -m benchmarks.corpus DIR [--docs 1000] [--words 150] [--seed 0]
+
+Writes `docs` .txt files (1 to 100k) of company-style facts into DIR,
+1000 per subdirectory. Generation is deterministic for a given seed, so
+runs on different commits index exactly the same text.
+"""
+import argparse
+import os
+import random
+from typing import List, Tuple
+
+MAX_DOCS = 100_000
+FILES_PER_DIR = 1000
+
+TOPICS = ["delivery", "returns", "warranty", "payment", "opening hours", "support",
+          "discounts", "gift cards", "installation", "repairs", "accounts", "privacy"]
+PRODUCTS = ["kettle", "toaster", "blender", "fan", "heater", "lamp", "vacuum", "mixer",
+            "router", "speaker", "monitor", "keyboard"]
+CITIES = ["Berlin", "Lisbon", "Oslo", "Prague", "Dublin", "Vienna", "Madrid", "Warsaw"]
+FILLER = ("customers can expect a reply within two business days and every request is handled "
+          "by a trained specialist who follows the published company policy for the region").split()
+
+def _sku(i: int) -> str:
+    return f"SKU-{100000 + i}"
+
+def document_text(i: int, words: int = 150, seed: int = 0) -> str:
+    """Text of synthetic document i, about `words` words long"""
+    rng = random.Random(seed * MAX_DOCS + i)
+    topic = TOPICS[i % len(TOPICS)]
+    product = PRODUCTS[(i // len(TOPICS)) % len(PRODUCTS)]
+    city = rng.choice(CITIES)
+    sentences = [
+        f"{topic.capitalize()} policy for the {product} {_sku(i)} sold in {city}.",
+        f"The {topic} period for {_sku(i)} is {rng.randint(7, 60)} days.",
+        f"Call {city} support at +49 30 {rng.randint(1000000, 9999999)} for {topic} questions.",
+    ]
+    used = sum(len(s.split()) for s in sentences)
+    while used < words:
+        length = rng.randint(8, 16)
+        sentence = " ".join(rng.choice(FILLER) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        used += length
+    return "\n\n".join(sentences)
+
+def write_corpus(directory: str, docs: int, words: int = 150, seed: int = 0) -> List[str]:
+    """Write the corpus to a directory and return the file paths"""
+    if not 1 <= docs <= MAX_DOCS:
+        raise ValueError(f"docs must be between 1 and {MAX_DOCS}")
+    paths = []
+    for i in range(docs):
+        subdir = os.path.join(directory, f"part{i // FILES_PER_DIR:03d}")
+        os.makedirs(subdir, exist_ok=True)
+        path = os.path.join(subdir, f"doc{i:06d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(document_text(i, words, seed))
+        paths.append(path)
+    return paths
+
+def queries(docs: int, n: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """Return n (query, expected source file name) pairs answerable from the corpus"""
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(n):
+        i = rng.randrange(docs)
+        topic = TOPICS[i % len(TOPICS)]
+        pairs.append((f"What is the {topic} period for {_sku(i)}?", f"doc{i:06d}.txt"))
+    return pairs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--words", type=int, default=150)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = write_corpus(args.directory, args.docs, args.words, args.seed)
+    print(f"Wrote {len(paths)} documents to {args.directory}")
+
+if __name__ == "__main__":
+    main()
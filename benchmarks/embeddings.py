@@ -0,0 +1,111 @@
+# benchmarks/embeddings.py
+"""
+Parity and throughput of the embedding engines
+
+Usage:
+    python -m benchmarks.embeddings [--engines sentence-transformers onnx onnx-int8]
+                                    [--threads 0 4] [--chunks 512] [--queries 200]
+                                    [--output result.json]
+
+Parity: every engine embeds the same texts as the sentence-transformers
+reference; the minimum and mean cosine similarity are reported and the run
+exits with status 1 if an engine falls below --min-cosine (--min-cosine-int8
+for quantized engines).
+
+Throughput, in sentences/sec:
+    single  one query per call, as the chat path embeds queries
+    bulk    knowledge chunks in batches of --batch, as ingestion does
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks import corpus
+from embeddings import DEFAULT_MODEL, create_embedding_engine
+from knowledge_loader import iter_chunks
+
+REFERENCE = "sentence-transformers"
+
+def build_engine(name: str, model: str, threads: int, batch: int, cache_dir: str):
+    quantize = name.endswith("-int8")
+    engine = name[:-len("-int8")] if quantize else name
+    return create_embedding_engine(engine, model, threads=threads, quantize=quantize,
+                                   cache_dir=cache_dir, max_batch=batch)
+
+def texts(chunks: int, queries: int, max_tokens: int = 256) -> Dict[str, List[str]]:
+    bulk: List[str] = []
+    i = 0
+    while len(bulk) < chunks:
+        bulk.extend(iter_chunks(corpus.document_text(i, words=400), max_tokens, 32))
+        i += 1
+    return {"bulk": bulk[:chunks], "single": [q for q, _ in corpus.queries(max(i, 1), queries)]}
+
+def cosine(a: List[List[float]], b: List[List[float]]) -> np.ndarray:
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    return np.einsum("ij,ij->i", a, b)
+
+def throughput(engine, samples: Dict[str, List[str]], batch: int) -> Dict[str, float]:
+    engine(["warm up"])
+    start = time.perf_counter()
+    for query in samples["single"]:
+        engine([query])
+    single = len(samples["single"]) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(0, len(samples["bulk"]), batch):
+        engine(samples["bulk"][i:i + batch])
+    bulk = len(samples["bulk"]) / (time.perf_counter() - start)
+    return {"single_per_sec": round(single, 1), "bulk_per_sec": round(bulk, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", nargs="+", default=[REFERENCE, "onnx", "onnx-int8"])
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--threads", type=int, nargs="+", default=[0], help="Intra-op thread counts to try")
+    parser.add_argument("--chunks", type=int, default=512, help="Texts for the bulk mode")
+    parser.add_argument("--queries", type=int, default=200, help="Texts for the single-query mode")
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--min-cosine", type=float, default=0.999)
+    parser.add_argument("--min-cosine-int8", type=float, default=0.98)
+    parser.add_argument("--cache-dir", default="./knowledge_base/onnx", help="Where ONNX exports are kept")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    samples = texts(args.chunks, args.queries)
+    parity_texts = samples["single"][:100] + samples["bulk"][:100]
+    reference = build_engine(REFERENCE, args.model, 0, args.batch, args.cache_dir)(parity_texts)
+
+    results: List[Dict[str, Any]] = []
+    failed = False
+    for name in args.engines:
+        for threads in args.threads:
+            engine = build_engine(name, args.model, threads, args.batch, args.cache_dir)
+            similarity = cosine(engine(parity_texts), reference)
+            minimum = args.min_cosine_int8 if name.endswith("-int8") else args.min_cosine
+            result = {
+                "engine": name,
+                "threads": threads,
+                "cosine_min": round(float(similarity.min()), 5),
+                "cosine_mean": round(float(statistics.mean(similarity.tolist())), 5),
+                "parity": bool(similarity.min() >= minimum),
+                **throughput(engine, samples, args.batch)
+            }
+            failed |= not result["parity"]
+            results.append(result)
+            print(json.dumps(result))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# benchmarks/fake_ollama.py
+"""
+Stand-in for the Ollama HTTP API with configurable speed
+
+Usage:
+    python -m benchmarks.fake_ollama [--port 11435] [--latency 0.2] [--tokens-per-sec 40]
+                                     [--response-tokens 64] [--parallel 4]
+
+Implements the endpoints the chatbot uses (/api/chat and /api/generate,
+streamed as NDJSON or not) plus /api/version and /api/tags. Each request
+waits `latency` seconds plus prompt_tokens / prefill-tokens-per-sec
+(prefill), then emits `response-tokens` tokens at `tokens-per-sec`. At most
+`parallel` requests are served at once, like OLLAMA_NUM_PARALLEL; the rest
+queue. Point the chatbot at it with OLLAMA_HOST=http://127.0.0.1:PORT.
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+from knowledge_loader import count_tokens
+
+WORDS = ["Our", "team", "is", "happy", "to", "help", "with", "your", "question", "about",
+         "orders,", "delivery", "and", "returns.", "Please", "contact", "support", "anytime."]
+
+def create_app(latency: float = 0.2, tokens_per_sec: float = 40.0, response_tokens: int = 64,
+               prefill_tokens_per_sec: float = 2000.0, parallel: int = 4) -> FastAPI:
+    """Build the fake Ollama app with the given speed profile"""
+    app = FastAPI()
+    slots = asyncio.Semaphore(parallel)
+
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def _prompt_tokens(body: Dict[str, Any]) -> int:
+        if "messages" in body:
+            return sum(count_tokens(m.get("content", "")) for m in body["messages"])
+        return count_tokens(body.get("prompt", ""))
+
+    async def _generate(body: Dict[str, Any], chat: bool) -> AsyncIterator[Dict[str, Any]]:
+        async with slots:
+            start = time.perf_counter()
+            prompt_tokens = _prompt_tokens(body)
+            # An empty generate request only loads the model
+            n_tokens = 0 if not chat and not body.get("prompt") else response_tokens
+
+            await asyncio.sleep(latency + prompt_tokens / prefill_tokens_per_sec)
+            prefill_done = time.perf_counter()
+
+            for i in range(n_tokens):
+                await asyncio.sleep(1.0 / tokens_per_sec)
+                content = WORDS[i % len(WORDS)] + " "
+                chunk = {"model": body.get("model", "fake"), "created_at": _now(), "done": False}
+                if chat:
+                    chunk["message"] = {"role": "assistant", "content": content}
+                else:
+                    chunk["response"] = content
+                yield chunk
+
+            end = time.perf_counter()
+            final = {
+                "model": body.get("model", "fake"),
+                "created_at": _now(),
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int((end - start) * 1e9),
+                "load_duration": 0,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int((prefill_done - start) * 1e9),
+                "eval_count": n_tokens,
+                "eval_duration": int((end - prefill_done) * 1e9)
+            }
+            if chat:
+                final["message"] = {"role": "assistant", "content": ""}
+            else:
+                final["response"] = ""
+            yield final
+
+    async def _respond(request: Request, chat: bool):
+        body = await request.json()
+        if body.get("stream", True):
+            async def ndjson():
+                async for chunk in _generate(body, chat):
+                    yield json.dumps(chunk) + "\n"
+            return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+        parts = []
+        async for chunk in _generate(body, chat):
+            parts.append(chunk["message"]["content"] if chat else chunk["response"])
+        # The last chunk carries the timings; give it the whole answer
+        if chat:
+            chunk["message"]["content"] = "".join(parts)
+        else:
+            chunk["response"] = "".join(parts)
+        return JSONResponse(chunk)
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        return await _respond(request, chat=True)
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        return await _respond(request, chat=False)
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "0.0.0-fake"}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "fake", "model": "fake"}]}
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fixed seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--response-tokens", type=int, default=64)
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=2000.0)
+    parser.add_argument("--parallel", type=int, default=4, help="Requests served at once")
+    args = parser.parse_args()
+
+    app = create_app(args.latency, args.tokens_per_sec, args.response_tokens,
+                     args.prefill_tokens_per_sec, args.parallel)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/retrieval_relevance.py
+"""
+Relevance of dense vs hybrid (BM25 + vector) retrieval
+
+Usage:
+    python -m benchmarks.retrieval_relevance [--output result.json]
+
+Indexes a small labelled corpus of store facts full of exact tokens (phone
+numbers, SKUs, street names) and reports hit rate and MRR of dense top-5
+against hybrid top-3, plus mean per-query retrieval time.
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+from chatbot import KnowledgeBase
+
+STREETS = ["Baker Street", "Elm Avenue", "Harbor Road", "Maple Lane", "Cedar Court",
+           "Station Square", "Mill Street", "Ocean Drive", "Kingsway", "Birch Boulevard"]
+
+def build_corpus() -> Tuple[List[Dict[str, Any]], List[Tuple[str, str]]]:
+    """Return (documents, [(query, expected chunk id)])"""
+    documents, queries = [], []
+    for i, street in enumerate(STREETS):
+        phone = f"+1 555 {100 + i:03d} {4000 + 37 * i:04d}"
+        sku = f"SKU-{7300 + 11 * i}"
+        documents.append({
+            "id": f"store{i}#contacts",
+            "text": f"Store {i} is located at {10 + i} {street}. Call us at {phone}.",
+            "metadata": {"source": f"store{i}.txt"}
+        })
+        documents.append({
+            "id": f"store{i}#catalog",
+            "text": f"Store {i} stocks item {sku}, a {['kettle', 'toaster', 'blender', 'fan', 'heater'][i % 5]} "
+                    f"with a two-year warranty.",
+            "metadata": {"source": f"store{i}.txt"}
+        })
+        documents.append({
+            "id": f"store{i}#hours",
+            "text": f"Store {i} is open from {8 + i % 3}:00 to {18 + i % 4}:00 on weekdays.",
+            "metadata": {"source": f"store{i}.txt"}
+        })
+        queries.append((f"Which store has the phone number {phone}?", f"store{i}#contacts"))
+        queries.append((f"Do you have {sku} in stock?", f"store{i}#catalog"))
+        queries.append((f"What is the address on {street}?", f"store{i}#contacts"))
+    return documents, queries
+
+def evaluate(hybrid: bool, k: int, documents: List[Dict[str, Any]],
+             queries: List[Tuple[str, str]]) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as persist_dir:
+        knowledge_base = KnowledgeBase(persist_dir, "relevance", hybrid=hybrid)
+        knowledge_base.add_documents(documents)
+
+        hits, reciprocal_ranks, seconds = 0, [], []
+        for query, expected in queries:
+            start = time.perf_counter()
+            ids = [doc["id"] for doc in knowledge_base.search(query, n_results=k)]
+            seconds.append(time.perf_counter() - start)
+            if expected in ids:
+                hits += 1
+                reciprocal_ranks.append(1.0 / (ids.index(expected) + 1))
+            else:
+                reciprocal_ranks.append(0.0)
+        knowledge_base.close()
+
+    return {
+        "retriever": "hybrid" if hybrid else "dense",
+        "k": k,
+        "hit_rate": hits / len(queries),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "latency_mean_ms": statistics.mean(seconds) * 1000
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    documents, queries = build_corpus()
+    results = [
+        evaluate(False, 5, documents, queries),
+        evaluate(True, 3, documents, queries),
+    ]
+    for result in results:
+        print(json.dumps(result))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
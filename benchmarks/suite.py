@@ -0,0 +1,456 @@
+# benchmarks/suite.py
+"""
+Load and latency benchmarks against a stand-in LLM
+
+Usage:
+    python -m benchmarks.suite [--scenarios cold_start ingest retrieval chat_load stream_ttft batch overload tenants]
+                               [--docs 1000] [--k 1 3 10] [--users 8] [--requests 10]
+                               [--latency 0.2] [--tokens-per-sec 40] [--batch-size 500]
+                               [--overload-users 64] [--max-queue-wait 5]
+                               [--tenants 4] [--tenant-docs 200] [--output result.json]
+
+Generates a synthetic corpus (benchmarks.corpus), starts the fake Ollama
+server (benchmarks.fake_ollama) and runs the selected scenarios:
+
+    cold_start   server.py process start until the port listens (/healthz, target < 1s)
+                 and until the bot is ready (/readyz), with an empty and a persisted index
+    ingest       IngestionPipeline throughput over the corpus
+    retrieval    KnowledgeBase.search latency for each k, uncached and repeated
+                 (served from the retrieval cache)
+    chat_load    --users concurrent users sending --requests POST /chat each
+    stream_ttft  time to first token and total time of POST /chat/stream
+    batch        one POST /chat/batch of --batch-size messages: time to first and
+                 last result, messages/sec and per-message latency
+    overload     chat_load with --overload-users users against admission control
+                 (--max-queue-wait): latency of admitted requests and how many were shed
+    tenants      --tenants knowledge bases of --tenant-docs documents under /t/{tenant}/:
+                 first (cold load) and second (warm) request latency per tenant, and
+                 the load time and resident memory the server reports for each
+
+Results, with the git commit and all parameters, are written as JSON so
+runs can be compared.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from benchmarks import corpus
+
+SCENARIOS = ["cold_start", "ingest", "retrieval", "chat_load", "stream_ttft", "batch", "overload", "tenants"]
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Mean, p50, p95, p99 and max of a list of seconds, in milliseconds"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "mean_ms": round(statistics.mean(ordered) * 1000, 2),
+        "p50_ms": round(pick(0.50), 2),
+        "p95_ms": round(pick(0.95), 2),
+        "p99_ms": round(pick(0.99), 2),
+        "max_ms": round(ordered[-1] * 1000, 2)
+    }
+
+def wait_for_url(url: str, process: subprocess.Popen, timeout: float) -> float:
+    """Poll url until it answers; return the seconds waited"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"process exited with {process.returncode} before {url} answered")
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return time.perf_counter() - start
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{url} did not answer within {timeout}s")
+
+def log(message: str) -> None:
+    """Progress goes to stderr so stdout stays one JSON line per scenario"""
+    print(message, file=sys.stderr)
+
+@contextmanager
+def running(command: List[str], env: Dict[str, str]):
+    process = subprocess.Popen(command, env=env, start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        yield process
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+class Workspace:
+    """Temporary corpus, index directories and the fake Ollama server"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.root = tempfile.mkdtemp(prefix="chatbot-bench-")
+        self.knowledge_dir = os.path.join(self.root, "knowledge")
+        start = time.perf_counter()
+        corpus.write_corpus(self.knowledge_dir, args.docs, args.words, args.seed)
+        log(f"Generated {args.docs} documents in {time.perf_counter() - start:.1f}s")
+        self.ollama_url = f"http://127.0.0.1:{_free_port()}"
+        self._ollama = None
+        self.ingested_dir: Optional[str] = None
+
+    def start_ollama(self) -> None:
+        args = self.args
+        port = self.ollama_url.rsplit(":", 1)[1]
+        self._ollama = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_ollama", "--port", port,
+             "--latency", str(args.latency), "--tokens-per-sec", str(args.tokens_per_sec),
+             "--response-tokens", str(args.response_tokens), "--parallel", str(args.parallel)],
+            start_new_session=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        wait_for_url(f"{self.ollama_url}/api/version", self._ollama, 60)
+
+    def server_env(self, persist_dir: str) -> Dict[str, str]:
+        return dict(
+            os.environ,
+            OLLAMA_HOST=self.ollama_url,
+            CHATBOT_KNOWLEDGE_DIR=self.knowledge_dir,
+            CHATBOT_KNOWLEDGE_BASE_DIR=persist_dir,
+            CHATBOT_KNOWLEDGE_WATCH="false",
+            CHATBOT_WORKERS="1",
+            # Measure the generation path, not the canned no-context reply
+            CHATBOT_SKIP_GENERATION_WITHOUT_CONTEXT="false",
+            CHATBOT_ANSWER_CACHE_ENABLED="false"
+        )
+
+    def server_command(self, port: int) -> List[str]:
+        return [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+                "--port", str(port), "--log-level", "warning"]
+
+    def close(self) -> None:
+        if self._ollama is not None:
+            os.killpg(self._ollama.pid, signal.SIGTERM)
+            self._ollama.wait()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+def _start_times(ws: Workspace, persist_dir: str) -> Dict[str, float]:
+    port = _free_port()
+    start = time.perf_counter()
+    with running(ws.server_command(port), ws.server_env(persist_dir)) as process:
+        wait_for_url(f"http://127.0.0.1:{port}/healthz", process, ws.args.timeout)
+        listen = time.perf_counter() - start
+        wait_for_url(f"http://127.0.0.1:{port}/readyz", process, ws.args.timeout)
+        ready = time.perf_counter() - start
+    return {"listen_s": round(listen, 3), "ready_s": round(ready, 3)}
+
+def run_cold_start(ws: Workspace) -> Dict[str, Any]:
+    persist_dir = tempfile.mkdtemp(dir=ws.root)
+    cold = _start_times(ws, persist_dir)
+    # Second start reuses the persisted index and manifest
+    restart = _start_times(ws, persist_dir)
+    return {"docs": ws.args.docs, "cold": cold, "restart": restart}
+
+def run_ingest(ws: Workspace) -> Dict[str, Any]:
+    from chatbot import ChatbotConfig, local_knowledge_base
+    from knowledge_loader import IngestionPipeline
+
+    persist_dir = tempfile.mkdtemp(dir=ws.root)
+    config = ChatbotConfig(KNOWLEDGE_BASE_DIR=persist_dir)
+    knowledge_base = local_knowledge_base(config)
+    pipeline = IngestionPipeline(
+        knowledge_base,
+        max_tokens=config.CHUNK_MAX_TOKENS,
+        overlap_tokens=config.CHUNK_OVERLAP_TOKENS,
+        batch_size=config.EMBED_BATCH_SIZE,
+        read_workers=config.INGEST_READ_WORKERS
+    )
+    result = pipeline.run(ws.knowledge_dir)
+    knowledge_base.close()
+    ws.ingested_dir = persist_dir
+    return result
+
+def run_retrieval(ws: Workspace) -> Dict[str, Any]:
+    from chatbot import ChatbotConfig, local_knowledge_base
+
+    if ws.ingested_dir is None:
+        run_ingest(ws)
+    knowledge_base = local_knowledge_base(ChatbotConfig(KNOWLEDGE_BASE_DIR=ws.ingested_dir))
+    knowledge_base.warm_up()
+    pairs = corpus.queries(ws.args.docs, ws.args.queries, ws.args.seed)
+
+    results = {}
+    for k in ws.args.k:
+        # Fresh caches per k so every query pays for its embedding and search once
+        knowledge_base.query_cache.clear()
+        if knowledge_base.retrieval_cache is not None:
+            knowledge_base.retrieval_cache.memory.clear()
+        seconds, hits = [], 0
+        for query, expected in pairs:
+            start = time.perf_counter()
+            documents = knowledge_base.search(query, n_results=k)
+            seconds.append(time.perf_counter() - start)
+            hits += any(os.path.basename(doc["source"]) == expected for doc in documents)
+        results[f"k={k}"] = {**percentiles(seconds), "hit_rate": hits / len(pairs)}
+        if knowledge_base.retrieval_cache is not None:
+            # The same queries again, answered from the retrieval cache
+            seconds = []
+            for query, _ in pairs:
+                start = time.perf_counter()
+                knowledge_base.search(query, n_results=k)
+                seconds.append(time.perf_counter() - start)
+            results[f"k={k}"]["cached"] = percentiles(seconds)
+    knowledge_base.close()
+    return {"queries": len(pairs), **results}
+
+@contextmanager
+def chat_server(ws: Workspace, **env: str):
+    persist_dir = tempfile.mkdtemp(dir=ws.root)
+    port = _free_port()
+    with running(ws.server_command(port), {**ws.server_env(persist_dir), **env}) as process:
+        wait_for_url(f"http://127.0.0.1:{port}/readyz", process, ws.args.timeout)
+        yield f"http://127.0.0.1:{port}"
+
+async def _chat_load(base_url: str, users: int, requests: int, queries: List[str]) -> Dict[str, Any]:
+    import httpx
+
+    latencies: List[float] = []
+    errors = 0
+    # Refused by rate limiting or admission control (429/503)
+    shed: List[float] = []
+
+    async def user(client, index: int):
+        nonlocal errors
+        headers = {"X-Session-ID": f"bench-user-{index}"}
+        for i in range(requests):
+            query = queries[(index * requests + i) % len(queries)]
+            start = time.perf_counter()
+            status = None
+            try:
+                response = await client.post("/chat", json={"text": query}, headers=headers)
+                status = response.status_code
+                ok = status == 200 and response.json().get("status") == "success"
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            elif status in (429, 503):
+                shed.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(user(client, i) for i in range(users)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "users": users,
+        "requests": users * requests,
+        "errors": errors,
+        "shed": len(shed),
+        "shed_response_ms": round(statistics.mean(shed) * 1000, 1) if shed else 0.0,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        **percentiles(latencies)
+    }
+
+def run_chat_load(ws: Workspace) -> Dict[str, Any]:
+    queries = [q for q, _ in corpus.queries(ws.args.docs, ws.args.queries, ws.args.seed)]
+    with chat_server(ws) as base_url:
+        return asyncio.run(_chat_load(base_url, ws.args.users, ws.args.requests, queries))
+
+async def _stream_ttft(base_url: str, queries: List[str]) -> Dict[str, Any]:
+    import httpx
+
+    ttfts, totals = [], []
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        for query in queries:
+            start = time.perf_counter()
+            first_token = None
+            async with client.stream("POST", "/chat/stream", json={"text": query}) as response:
+                async for line in response.aiter_lines():
+                    if first_token is None and line == "event: token":
+                        first_token = time.perf_counter() - start
+            totals.append(time.perf_counter() - start)
+            if first_token is not None:
+                ttfts.append(first_token)
+
+    return {
+        "requests": len(queries),
+        "ttft": percentiles(ttfts),
+        "total": percentiles(totals)
+    }
+
+def run_stream_ttft(ws: Workspace) -> Dict[str, Any]:
+    queries = [q for q, _ in corpus.queries(ws.args.docs, ws.args.queries, ws.args.seed)]
+    with chat_server(ws) as base_url:
+        return asyncio.run(_stream_ttft(base_url, queries))
+
+async def _batch(base_url: str, messages: List[str]) -> Dict[str, Any]:
+    import httpx
+
+    latencies: List[float] = []
+    errors = 0
+    first_result = None
+    summary: Dict[str, Any] = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        start = time.perf_counter()
+        async with client.stream("POST", "/chat/batch", json={"messages": messages}) as response:
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record["type"] == "summary":
+                    summary = record
+                    continue
+                if first_result is None:
+                    first_result = time.perf_counter() - start
+                if record["status"] == "success":
+                    latencies.append(record["latency_s"])
+                else:
+                    errors += 1
+        elapsed = time.perf_counter() - start
+
+    return {
+        "messages": len(messages),
+        "errors": errors,
+        "first_result_s": round(first_result or 0.0, 3),
+        "seconds": round(elapsed, 3),
+        "messages_per_sec": round(len(messages) / elapsed, 2) if elapsed else 0.0,
+        "generated": summary.get("generated"),
+        "latency": percentiles(latencies)
+    }
+
+def run_batch(ws: Workspace) -> Dict[str, Any]:
+    pairs = corpus.queries(ws.args.docs, ws.args.batch_size, ws.args.seed + 1)
+    with chat_server(ws) as base_url:
+        return asyncio.run(_batch(base_url, [q for q, _ in pairs]))
+
+def run_overload(ws: Workspace) -> Dict[str, Any]:
+    queries = [q for q, _ in corpus.queries(ws.args.docs, ws.args.queries, ws.args.seed)]
+    env = {"CHATBOT_ADMISSION_MAX_QUEUE_WAIT_SECONDS": str(ws.args.max_queue_wait)}
+    with chat_server(ws, **env) as base_url:
+        return asyncio.run(_chat_load(base_url, ws.args.overload_users, ws.args.requests, queries))
+
+async def _tenants(base_url: str, names: List[str], queries: List[str]) -> Dict[str, Any]:
+    import httpx
+
+    cold, warm = [], []
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        for i, name in enumerate(names):
+            for seconds in (cold, warm):
+                start = time.perf_counter()
+                response = await client.post(f"/t/{name}/chat", json={"text": queries[i % len(queries)]})
+                response.raise_for_status()
+                seconds.append(time.perf_counter() - start)
+        stats = (await client.get("/stats")).json()["tenants"]
+
+    loaded = stats["tenants"].values()
+    return {
+        "tenants": len(names),
+        "cold_request": percentiles(cold),
+        "warm_request": percentiles(warm),
+        "load": percentiles([tenant["load_s"] for tenant in loaded]),
+        "memory_mb_per_tenant": round(statistics.mean(t["memory_mb"] for t in loaded), 1) if loaded else 0.0,
+        "memory_mb": stats["memory_mb"],
+        "evictions": stats["evictions"]
+    }
+
+def run_tenants(ws: Workspace) -> Dict[str, Any]:
+    args = ws.args
+    tenants_dir = os.path.join(ws.root, "tenants")
+    names = [f"tenant-{i}" for i in range(args.tenants)]
+    for i, name in enumerate(names):
+        corpus.write_corpus(os.path.join(tenants_dir, name, "knowledge"), args.tenant_docs, args.words, args.seed + i)
+    queries = [q for q, _ in corpus.queries(args.tenant_docs, args.queries, args.seed)]
+    with chat_server(ws, CHATBOT_TENANTS_DIR=tenants_dir) as base_url:
+        return asyncio.run(_tenants(base_url, names, queries))
+
+RUNNERS = {
+    "cold_start": run_cold_start,
+    "ingest": run_ingest,
+    "retrieval": run_retrieval,
+    "chat_load": run_chat_load,
+    "stream_ttft": run_stream_ttft,
+    "batch": run_batch,
+    "overload": run_overload,
+    "tenants": run_tenants,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--docs", type=int, default=1000, help=f"Corpus size, 1 to {corpus.MAX_DOCS}")
+    parser.add_argument("--words", type=int, default=150, help="Words per document")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=50, help="Queries for retrieval and streaming")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 10])
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=10, help="Requests per user")
+    parser.add_argument("--batch-size", type=int, default=500, help="Messages in the batch scenario")
+    parser.add_argument("--overload-users", type=int, default=64, help="Concurrent users in the overload scenario")
+    parser.add_argument("--max-queue-wait", type=float, default=5.0,
+                        help="Admission limit on estimated queue wait in the overload scenario")
+    parser.add_argument("--tenants", type=int, default=4, help="Tenants in the tenants scenario")
+    parser.add_argument("--tenant-docs", type=int, default=200, help="Documents per tenant")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake Ollama seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--response-tokens", type=int, default=64)
+    parser.add_argument("--parallel", type=int, default=4, help="Fake Ollama parallel slots")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Server startup timeout")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args)
+        },
+        "scenarios": {}
+    }
+
+    ws = Workspace(args)
+    try:
+        if {"cold_start", "chat_load", "stream_ttft", "batch", "overload", "tenants"} & set(args.scenarios):
+            ws.start_ollama()
+        for name in args.scenarios:
+            log(f"Running {name}...")
+            result = RUNNERS[name](ws)
+            report["scenarios"][name] = result
+            print(json.dumps({"scenario": name, **result}))
+    finally:
+        ws.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# benchmarks/vector_store.py
+"""
+Recall and memory of the numpy vector store against Chroma
+
+Usage:
+    python -m benchmarks.vector_store [--chunks 100000] [--dim 384] [--queries 200] [--k 10]
+                                      [--ivf-lists 256] [--output result.json]
+
+Generates clustered unit vectors (shaped like sentence embeddings) and
+loads them into Chroma and into NumpyVectorStore as int8, float16 and
+int8 + IVF. Each backend runs in its own process and reports:
+
+    recall_vs_exact   top-k overlap with an exact float32 scan
+    recall_vs_chroma  top-k overlap with Chroma's results
+    query_mean_ms     mean query time
+    rss_anon_mb       growth of private (heap) memory, which every worker pays
+    rss_file_mb       growth of file-backed memory, shared between workers
+    disk_mb           size of the persisted files
+    per_million_mb    disk_mb scaled to one million chunks
+
+Linux only (memory is read from /proc/self/status).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+def _memory_mb() -> Dict[str, float]:
+    values = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon:", "RssFile:")):
+                key, value = line.split(":")
+                values[key] = int(value.split()[0]) / 1024
+    return values
+
+def _disk_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 2 ** 20
+
+def make_vectors(chunks: int, dim: int, queries: int, seed: int = 0):
+    """Clustered unit vectors plus queries drawn near stored vectors"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(chunks // 100, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=chunks)] + 0.6 * rng.normal(size=(chunks, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picks = rng.integers(chunks, size=queries)
+    query_vectors = vectors[picks] + 0.3 * rng.normal(size=(queries, dim)).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return vectors, query_vectors
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[List[int]]:
+    result = []
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+    for query in queries:
+        distances = norms - 2 * vectors @ query
+        top = np.argpartition(distances, k)[:k]
+        result.append(top[np.argsort(distances[top])].tolist())
+    return result
+
+def _run_backend(name: str, options: Dict[str, Any], chunks: int, dim: int, n_queries: int, k: int,
+                 batch: int = 5000) -> Dict[str, Any]:
+    vectors, queries = make_vectors(chunks, dim, n_queries)
+    ids = [str(i) for i in range(chunks)]
+    documents = [f"chunk {i}" for i in range(chunks)]
+    metadatas = [{"source": f"doc{i // 10}.txt"} for i in range(chunks)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        before = _memory_mb()
+        start = time.perf_counter()
+        if name == "chroma":
+            import chromadb
+            client = chromadb.PersistentClient(path=directory, settings=chromadb.Settings(anonymized_telemetry=False))
+            store = client.get_or_create_collection(name="bench")
+        else:
+            from vector_store import NumpyVectorStore
+            store = NumpyVectorStore(directory, "bench", **options)
+        for i in range(0, chunks, batch):
+            store.upsert(ids=ids[i:i + batch], embeddings=vectors[i:i + batch].tolist(),
+                         documents=documents[i:i + batch], metadatas=metadatas[i:i + batch])
+        load_seconds = time.perf_counter() - start
+
+        results, seconds = [], []
+        for query in queries:
+            start = time.perf_counter()
+            found = store.query(query_embeddings=[query.tolist()], n_results=k, include=["distances"])
+            seconds.append(time.perf_counter() - start)
+            results.append([int(doc_id) for doc_id in found["ids"][0]])
+        after = _memory_mb()
+        disk = _disk_mb(directory)
+        if name != "chroma":
+            store.close()
+
+    return {
+        "backend": name,
+        "load_s": round(load_seconds, 2),
+        "query_mean_ms": round(statistics.mean(seconds) * 1000, 3),
+        "rss_anon_mb": round(after["RssAnon"] - before["RssAnon"], 1),
+        "rss_file_mb": round(after["RssFile"] - before["RssFile"], 1),
+        "disk_mb": round(disk, 1),
+        "per_million_mb": round(disk * 1_000_000 / chunks, 1),
+        "results": results
+    }
+
+def recall(results: List[List[int]], truth: List[List[int]], k: int) -> float:
+    return statistics.mean(len(set(r[:k]) & set(t[:k])) / k for r, t in zip(results, truth))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ivf-lists", type=int, default=256)
+    parser.add_argument("--ivf-probes", type=int, default=16)
+    parser.add_argument("--skip-chroma", action="store_true", help="Only measure the numpy store")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    backends = [
+        ("numpy-int8", {"dtype": "int8"}),
+        ("numpy-float16", {"dtype": "float16"}),
+        ("numpy-int8-ivf", {"dtype": "int8", "ivf_lists": args.ivf_lists, "ivf_probes": args.ivf_probes}),
+    ]
+    if not args.skip_chroma:
+        backends.insert(0, ("chroma", {}))
+
+    vectors, queries = make_vectors(args.chunks, args.dim, args.queries)
+    truth = exact_top_k(vectors, queries, args.k)
+    del vectors
+
+    # One process per backend so memory numbers do not mix
+    context = multiprocessing.get_context("spawn")
+    measured = []
+    for name, options in backends:
+        with context.Pool(1) as pool:
+            measured.append(pool.apply(
+                _run_backend, (name if name == "chroma" else "numpy", options,
+                               args.chunks, args.dim, args.queries, args.k)
+            ))
+        measured[-1]["backend"] = name
+
+    chroma_results = next((m["results"] for m in measured if m["backend"] == "chroma"), None)
+    report = []
+    for result in measured:
+        results = result.pop("results")
+        result["recall_vs_exact"] = round(recall(results, truth, args.k), 4)
+        if chroma_results is not None:
+            result["recall_vs_chroma"] = round(recall(results, chroma_results, args.k), 4)
+        report.append(result)
+        print(json.dumps(result))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": report}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
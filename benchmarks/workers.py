@@ -0,0 +1,104 @@
+# benchmarks/workers.py
+"""
+Startup time and memory of server.py for different worker counts
+
+Usage:
+    python -m benchmarks.workers [--workers 1 4 8] [--output result.json]
+
+For each worker count, starts server.py with CHATBOT_WORKERS set, waits
+until GET /readyz answers, then records the startup time and the resident
+memory (RSS, from /proc) of every process in the tree: the uvicorn
+supervisor, each worker and, for more than one worker, the index service.
+Linux only.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Any, Dict, List
+
+def _children(pid: int) -> List[int]:
+    children = []
+    task_dir = f"/proc/{pid}/task"
+    for task in os.listdir(task_dir):
+        try:
+            with open(f"{task_dir}/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return children
+
+def _process_tree(pid: int) -> List[int]:
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        stack.extend(_children(current))
+    return pids
+
+def _rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def _cmdline(pid: int) -> str:
+    with open(f"/proc/{pid}/cmdline", "rb") as f:
+        return f.read().replace(b"\0", b" ").decode(errors="replace").strip()
+
+def measure(workers: int, url: str, timeout: float) -> Dict[str, Any]:
+    env = dict(os.environ, CHATBOT_WORKERS=str(workers), CHATBOT_KNOWLEDGE_WATCH="false")
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "server.py"], env=env, start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError(f"server with {workers} workers did not start within {timeout}s")
+            try:
+                with urllib.request.urlopen(url, timeout=1):
+                    break
+            except OSError:
+                time.sleep(0.2)
+        startup = time.perf_counter() - start
+        # Let every worker finish its startup event before sampling memory
+        time.sleep(2)
+        processes = [
+            {"pid": pid, "cmd": _cmdline(pid), "rss_mb": round(_rss_mb(pid), 1)}
+            for pid in _process_tree(process.pid)
+        ]
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+    total = sum(p["rss_mb"] for p in processes)
+    return {
+        "workers": workers,
+        "startup_s": round(startup, 2),
+        "total_rss_mb": round(total, 1),
+        "rss_per_worker_mb": round(total / workers, 1),
+        "processes": processes
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--url", default="http://127.0.0.1:8000/readyz")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = [measure(n, args.url, args.timeout) for n in args.workers]
+    for result in results:
+        print(json.dumps({k: v for k, v in result.items() if k != "processes"}))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
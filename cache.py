@@ -0,0 +1,271 @@
+# cache.py
+import json
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    """Thread-safe LRU mapping with hit/miss counters"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Any, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size, hit/miss counts and hit ratio"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+class SemanticCache:
+    """
+    Answer cache keyed on query embeddings
+
+    A cached answer is reused when a new query retrieves exactly the same
+    chunks and its embedding has cosine similarity of at least `threshold`
+    with the cached query. Entries are evicted LRU and after `ttl` seconds,
+    and the whole cache is dropped when the knowledge base version changes.
+    Lookups and answers for an older version than the latest seen are
+    ignored, so a slow request cannot wipe or repopulate the cache.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600.0, threshold: float = 0.92):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        # (source ids, entry number) -> (normalized embedding, answer, created)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._by_sources: Dict[FrozenSet[str], List[tuple]] = {}
+        self._counter = 0
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, version: int) -> bool:
+        """Drop all entries on a newer version; False for a stale one (lock held)"""
+        if self._version is not None and version < self._version:
+            return False
+        if self._version != version:
+            if self._entries:
+                self.invalidations += 1
+                logger.info("Knowledge base changed, answer cache invalidated")
+            self._entries.clear()
+            self._by_sources.clear()
+            self._version = version
+        return True
+
+    def _remove(self, key: tuple) -> None:
+        self._entries.pop(key, None)
+        keys = self._by_sources.get(key[0])
+        if keys is not None:
+            keys.remove(key)
+            if not keys:
+                del self._by_sources[key[0]]
+
+    def get(self, embedding: Sequence[float], source_ids: Sequence[str], version: int) -> Optional[Any]:
+        """Return a cached answer for a similar query with the same sources, or None"""
+        sources = frozenset(source_ids)
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            if not self._check_version(version):
+                self.misses += 1
+                return None
+            best_key, best_score = None, self.threshold
+            for key in list(self._by_sources.get(sources, ())):
+                vector, _, created = self._entries[key]
+                if now - created > self.ttl:
+                    self._remove(key)
+                    continue
+                score = float(np.dot(vector, query))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key][1]
+
+    def put(self, embedding: Sequence[float], source_ids: Sequence[str], version: int, answer: Any) -> None:
+        """Cache an answer for a query"""
+        sources = frozenset(source_ids)
+        with self._lock:
+            if not self._check_version(version):
+                # Answered from an older version of the knowledge base
+                return
+            self._counter += 1
+            key = (sources, self._counter)
+            self._entries[key] = (self._normalize(embedding), answer, time.monotonic())
+            self._by_sources.setdefault(sources, []).append(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size, hit/miss counts and hit ratio"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations
+        }
+
+class RetrievalCache:
+    """
+    Ranked search results keyed on normalized query text and n_results
+
+    Values are the ranked chunk ids with their scores, not the chunks, so
+    a hit only costs an id lookup instead of an embedding and a vector
+    query. The memory tier is an LRU that is dropped whenever the knowledge
+    base version changes; results computed against an older version are
+    never stored.
+
+    The optional disk tier is a SQLite file that other processes and later
+    runs share. Version numbers are per process, so disk entries are tagged
+    with a fingerprint of the indexed content and search settings instead;
+    entries of any other fingerprint are ignored and pruned.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, max_entries: int = 4096, path: Optional[str] = None, max_disk_entries: int = 100000):
+        self.memory = LRUCache(max_entries)
+        self.max_disk_entries = max_disk_entries
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self.disk_hits = 0
+        self.invalidations = 0
+        self._puts = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=1.0)
+            self._conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    ranked TEXT NOT NULL,
+                    created REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS results_created ON results (created);
+            """)
+            logger.info(f"Retrieval cache disk tier at {path}")
+
+    def _check_version(self, version: int) -> bool:
+        """Drop the memory tier on a newer version; False for a stale one (lock held)"""
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            if self.memory.stats()["entries"]:
+                self.invalidations += 1
+                logger.info("Knowledge base changed, retrieval cache invalidated")
+            self.memory.clear()
+            self._version = version
+        return True
+
+    def get(self, key: str, version: int, fingerprint: str) -> Optional[List[Dict[str, Any]]]:
+        """Ranked results cached for a query, or None"""
+        with self._lock:
+            if not self._check_version(version):
+                return None
+            ranked = self.memory.get(key)
+            if ranked is not None or self._conn is None:
+                return ranked
+            try:
+                row = self._conn.execute(
+                    "SELECT ranked FROM results WHERE key = ? AND fingerprint = ?", (key, fingerprint)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Retrieval cache disk read failed: {str(e)}")
+                return None
+            if row is None:
+                return None
+            ranked = json.loads(row[0])
+            self.disk_hits += 1
+            self.memory.put(key, ranked)
+            return ranked
+
+    def put(self, key: str, version: int, fingerprint: str, ranked: List[Dict[str, Any]]) -> None:
+        """Cache the ranked results a search computed against `version`"""
+        with self._lock:
+            if not self._check_version(version):
+                return
+            self.memory.put(key, ranked)
+            if self._conn is None:
+                return
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO results (key, fingerprint, ranked, created) VALUES (?, ?, ?, ?)",
+                        (key, fingerprint, json.dumps(ranked), time.time())
+                    )
+                    self._puts += 1
+                    if self._puts % self.PRUNE_EVERY == 0:
+                        self._prune(fingerprint)
+            except sqlite3.Error as e:
+                logger.warning(f"Retrieval cache disk write failed: {str(e)}")
+
+    def _prune(self, fingerprint: str) -> None:
+        """Delete entries of other fingerprints and the oldest beyond max_disk_entries"""
+        self._conn.execute("DELETE FROM results WHERE fingerprint != ?", (fingerprint,))
+        self._conn.execute(
+            "DELETE FROM results WHERE key IN "
+            "(SELECT key FROM results ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Return memory tier size and hit/miss counts, disk tier hits and invalidations"""
+        return {**self.memory.stats(), "disk_hits": self.disk_hits, "invalidations": self.invalidations}
+
+    def close(self) -> None:
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
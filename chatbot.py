@@ -1,11 +1,23 @@
 import logging
-from typing import List, Dict, Any, Optional
-import ollama
-import chromadb
-from chromadb.utils import embedding_functions
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 from pydantic import BaseSettings
 import asyncio
+import hashlib
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from history_store import DEFAULT_SESSION, create_history_store
+from admission import AdmissionController, Overloaded, Reservation
+from metrics import ADMISSIONS, ERRORS, REQUESTS_IN_FLIGHT, STAGE_SECONDS, SUMMARY_TOKENS_SAVED, TOKENS, Counter, Gauge, Trace
+from knowledge_loader import KnowledgeLoader, chunk_id, count_tokens
+from cache import LRUCache, RetrievalCache, SemanticCache
+from embeddings import DEFAULT_MODEL, create_embedding_engine, embedding_signature
+from prompt import NO_INFORMATION_ANSWER, PromptBuilder, build_summary_messages, clean_summary, retrieval_only_answer
+from retrieval import BM25Index, filter_relevant, reciprocal_rank_fusion
+from scheduler import DeadlineExceeded, EmbeddingBatcher, GenerationScheduler
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -18,46 +30,368 @@ class ChatbotConfig(BaseSettings):
     COLLECTION_NAME: str = "company_knowledge"
     MAX_HISTORY_LENGTH: int = 10
     CONTEXT_LENGTH: int = 3  # Reduced to match number of documents
+    HYBRID_SEARCH: bool = True  # Fuse BM25 keyword hits with vector search
+    HYBRID_CANDIDATES: int = 10  # Candidates taken from each retriever before fusion
+    RRF_K: int = 60  # Reciprocal-rank fusion constant
+    RELEVANCE_MAX_DISTANCE: float = 1.5  # Max squared L2 distance of a relevant chunk (0 disables)
+    RELEVANCE_MAX_GAP: float = 0.3  # Stop adding chunks after a distance jump this large (0 disables)
+    RELEVANCE_MIN_KEYWORD_SCORE: float = 2.0  # BM25 score that makes a chunk relevant on its own
+    SKIP_GENERATION_WITHOUT_CONTEXT: bool = True  # Canned answer instead of Ollama when nothing is relevant
+    MAX_PROMPT_TOKENS: int = 3072  # Budget for instructions + context + history + message
+    HISTORY_TOKEN_BUDGET: int = 1024  # Share of the prompt budget for summary plus recent turns
+    # Parallel Ollama chat calls; match the Ollama server's OLLAMA_NUM_PARALLEL
+    MAX_CONCURRENT_GENERATIONS: int = int(os.environ.get("OLLAMA_NUM_PARALLEL", 4))
+    REQUEST_TIMEOUT_SECONDS: float = 120.0  # Deadline for queueing plus generation
+    RATE_LIMIT_PER_MINUTE: float = 0  # Chat requests per client and minute (0 disables)
+    RATE_LIMIT_BURST: int = 10  # Requests a client may send at once before the rate applies
+    ADMISSION_MAX_QUEUE_WAIT_SECONDS: float = 30.0  # Shed requests expected to queue longer (0 disables)
+    ADMISSION_MAX_QUEUE: int = 64  # Shed requests while this many are queued (0 disables)
+    OVERLOAD_MODE: str = "reject"  # Shed requests get: "reject" (503), "retrieval" (top source) or "fallback"
+    FALLBACK_MODEL_NAME: str = ""  # Smaller model answering shed requests in "fallback" mode
+    BATCH_MAX_ITEMS: int = 10000  # Messages accepted by one /chat/batch request
+    BATCH_RETRIEVAL_SIZE: int = 256  # Batch messages embedded and searched together
+    BATCH_CONCURRENCY: int = 2  # Generations one batch runs at a time
+    EMBED_MICROBATCH_SIZE: int = 32  # Concurrent query embeddings merged into one encode
+    EMBED_MICROBATCH_WAIT_MS: float = 5.0  # How long a query waits for others to batch with
+    RETRIEVAL_WORKERS: int = 4  # Threads for blocking Chroma/embedding calls
+    QUERY_EMBEDDING_CACHE_SIZE: int = 1024  # Cached query embeddings (0 disables)
+    RETRIEVAL_CACHE_SIZE: int = 4096  # Cached ranked search results per query and k (0 disables)
+    RETRIEVAL_CACHE_DISK: bool = False  # Share cached results across processes and restarts via SQLite
+    RETRIEVAL_CACHE_DISK_ENTRIES: int = 100000  # Size bound of the disk tier
+    OLLAMA_KEEP_ALIVE: str = "30m"  # How long Ollama keeps the model loaded between requests
+    EMBED_BATCH_SIZE: int = 64  # Chunks embedded per collection write
+    VECTOR_STORE: str = "chroma"  # "chroma" or "numpy" (quantized, memory-mapped)
+    VECTOR_DTYPE: str = "int8"  # Vector precision of the numpy store: "int8" or "float16"
+    IVF_LISTS: int = 0  # k-means partitions of the numpy store for large corpora (0 scans everything)
+    IVF_PROBES: int = 8  # Partitions scanned per query
+    EMBEDDING_ENGINE: str = "sentence-transformers"  # or "onnx" (ONNX Runtime, no torch at query time)
+    EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    EMBEDDING_THREADS: int = 0  # Intra-op threads of the embedding model (0 = library default)
+    EMBEDDING_QUANTIZE: bool = False  # int8 dynamic quantization, onnx engine only (re-embeds the index)
+    INGEST_READ_WORKERS: int = 4  # Threads reading files during bulk ingestion
+    HISTORY_BACKEND: str = "memory"  # "memory" or "sqlite"
+    HISTORY_DB_PATH: str = "./history.sqlite3"
+    MAX_SESSIONS: int = 1000
+    SESSION_TTL_SECONDS: int = 3600
+    MAX_SESSION_CHARS: int = 20000  # Per-session cap on stored history text
+    HISTORY_SUMMARY: bool = False  # Fold turns trimmed from history into a rolling summary
+    HISTORY_SUMMARY_MAX_TOKENS: int = 200  # Length cap of the summary
+    CHUNK_MAX_TOKENS: int = 256  # Token budget of one knowledge chunk
+    CHUNK_OVERLAP_TOKENS: int = 32  # Tokens shared between consecutive chunks
+    ANSWER_CACHE_ENABLED: bool = False  # Reuse answers for near-duplicate questions
+    ANSWER_CACHE_THRESHOLD: float = 0.92  # Minimum cosine similarity of query embeddings
+    ANSWER_CACHE_SIZE: int = 1000
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    KNOWLEDGE_DIR: str = "knowledge"  # Directory with the .txt knowledge files
+    TENANTS_DIR: str = "./tenants"  # One subdirectory per tenant served under /t/{tenant}/
+    TENANT_MEMORY_BUDGET_MB: int = 2048  # Evict idle tenants once loaded ones exceed this (0 disables)
+    MAX_LOADED_TENANTS: int = 32  # Tenants kept loaded at once per worker (0 = unlimited)
+    WORKERS: int = 1  # Server worker processes; >1 starts a shared index service
+    HTTP_KEEP_ALIVE_SECONDS: int = 75  # Idle keep-alive of client connections; keep above the proxy's
+    COMPRESSION_MIN_BYTES: int = 1024  # Compress responses at least this large (gzip, or br if installed)
+    STATIC_MAX_AGE_SECONDS: int = 300  # Browser cache lifetime of the chat page; revalidated by ETag after
+    WEBSOCKET_CHAT: bool = True  # Serve /ws/chat; the widget falls back to HTTP streaming without it
+    INDEX_SERVICE_URL: str = ""  # Use a running index service instead of a local index
+    INDEX_SERVICE_PORT: int = 8001
+    KNOWLEDGE_WATCH: bool = True  # Reload changed knowledge files without restart
+    KNOWLEDGE_WATCH_INTERVAL: float = 2.0  # Polling interval when inotify is unavailable
 
     class Config:
         env_prefix = "CHATBOT_"
 
+class ReadWriteLock:
+    """Writer-preferring read/write lock for the vector index"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
 class KnowledgeBase:
-    """Knowledge base management using ChromaDB"""
+    """
+    Knowledge base management using ChromaDB
+    
+    With vector_store="numpy" the vectors are kept in a quantized,
+    memory-mapped NumpyVectorStore instead of a Chroma collection.
+    """
 
-    def __init__(self, persist_directory: str, collection_name: str):
-        self.client = chromadb.Client(chromadb.Settings(
-            persist_directory=persist_directory,
-            anonymized_telemetry=False
-        ))
+    MANIFEST_FILE = "manifest.json"
+
+    def __init__(self, persist_directory: str, collection_name: str, batch_size: int = 64,
+                 query_cache_size: int = 1024, hybrid: bool = True, candidates: int = 10,
+                 rrf_k: int = 60, vector_store: str = "chroma", vector_dtype: str = "int8",
+                 ivf_lists: int = 0, ivf_probes: int = 8, embedding_engine: str = "sentence-transformers",
+                 embedding_model: str = DEFAULT_MODEL, embedding_threads: int = 0,
+                 embedding_quantize: bool = False, embedding_function=None,
+                 retrieval_cache_size: int = 0, retrieval_cache_disk: bool = False,
+                 retrieval_cache_disk_entries: int = 100000):
+        self.batch_size = batch_size
+        self.query_cache = LRUCache(query_cache_size)
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        # BM25 index kept in sync with the collection for exact-token matches
+        self.keyword_index: Optional[BM25Index] = BM25Index() if hybrid else None
+        self._keyword_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bm25") if hybrid else None
+        os.makedirs(persist_directory, exist_ok=True)
+        # Engines import their libraries on construction, so importing this
+        # module (server.py, the CLI) stays fast. Tenant knowledge bases pass
+        # in the engine of the first one instead of loading the model again.
+        self.embedding_function = embedding_function or create_embedding_engine(
+            embedding_engine,
+            embedding_model,
+            threads=embedding_threads,
+            quantize=embedding_quantize,
+            cache_dir=os.path.join(persist_directory, "onnx"),
+            max_batch=batch_size
+        )
+        self.embedding_signature = embedding_signature(
+            embedding_model,
+            embedding_quantize and embedding_engine == "onnx"
+        )
         
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction()
+        # Keep the collection between runs; sync_documents re-embeds only what changed
+        self.vector_store = vector_store
+        if vector_store == "numpy":
+            from vector_store import NumpyVectorStore
+            self.client = None
+            self.collection = NumpyVectorStore(
+                persist_directory,
+                collection_name,
+                dtype=vector_dtype,
+                ivf_lists=ivf_lists,
+                ivf_probes=ivf_probes
+            )
+        elif vector_store == "chroma":
+            import chromadb
+            self.client = chromadb.PersistentClient(
+                path=persist_directory,
+                settings=chromadb.Settings(anonymized_telemetry=False)
+            )
+            # Embeddings are always passed explicitly; the collection only
+            # keeps its function for sentence-transformers as before
+            self.collection = self.client.get_or_create_collection(
+                name=collection_name,
+                embedding_function=self.embedding_function if embedding_engine == "sentence-transformers" else None
+            )
+        else:
+            raise ValueError(f"Unknown vector store {vector_store!r}, use 'chroma' or 'numpy'")
         
-        # Recreate collection each time to ensure fresh start
-        try:
-            self.client.delete_collection(collection_name)
-        except Exception:
-            pass
-            
-        self.collection = self.client.create_collection(
-            name=collection_name,
-            embedding_function=self.embedding_function
+        self._lock = ReadWriteLock()
+        # Bumped on every change so caches can tell stale entries apart
+        self.version = 0
+        self.manifest_path = os.path.join(persist_directory, f"{collection_name}.{self.MANIFEST_FILE}")
+        self.signature_path = os.path.join(persist_directory, f"{collection_name}.embedding")
+        self.manifest = self._load_manifest()
+        self._build_keyword_index()
+        
+        # Everything that decides a ranking besides the query, and an
+        # order-independent hash of the indexed chunks kept up to date by
+        # _apply_changes; together they tag results shared on disk
+        self.search_signature = (
+            f"{self.embedding_signature}|{vector_store}:{vector_dtype}:{ivf_lists}:{ivf_probes}"
+            f"|{'hybrid' if hybrid else 'dense'}:{candidates}:{rrf_k}"
         )
+        self._content_hash = 0
+        for doc_id, entry in self.manifest.items():
+            self._content_hash ^= self._chunk_hash(doc_id, entry)
+        self.retrieval_cache: Optional[RetrievalCache] = None
+        if retrieval_cache_size > 0:
+            self.retrieval_cache = RetrievalCache(
+                retrieval_cache_size,
+                path=os.path.join(persist_directory, f"{collection_name}.retrieval.sqlite3")
+                if retrieval_cache_disk else None,
+                max_disk_entries=retrieval_cache_disk_entries
+            )
         
-        logger.info("Knowledge base initialized successfully")
+        logger.info(f"Knowledge base initialized successfully ({self.collection.count()} chunks on disk)")
 
-    def add_documents(self, documents: List[Dict[str, Any]]) -> bool:
-        """Add documents to knowledge base"""
-        try:
-            texts = [doc["text"] for doc in documents]
-            metadatas = [doc.get("metadata", {}) for doc in documents]
-            ids = [doc["metadata"]["source"] for doc in documents]  # Use filename as ID
-            
-            self.collection.add(
-                documents=texts,
-                metadatas=metadatas,
-                ids=ids
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """Load the chunk manifest, discarding it if it no longer matches the collection"""
+        manifest: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable manifest {self.manifest_path}: {str(e)}")
+        
+        # Indexes written before the signature file existed used the default model
+        stored_signature = embedding_signature(DEFAULT_MODEL, False)
+        if os.path.exists(self.signature_path):
+            with open(self.signature_path, 'r', encoding='utf-8') as f:
+                stored_signature = f.read().strip()
+        
+        if stored_signature != self.embedding_signature and self.collection.count():
+            logger.warning(
+                f"Index was embedded with {stored_signature}, now using {self.embedding_signature}: "
+                f"rebuilding index"
             )
+            manifest = {}
+        if len(manifest) != self.collection.count():
+            logger.warning("Manifest does not match the stored collection, rebuilding index")
+            existing = self.collection.get(include=[])['ids']
+            if existing:
+                self.collection.delete(ids=existing)
+            manifest = {}
+        return manifest
+
+    def _build_keyword_index(self, page_size: int = 1000) -> None:
+        """Index the chunks already stored in the collection"""
+        if self.keyword_index is None:
+            return
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents"], limit=page_size, offset=offset)
+            if not page['ids']:
+                break
+            self.keyword_index.add_many(zip(page['ids'], page['documents']))
+            offset += len(page['ids'])
+        logger.info(f"Keyword index built with {len(self.keyword_index)} chunks")
+
+    def save_manifest(self) -> None:
+        """Write the chunk manifest to disk atomically"""
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+        with open(self.signature_path, 'w', encoding='utf-8') as f:
+            f.write(self.embedding_signature)
+
+    @staticmethod
+    def document_id(doc: Dict[str, Any]) -> str:
+        """Stable id of a document chunk"""
+        if doc.get("id"):
+            return doc["id"]
+        metadata = doc["metadata"]
+        if "chunk_id" in metadata:
+            return chunk_id(metadata["source"], metadata["chunk_id"], metadata.get("root"))
+        return metadata["source"]
+
+    @staticmethod
+    def _manifest_entry(doc: Dict[str, Any]) -> Dict[str, Any]:
+        metadata = doc.get("metadata", {})
+        entry = {
+            "path": metadata.get("path", metadata.get("source")),
+            "mtime": metadata.get("mtime"),
+            "sha": hashlib.sha256(doc["text"].encode("utf-8")).hexdigest()
+        }
+        if "root" in metadata:
+            # Directory the chunk was ingested from, for scoped deletes
+            entry["root"] = metadata["root"]
+        return entry
+
+    @staticmethod
+    def _chunk_hash(doc_id: str, entry: Dict[str, Any]) -> int:
+        return int.from_bytes(hashlib.sha256(f"{doc_id}\0{entry['sha']}".encode("utf-8")).digest()[:16], "big")
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the indexed content and search settings across processes"""
+        return f"{self.search_signature}|{self._content_hash:032x}"
+
+    def changed_documents(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return the documents that are new or whose content differs from the manifest"""
+        changed = []
+        for doc in documents:
+            entry = self.manifest.get(self.document_id(doc))
+            if entry is None or entry["sha"] != self._manifest_entry(doc)["sha"]:
+                changed.append(doc)
+            else:
+                # Touched but identical content: refresh the manifest only
+                metadata = doc.get("metadata", {})
+                entry["mtime"] = metadata.get("mtime")
+                if "root" in metadata:
+                    entry["root"] = metadata["root"]
+        return changed
+
+    def _apply_changes(self, upserts: List[Dict[str, Any]], deletes: List[str],
+                       save: bool = True) -> None:
+        """
+        Apply upserts and deletes as one swap
+        
+        Embeddings are computed before taking the write lock, so searches are
+        only blocked for the short delete + upsert and never see a half-applied
+        update.
+        """
+        ids = [self.document_id(doc) for doc in upserts]
+        texts = [doc["text"] for doc in upserts]
+        metadatas = [doc.get("metadata", {}) for doc in upserts]
+        embeddings = self.embedding_function(texts) if texts else []
+        
+        with self._lock.write():
+            if deletes:
+                self.collection.delete(ids=deletes)
+            if upserts:
+                self.collection.upsert(
+                    documents=texts,
+                    metadatas=metadatas,
+                    embeddings=embeddings,
+                    ids=ids
+                )
+            for doc_id in deletes:
+                entry = self.manifest.pop(doc_id, None)
+                if entry is not None:
+                    self._content_hash ^= self._chunk_hash(doc_id, entry)
+            for doc_id, doc in zip(ids, upserts):
+                entry = self.manifest.get(doc_id)
+                if entry is not None:
+                    self._content_hash ^= self._chunk_hash(doc_id, entry)
+                entry = self.manifest[doc_id] = self._manifest_entry(doc)
+                self._content_hash ^= self._chunk_hash(doc_id, entry)
+            if self.keyword_index is not None:
+                for doc_id in deletes:
+                    self.keyword_index.remove(doc_id)
+                self.keyword_index.add_many(zip(ids, texts))
+            if upserts or deletes:
+                self.version += 1
+            if save:
+                self.save_manifest()
+
+    def add_documents(self, documents: List[Dict[str, Any]], save_manifest: bool = True) -> bool:
+        """
+        Add documents to knowledge base
+        
+        Documents are embedded and written in batches of batch_size. Bulk
+        loaders can pass save_manifest=False and call save_manifest() once
+        at the end instead of rewriting it after every batch.
+        """
+        try:
+            if not documents:
+                return True
+            for i in range(0, len(documents), self.batch_size):
+                self._apply_changes(documents[i:i + self.batch_size], [], save=False)
+            if save_manifest:
+                self.save_manifest()
             logger.info(f"Added {len(documents)} documents to knowledge base")
             return True
             
@@ -65,185 +399,1184 @@ class KnowledgeBase:
             logger.error(f"Error adding documents: {str(e)}")
             raise
 
-    def search(self, query: str, n_results: int = 3) -> List[Dict[str, Any]]:
-        """Search for relevant documents with metadata"""
-        try:
+    def delete_documents(self, ids: List[str]) -> None:
+        """Remove documents from knowledge base"""
+        if not ids:
+            return
+        self._apply_changes([], ids)
+        logger.info(f"Deleted {len(ids)} documents from knowledge base")
+
+    def sync_documents(self, documents: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Make the stored index match the given documents
+        
+        Only new or changed chunks (by content hash) are embedded, chunks that
+        are no longer present are deleted, and everything else is reused.
+        
+        Returns:
+            Dict[str, int]: Counts of reused, embedded and deleted chunks
+        """
+        start = time.perf_counter()
+        wanted = {self.document_id(doc): doc for doc in documents}
+        
+        changed = self.changed_documents(list(wanted.values()))
+        removed = [doc_id for doc_id in self.manifest if doc_id not in wanted]
+        self._apply_changes([], removed, save=False)
+        self.add_documents(changed, save_manifest=False)
+        self.save_manifest()
+        
+        report = {
+            "reused": len(wanted) - len(changed),
+            "embedded": len(changed),
+            "deleted": len(removed)
+        }
+        logger.info(
+            f"Knowledge index synced in {time.perf_counter() - start:.2f}s: "
+            f"{report['reused']} chunks reused, {report['embedded']} re-embedded, "
+            f"{report['deleted']} deleted"
+        )
+        return report
+
+    def replace_source(self, source: str, documents: List[Dict[str, Any]],
+                       root: Optional[str] = None) -> Dict[str, int]:
+        """
+        Replace all chunks of one source file
+        
+        Args:
+            source: Source name as stored in document metadata
+            documents: New chunks of the file (empty if the file was removed)
+            root: Directory the source was ingested from; chunks of a
+                same-named source from another directory are left alone
+            
+        Returns:
+            Dict[str, int]: Counts of reused, embedded and deleted chunks
+        """
+        wanted = {self.document_id(doc) for doc in documents}
+        changed = self.changed_documents(documents)
+        removed = [
+            doc_id for doc_id, entry in self.manifest.items()
+            if entry["path"] == source and entry.get("root") == root and doc_id not in wanted
+        ]
+        if changed or removed:
+            self._apply_changes(changed, removed)
+        return {
+            "reused": len(documents) - len(changed),
+            "embedded": len(changed),
+            "deleted": len(removed)
+        }
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Case- and whitespace-insensitive form of a query"""
+        return " ".join(query.casefold().split())
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed several queries with one encode call, using the LRU cache
+        
+        Only queries missing from the cache are sent to the model.
+        """
+        keys = [self.normalize_query(query) for query in queries]
+        embeddings = [self.query_cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, embedding in zip(keys, embeddings) if embedding is None))
+        if missing:
+            encoded = dict(zip(missing, self.embedding_function(missing)))
+            for key, embedding in encoded.items():
+                self.query_cache.put(key, embedding)
+            embeddings = [embedding if embedding is not None else encoded[key]
+                          for key, embedding in zip(keys, embeddings)]
+        return embeddings
+
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query with the collection's embedding model, using the LRU cache"""
+        return self.embed_queries([query])[0]
+
+    @staticmethod
+    def _to_document(doc_id: str, text: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'text': text,
+            'metadata': metadata,
+            'id': doc_id,
+            'source': metadata.get('source', doc_id)
+        }
+
+    def _dense_search(self, query_embeddings: List[List[float]], n_results: int) -> List[List[Dict[str, Any]]]:
+        """Nearest chunks of each query embedding, from one vector store query"""
+        with self._lock.read():
             results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"]
             )
-            
+        found = []
+        for q in range(len(query_embeddings)):
             documents = []
-            for i in range(len(results['documents'][0])):
-                documents.append({
-                    'text': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'source': results['ids'][0][i]
-                })
-                
-            logger.info(f"Found {len(documents)} documents for query: '{query}'")
-            return documents
+            for i in range(len(results['ids'][q])):
+                doc = self._to_document(results['ids'][q][i], results['documents'][q][i], results['metadatas'][q][i])
+                doc['distance'] = results['distances'][q][i]
+                documents.append(doc)
+            found.append(documents)
+        return found
+
+    def _keyword_search(self, queries: List[str], n_results: int) -> Tuple[List[List[Tuple[str, float]]], float]:
+        """BM25 hits of each query and the time the lookups took"""
+        start = time.perf_counter()
+        with self._lock.read():
+            hits = [self.keyword_index.search(query, n_results) for query in queries]
+        return hits, time.perf_counter() - start
+
+    def _get_documents(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch stored chunks by id"""
+        if not ids:
+            return {}
+        with self._lock.read():
+            results = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        return {
+            doc_id: self._to_document(doc_id, text, metadata)
+            for doc_id, text, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+        }
+
+    def search(self, query: str, n_results: int = 3,
+               query_embedding: Optional[List[float]] = None,
+               timings: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """
+        Search for relevant documents with metadata
+        
+        With hybrid search enabled, the BM25 lookup runs concurrently with the
+        dense query and both candidate lists are merged by reciprocal-rank
+        fusion. Per-retriever timings are logged and, if a dict is passed as
+        `timings`, written into it.
+        """
+        query_embeddings = None if query_embedding is None else [query_embedding]
+        return self.search_many([query], n_results, query_embeddings, timings)[0]
+
+    def search_many(self, queries: List[str], n_results: int = 3,
+                    query_embeddings: Optional[List[List[float]]] = None,
+                    timings: Optional[Dict[str, float]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries at once
+        
+        Queries with results in the retrieval cache skip the search. The
+        others have their missing embeddings computed with one encode call
+        and go to the vector store in one query. Results are in query order;
+        timings cover the whole batch.
+        """
+        try:
+            timings = timings if timings is not None else {}
+            start = time.perf_counter()
+            found: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+            
+            keys: List[str] = []
+            if self.retrieval_cache is not None:
+                with self._lock.read():
+                    version, fingerprint = self.version, self.fingerprint
+                keys = [f"{n_results}:{self.normalize_query(query)}" for query in queries]
+                cached = self._cached_results(keys, version, fingerprint)
+                for i, documents in cached.items():
+                    found[i] = documents
+            
+            missing = [i for i, documents in enumerate(found) if documents is None]
+            if missing:
+                searched = self._search_many(
+                    [queries[i] for i in missing],
+                    n_results,
+                    None if query_embeddings is None else [query_embeddings[i] for i in missing],
+                    timings
+                )
+                # Results that raced a knowledge change are returned but not cached
+                cacheable = self.retrieval_cache is not None and self.version == version
+                for i, documents in zip(missing, searched):
+                    found[i] = documents
+                    if cacheable:
+                        ranked = [
+                            {field: doc[field] if field == "id" else float(doc[field])
+                             for field in ("id", "distance", "score", "keyword_score") if field in doc}
+                            for doc in documents
+                        ]
+                        self.retrieval_cache.put(keys[i], version, fingerprint, ranked)
+            
+            timings["total"] = time.perf_counter() - start
+            stages = ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items())
+            if len(queries) == 1:
+                source = "cached " if not missing else ""
+                logger.info(f"Found {len(found[0])} {source}documents for query: '{queries[0]}' ({stages})")
+            else:
+                logger.info(f"Searched {len(queries)} queries, {len(queries) - len(missing)} cached ({stages})")
+            return found
             
         except Exception as e:
             logger.error(f"Error searching documents: {str(e)}")
             raise
 
-def load_knowledge_files(directory: str = "knowledge") -> List[Dict[str, Any]]:
-    """Load knowledge from txt files"""
-    documents = []
+    def _cached_results(self, keys: List[str], version: int, fingerprint: str) -> Dict[int, List[Dict[str, Any]]]:
+        """Documents of the queries whose ranked ids are cached, by query index"""
+        hits = {}
+        for i, key in enumerate(keys):
+            ranked = self.retrieval_cache.get(key, version, fingerprint)
+            if ranked is not None:
+                hits[i] = ranked
+        by_id = self._get_documents(list(dict.fromkeys(entry["id"] for ranked in hits.values() for entry in ranked)))
+        results = {}
+        for i, ranked in hits.items():
+            # A change since the lookup may have removed a chunk: search again
+            if all(entry["id"] in by_id for entry in ranked):
+                results[i] = [{**by_id[entry["id"]], **entry} for entry in ranked]
+        return results
+
+    def _search_many(self, queries: List[str], n_results: int,
+                     query_embeddings: Optional[List[List[float]]],
+                     timings: Dict[str, float]) -> List[List[Dict[str, Any]]]:
+        """Embed, query the vector store and fuse with keyword hits"""
+        start = time.perf_counter()
+        
+        keyword_future = None
+        if self.keyword_index is not None:
+            keyword_future = self._keyword_pool.submit(self._keyword_search, queries, self.candidates)
+        
+        if query_embeddings is None:
+            query_embeddings = self.embed_queries(queries)
+            timings["embed"] = time.perf_counter() - start
+        
+        dense_start = time.perf_counter()
+        dense_docs = self._dense_search(
+            query_embeddings,
+            max(n_results, self.candidates) if keyword_future is not None else n_results
+        )
+        timings["dense"] = time.perf_counter() - dense_start
+        
+        if keyword_future is None:
+            found = dense_docs
+        else:
+            keyword_hits, timings["keyword"] = keyword_future.result()
+            fusion_start = time.perf_counter()
+            fused = [
+                reciprocal_rank_fusion(
+                    [[doc['id'] for doc in docs], [doc_id for doc_id, _ in hits]],
+                    k=self.rrf_k
+                )[:n_results]
+                for docs, hits in zip(dense_docs, keyword_hits)
+            ]
+            
+            by_id = {doc['id']: doc for docs in dense_docs for doc in docs}
+            by_id.update(self._get_documents(list(dict.fromkeys(
+                doc_id for ranked in fused for doc_id, _ in ranked if doc_id not in by_id
+            ))))
+            found = []
+            for ranked, hits in zip(fused, keyword_hits):
+                documents = []
+                keyword_scores = dict(hits)
+                for doc_id, score in ranked:
+                    # A concurrent reload may have removed a keyword-only hit
+                    if doc_id in by_id:
+                        # Copied, as queries of one batch can share a chunk
+                        doc = dict(by_id[doc_id])
+                        doc['score'] = score
+                        if doc_id in keyword_scores:
+                            doc['keyword_score'] = keyword_scores[doc_id]
+                        documents.append(doc)
+                found.append(documents)
+            timings["fusion"] = time.perf_counter() - fusion_start
+        return found
+
+    def warm_up(self) -> None:
+        """Load the embedding model by encoding a dummy sentence"""
+        # Encode directly so the warm-up text does not occupy the query cache
+        self.embedding_function(["warm up"])
+
+    def close(self) -> None:
+        """Stop the keyword search pool and close the vector store and result cache"""
+        if self._keyword_pool is not None:
+            self._keyword_pool.shutdown(wait=False)
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.close()
+        if self.vector_store == "numpy":
+            self.collection.close()
+
+class RemoteKnowledgeBase:
+    """
+    Client for a knowledge base hosted by index_service
     
+    Used by server workers in multi-worker mode so that the vector index and
+    the embedding model live once in the index service process instead of in
+    every worker. Read-only: ingestion and reloads happen in the service.
+    """
+
+    def __init__(self, url: str, query_cache_size: int = 1024, timeout: float = 30.0):
+        import httpx
+        self.url = url.rstrip("/")
+        self.query_cache = LRUCache(query_cache_size)
+        # Search results are cached by the index service
+        self.retrieval_cache = None
+        self.version = 0
+        self._http = httpx.Client(base_url=self.url, timeout=timeout)
+        logger.info(f"Using remote knowledge base at {self.url}")
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = self._http.post(path, json=payload)
+        response.raise_for_status()
+        data = response.json()
+        self.version = data.get("version", self.version)
+        return data
+
+    normalize_query = staticmethod(KnowledgeBase.normalize_query)
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed queries in the index service, using the local LRU cache"""
+        keys = [self.normalize_query(query) for query in queries]
+        embeddings = [self.query_cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, embedding in zip(keys, embeddings) if embedding is None))
+        if missing:
+            encoded = dict(zip(missing, self._post("/embed", {"queries": missing})["embeddings"]))
+            for key, embedding in encoded.items():
+                self.query_cache.put(key, embedding)
+            embeddings = [embedding if embedding is not None else encoded[key]
+                          for key, embedding in zip(keys, embeddings)]
+        return embeddings
+
+    def embed_query(self, query: str) -> List[float]:
+        return self.embed_queries([query])[0]
+
+    def search(self, query: str, n_results: int = 3,
+               query_embedding: Optional[List[float]] = None,
+               timings: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """Search the remote knowledge base"""
+        try:
+            data = self._post("/search", {
+                "query": query,
+                "n_results": n_results,
+                "query_embedding": None if query_embedding is None else [float(x) for x in query_embedding]
+            })
+            if timings is not None:
+                timings.update(data.get("timings", {}))
+            logger.info(f"Found {len(data['documents'])} documents for query: '{query}'")
+            return data["documents"]
+        except Exception as e:
+            logger.error(f"Error searching documents: {str(e)}")
+            raise
+
+    def search_many(self, queries: List[str], n_results: int = 3,
+                    query_embeddings: Optional[List[List[float]]] = None,
+                    timings: Optional[Dict[str, float]] = None) -> List[List[Dict[str, Any]]]:
+        """Search the remote knowledge base for several queries in one request"""
+        try:
+            data = self._post("/search/batch", {
+                "queries": queries,
+                "n_results": n_results,
+                "query_embeddings": None if query_embeddings is None
+                else [[float(x) for x in embedding] for embedding in query_embeddings]
+            })
+            if timings is not None:
+                timings.update(data.get("timings", {}))
+            logger.info(f"Searched {len(queries)} queries")
+            return data["documents"]
+        except Exception as e:
+            logger.error(f"Error searching documents: {str(e)}")
+            raise
+
+    def reload(self) -> Dict[str, Any]:
+        """Ask the index service to reload changed knowledge files"""
+        return self._post("/reload", {})
+
+    def add_documents(self, documents: List[Dict[str, Any]], save_manifest: bool = True) -> bool:
+        raise RuntimeError("Remote knowledge base is read-only; ingest through the index service")
+
+    def sync_documents(self, documents: List[Dict[str, Any]]) -> Dict[str, int]:
+        raise RuntimeError("Remote knowledge base is read-only; ingest through the index service")
+
+    def warm_up(self) -> None:
+        """Wait until the index service answers (for a tenant, until it has loaded it)"""
+        self._http.get("/healthz", timeout=None).raise_for_status()
+
+    def close(self) -> None:
+        self._http.close()
+
+def local_knowledge_base(config: ChatbotConfig, embedding_function=None) -> KnowledgeBase:
+    """Open the knowledge base stored in KNOWLEDGE_BASE_DIR"""
+    return KnowledgeBase(
+        config.KNOWLEDGE_BASE_DIR,
+        config.COLLECTION_NAME,
+        batch_size=config.EMBED_BATCH_SIZE,
+        query_cache_size=config.QUERY_EMBEDDING_CACHE_SIZE,
+        hybrid=config.HYBRID_SEARCH,
+        candidates=config.HYBRID_CANDIDATES,
+        rrf_k=config.RRF_K,
+        vector_store=config.VECTOR_STORE,
+        vector_dtype=config.VECTOR_DTYPE,
+        ivf_lists=config.IVF_LISTS,
+        ivf_probes=config.IVF_PROBES,
+        embedding_engine=config.EMBEDDING_ENGINE,
+        embedding_model=config.EMBEDDING_MODEL,
+        embedding_threads=config.EMBEDDING_THREADS,
+        embedding_quantize=config.EMBEDDING_QUANTIZE,
+        embedding_function=embedding_function,
+        retrieval_cache_size=config.RETRIEVAL_CACHE_SIZE,
+        retrieval_cache_disk=config.RETRIEVAL_CACHE_DISK,
+        retrieval_cache_disk_entries=config.RETRIEVAL_CACHE_DISK_ENTRIES
+    )
+
+def create_knowledge_base(config: ChatbotConfig, embedding_function=None):
+    """Open the local knowledge base, or the index service client when INDEX_SERVICE_URL is set"""
+    if config.INDEX_SERVICE_URL:
+        return RemoteKnowledgeBase(config.INDEX_SERVICE_URL, config.QUERY_EMBEDDING_CACHE_SIZE)
+    return local_knowledge_base(config, embedding_function)
+
+def load_knowledge_files(directory: str = "knowledge", max_tokens: int = 256,
+                         overlap_tokens: int = 32) -> List[Dict[str, Any]]:
+    """Load and chunk knowledge from txt files"""
     if not os.path.exists(directory):
         os.makedirs(directory)
         logger.info(f"Created directory {directory}")
-        return documents
-    
-    for filename in os.listdir(directory):
-        if filename.endswith(".txt"):
-            filepath = os.path.join(directory, filename)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    text = f.read().strip()
-                    documents.append({
-                        "text": text,
-                        "metadata": {
-                            "source": filename,
-                            "category": filename.replace(".txt", "")
-                        }
-                    })
-                logger.info(f"Loaded file: {filename}")
-            except Exception as e:
-                logger.error(f"Error reading file {filename}: {str(e)}")
+        return []
     
-    return documents
+    return KnowledgeLoader.load_directory(directory, max_tokens, overlap_tokens)
+
+async def _within_deadline(awaitable, deadline: float) -> Any:
+    """Await with the time left, raising DeadlineExceeded like the scheduler once it passes"""
+    try:
+        return await asyncio.wait_for(awaitable, timeout=max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("Request deadline exceeded") from None
+
+async def _until_deadline(stream: AsyncIterator[Any], deadline: float) -> AsyncIterator[Any]:
+    """Items of a stream, raising DeadlineExceeded once the deadline passes"""
+    iterator = stream.__aiter__()
+    while True:
+        try:
+            item = await _within_deadline(iterator.__anext__(), deadline)
+        except StopAsyncIteration:
+            return
+        yield item
 
 class Chatbot:
     """Main chatbot class"""
 
-    def __init__(self, config: Optional[ChatbotConfig] = None):
+    # Batch generations wait behind interactive ones, summaries behind both
+    BATCH_PRIORITY = 10
+    SUMMARY_PRIORITY = 100
+
+    def __init__(self, config: Optional[ChatbotConfig] = None, shared: Optional["Chatbot"] = None,
+                 embedding_function=None):
+        """
+        Args:
+            config: Settings, read from CHATBOT_* environment variables if omitted
+            shared: Bot whose Ollama client, generation queue, executor, query
+                embedder and history store this one reuses (a tenant bot)
+            embedding_function: Already loaded embedding engine for the knowledge base
+        """
         self.config = config or ChatbotConfig()
-        self.client = ollama.Client()
+        self._shared = shared is not None
         
         # Initialize knowledge base
-        self.knowledge_base = KnowledgeBase(
-            self.config.KNOWLEDGE_BASE_DIR,
-            self.config.COLLECTION_NAME
-        )
+        self.knowledge_base = create_knowledge_base(self.config, embedding_function)
         
-        self.conversation_history: List[Dict[str, str]] = []
+        if shared is not None:
+            self.client = shared.client
+            self.history = shared.history
+            self._executor = shared._executor
+            self.scheduler = shared.scheduler
+            self.admission = shared.admission
+            # Query embeddings depend only on the model, so tenants batch together
+            self.embedding_batcher = shared.embedding_batcher
+        else:
+            import ollama
+            self.client = ollama.AsyncClient()
+            
+            self.history = create_history_store(
+                self.config.HISTORY_BACKEND,
+                max_messages=self.config.MAX_HISTORY_LENGTH,
+                max_session_chars=self.config.MAX_SESSION_CHARS,
+                max_sessions=self.config.MAX_SESSIONS,
+                session_ttl=self.config.SESSION_TTL_SECONDS,
+                db_path=self.config.HISTORY_DB_PATH
+            )
+
+            # Retrieval is synchronous (Chroma + SentenceTransformer), so it runs
+            # on a bounded pool instead of the event loop
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.config.RETRIEVAL_WORKERS,
+                thread_name_prefix="retrieval"
+            )
+            self.scheduler = GenerationScheduler(self.config.MAX_CONCURRENT_GENERATIONS)
+            self.admission = AdmissionController(
+                self.scheduler,
+                max_queue_wait=self.config.ADMISSION_MAX_QUEUE_WAIT_SECONDS,
+                max_queue=self.config.ADMISSION_MAX_QUEUE
+            )
+            if self.config.OVERLOAD_MODE == "fallback" and not self.config.FALLBACK_MODEL_NAME:
+                logger.warning("OVERLOAD_MODE is fallback but FALLBACK_MODEL_NAME is empty, rejecting instead")
+            self.embedding_batcher = EmbeddingBatcher(
+                self.knowledge_base.embed_queries,
+                self.run_blocking,
+                max_batch=self.config.EMBED_MICROBATCH_SIZE,
+                max_wait=self.config.EMBED_MICROBATCH_WAIT_MS / 1000
+            )
+
+        self.prompt_builder = PromptBuilder(
+            max_prompt_tokens=self.config.MAX_PROMPT_TOKENS,
+            history_budget=self.config.HISTORY_TOKEN_BUDGET
+        )
+
+        self.counters = {"generations": 0, "skipped_generations": 0, "degraded": 0,
+                         "summaries": 0, "summary_failures": 0}
+        # Turns waiting to be folded into a session's summary, and the task doing it
+        self._summary_pending: Dict[str, List[Dict[str, str]]] = {}
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
+
+        self.answer_cache: Optional[SemanticCache] = None
+        if self.config.ANSWER_CACHE_ENABLED:
+            self.answer_cache = SemanticCache(
+                max_entries=self.config.ANSWER_CACHE_SIZE,
+                ttl=self.config.ANSWER_CACHE_TTL_SECONDS,
+                threshold=self.config.ANSWER_CACHE_THRESHOLD
+            )
 
     def add_knowledge(self, documents: List[Dict[str, Any]]) -> bool:
         """Add documents to knowledge base"""
         return self.knowledge_base.add_documents(documents)
 
-    async def process_message(self, message: str) -> Dict[str, Any]:
-        """Process user message"""
-        try:
-            logger.info(f"Received user message: '{message}'")
-            
-            # Search for relevant context
-            context_docs = self.knowledge_base.search(
-                message, 
-                n_results=self.config.CONTEXT_LENGTH
-            )
-            
-            # Format context with source information
-            context_text = "\n\n".join([
-                f"From {doc['source']}:\n{doc['text']}" 
-                for doc in context_docs
-            ])
-            
-            # Prepare system prompt
-            system_prompt = f"""You are a professional and helpful company assistant focused on providing accurate customer service. Your responses should be based EXCLUSIVELY on the provided company knowledge base.
-            
-Role and Personality:
-- Professional, friendly, and concise in communication
-- Patient and understanding with customers
-- Focused on providing accurate, helpful information
-- Natural conversational style while maintaining professionalism
-
-Response Guidelines:
-1. Knowledge Base Usage:
-    - Use ONLY information from the provided context
-    - Do not invent, assume, or extrapolate information
-    - If information is not in the context, clearly state: "I don't have this information in my knowledge base"
-    
-2. Response Structure:
-    - Start with a direct answer to the question
-    - Provide relevant details from the context if available
-    - Keep responses concise and to the point
-    - Use natural, conversational language
-    
-3. Interaction Rules:
-    - Don't reference the source of your information
-    - Don't apologize for limitations
-    - Don't make promises or commitments
-    - Stay within the scope of provided information
-    
-Available information:
-{context_text}
+    def sync_knowledge(self, documents: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Replace the knowledge base contents, re-embedding only changed chunks"""
+        return self.knowledge_base.sync_documents(documents)
 
-Example Responses:
-Q: "What are your working hours?"
-A: "We're open Monday to Friday, 9 AM to 6 PM."
+    async def run_blocking(self, func, *args):
+        """Run a blocking call on the retrieval executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
 
-Q: "Do you offer international shipping?"
-A: "I don't have this information in my knowledge base."
+    async def search_knowledge(self, query: str, query_embedding: Optional[List[float]] = None,
+                               trace: Optional[Trace] = None) -> List[Dict[str, Any]]:
+        """Search the knowledge base without blocking the event loop"""
+        timings: Dict[str, float] = {}
+        documents = await self.run_blocking(
+            self.knowledge_base.search,
+            query,
+            self.config.CONTEXT_LENGTH,
+            query_embedding,
+            timings
+        )
+        if trace is not None:
+            for stage, name in (("dense", "vector_query"), ("keyword", "keyword_query"), ("fusion", "fusion")):
+                if stage in timings:
+                    trace.record(name, timings[stage])
+        return documents
 
-Remember: Always prioritize accuracy over comprehensiveness. If unsure, acknowledge the limitations of the available information.
-"""
+    async def _retrieve(self, message: str, trace: Trace,
+                        degraded: bool = False) -> Tuple[List[float], List[Dict[str, Any]], Optional[str]]:
+        """
+        Embed the message, retrieve its relevant context and find a ready answer
+        
+        A ready answer is either a cached one or, when no chunk clears the
+        relevance bar, the canned "no information" reply. Either way the
+        caller can skip generation. A degraded request in "retrieval"
+        overload mode gets the top chunk as its ready answer.
+        
+        Returns:
+            Tuple: Query embedding, relevant context documents and a ready answer (or None)
+        """
+        with trace.stage("embed"):
+            embedding = await self.embedding_batcher.embed(message)
+        retrieved = await self.search_knowledge(message, embedding, trace)
+        context_docs, ready_answer = self._ready_answer(embedding, retrieved, degraded)
+        return embedding, context_docs, ready_answer
 
-            # Prepare messages
-            messages = [
-                {"role": "system", "content": system_prompt},
-                *self.conversation_history,
-                {"role": "user", "content": message}
-            ]
-            
-            # Get model response
-            response = self.client.chat(
-                model=self.config.MODEL_NAME,
-                messages=messages
+    def _ready_answer(self, embedding: List[float], retrieved: List[Dict[str, Any]],
+                      degraded: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Keep the relevant retrieved chunks and look for an answer that needs no generation"""
+        context_docs = filter_relevant(
+            retrieved,
+            max_distance=self.config.RELEVANCE_MAX_DISTANCE,
+            max_gap=self.config.RELEVANCE_MAX_GAP,
+            min_keyword_score=self.config.RELEVANCE_MIN_KEYWORD_SCORE
+        )
+        if len(context_docs) < len(retrieved):
+            logger.info(f"Kept {len(context_docs)} of {len(retrieved)} retrieved documents as relevant")
+        
+        if not context_docs and self.config.SKIP_GENERATION_WITHOUT_CONTEXT:
+            self.counters["skipped_generations"] += 1
+            logger.info("No relevant context, answering without generation")
+            return context_docs, NO_INFORMATION_ANSWER
+        
+        if self.answer_cache is not None:
+            cached = self.answer_cache.get(
+                embedding,
+                [doc['id'] for doc in context_docs],
+                self.knowledge_base.version
             )
+            if cached is not None:
+                logger.info("Answer cache hit, skipping generation")
+                return context_docs, cached
+        
+        if degraded:
+            self.counters["degraded"] += 1
+            if self.config.OVERLOAD_MODE == "retrieval":
+                logger.info("Overloaded, answering with the top source")
+                return context_docs[:1], retrieval_only_answer(context_docs)
+        
+        self.counters["generations"] += 1
+        return context_docs, None
+
+    def _cache_answer(self, embedding: List[float], context_docs: List[Dict[str, Any]],
+                      version: int, answer: str) -> None:
+        if self.answer_cache is not None:
+            self.answer_cache.put(embedding, [doc['id'] for doc in context_docs], version, answer)
+
+    async def warm_up(self) -> None:
+        """
+        Load the embedding model and the LLM before the first request
+        
+        Runs one embedding and an empty Ollama generation, which loads the
+        model and keeps it resident for OLLAMA_KEEP_ALIVE. Failures are logged
+        and do not stop startup.
+        """
+        start = time.perf_counter()
+        try:
+            await self.run_blocking(self.knowledge_base.warm_up)
+            logger.info(f"Embedding model warmed up in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logger.warning(f"Embedding warm-up failed: {str(e)}")
+        
+        models = [self.config.MODEL_NAME]
+        if self.config.OVERLOAD_MODE == "fallback" and self.config.FALLBACK_MODEL_NAME:
+            models.append(self.config.FALLBACK_MODEL_NAME)
+        for model in models:
+            start = time.perf_counter()
+            try:
+                await self.client.generate(
+                    model=model,
+                    prompt="",
+                    keep_alive=self.config.OLLAMA_KEEP_ALIVE
+                )
+                logger.info(f"Model {model} loaded in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                logger.warning(f"Model warm-up failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Operational counters of the chatbot"""
+        return {
+            "history": self.history.stats(),
+            "query_embedding_cache": self.knowledge_base.query_cache.stats(),
+            "retrieval_cache": self.knowledge_base.retrieval_cache.stats()
+            if self.knowledge_base.retrieval_cache is not None else None,
+            "answer_cache": self.answer_cache.stats() if self.answer_cache is not None else None,
+            "generation": dict(self.counters),
+            "scheduler": self.scheduler.stats(),
+            "admission": self.admission.stats(),
+            "embedding_batches": self.embedding_batcher.stats()
+        }
+
+    def collect_metrics(self) -> List[Any]:
+        """Current counters and gauges for the /metrics endpoint"""
+        stats = self.stats()
+        cache_hits = Counter("chatbot_cache_hits_total", "Cache lookups that hit", ["cache"])
+        cache_misses = Counter("chatbot_cache_misses_total", "Cache lookups that missed", ["cache"])
+        for cache in ("query_embedding_cache", "retrieval_cache", "answer_cache"):
+            if stats[cache] is not None:
+                cache_hits.inc(stats[cache]["hits"], cache=cache)
+                cache_misses.inc(stats[cache]["misses"], cache=cache)
+
+        generations = Counter("chatbot_generations_total", "Answers by how they were produced", ["kind"])
+        for kind, count in stats["generation"].items():
+            generations.inc(count, kind=kind)
+
+        history = Gauge("chatbot_history", "Session history store size and evictions", ["field"])
+        for field, value in stats["history"].items():
+            history.set(value, field=field)
+
+        scheduler = Gauge("chatbot_scheduler", "Generation scheduler queue and slot usage", ["field"])
+        for field in ("queue_depth", "in_flight", "max_in_flight", "served", "expired", "cancelled",
+                      "service_time_s"):
+            scheduler.set(stats["scheduler"][field], field=field)
+
+        version = Gauge("chatbot_knowledge_version", "Knowledge base version")
+        version.set(self.knowledge_base.version)
+        return [cache_hits, cache_misses, generations, history, scheduler, version]
+
+    @staticmethod
+    def _record_generation(trace: Trace, response: Dict[str, Any]) -> None:
+        """Record Ollama's prefill/generation timings and token counts"""
+        # Durations are reported in nanoseconds
+        if response.get('prompt_eval_duration'):
+            trace.record("ollama_prefill", response['prompt_eval_duration'] / 1e9)
+        if response.get('eval_duration'):
+            trace.record("ollama_generation", response['eval_duration'] / 1e9)
+        if response.get('prompt_eval_count'):
+            TOKENS.inc(response['prompt_eval_count'], direction="in")
+        if response.get('eval_count'):
+            TOKENS.inc(response['eval_count'], direction="out")
+
+    def _build_messages(self, message: str, context_docs: List[Dict[str, Any]], history: List[Dict[str, str]],
+                        summary: Tuple[str, int] = ("", 0),
+                        trace: Optional[Trace] = None) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]]]:
+        """
+        Build the Ollama chat messages for a user message and its context
+        
+        Args:
+            summary: Rolling summary of the trimmed turns and how many tokens they held
+        
+        Returns:
+            Tuple: Messages and the context documents that fit the token budget
+        """
+        trace = trace or Trace()
+        with trace.stage("prompt_build"):
+            messages, used_docs, counts = self.prompt_builder.build(message, context_docs, history, summary[0])
+        if summary[0]:
+            SUMMARY_TOKENS_SAVED.inc(max(0, summary[1] - counts["summary"]))
+        logger.info(
+            f"[trace {trace.trace_id}] Prompt tokens: total={counts['total']} system={counts['system']} "
+            f"context={counts['context']} summary={counts['summary']} history={counts['history']} "
+            f"message={counts['message']} "
+            f"(dropped {counts['dropped_chunks']} chunks, {counts['dropped_turns']} turns)"
+        )
+        return messages, used_docs
+
+    @staticmethod
+    def _sources(context_docs: List[Dict[str, Any]]) -> List[str]:
+        """Distinct source files of the retrieved chunks, in rank order"""
+        return list(dict.fromkeys(doc['source'] for doc in context_docs))
+
+    def _remember(self, session_id: str, message: str, assistant_response: str):
+        """Append a finished exchange to the session history"""
+        # The store trims each session to MAX_HISTORY_LENGTH messages
+        trimmed = self.history.append(session_id, [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": assistant_response}
+        ])
+        if trimmed and self.config.HISTORY_SUMMARY:
+            self._schedule_summary(session_id, trimmed)
+
+    def _schedule_summary(self, session_id: str, turns: List[Dict[str, str]]) -> None:
+        """Queue trimmed turns for the session's background summarizer"""
+        self._summary_pending.setdefault(session_id, []).extend(turns)
+        task = self._summary_tasks.get(session_id)
+        if task is None or task.done():
+            self._summary_tasks[session_id] = asyncio.create_task(self._summarize(session_id))
+
+    async def _summarize(self, session_id: str) -> None:
+        """
+        Fold pending trimmed turns into the session's rolling summary
+        
+        Runs after the response has been returned, at the lowest scheduling
+        priority, so summaries never delay a user-facing generation. One
+        task per session handles all turns queued while it runs.
+        """
+        try:
+            while self._summary_pending.get(session_id):
+                turns = self._summary_pending.pop(session_id)
+                summary, covered = self.history.get_summary(session_id)
+                messages = build_summary_messages(summary, turns, self.config.HISTORY_SUMMARY_MAX_TOKENS)
+                
+                start = time.perf_counter()
+                async with self.scheduler.slot(self.SUMMARY_PRIORITY, self._deadline()):
+                    response = await self.client.chat(
+                        model=self.config.MODEL_NAME,
+                        messages=messages,
+                        keep_alive=self.config.OLLAMA_KEEP_ALIVE,
+                        options={"num_predict": self.config.HISTORY_SUMMARY_MAX_TOKENS * 2}
+                    )
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage="summary")
+                
+                summary = clean_summary(response['message']['content'], self.config.HISTORY_SUMMARY_MAX_TOKENS)
+                covered += sum(count_tokens(turn["content"]) for turn in turns)
+                self.history.set_summary(session_id, summary, covered)
+                self.counters["summaries"] += 1
+                logger.info(f"Summary of session {session_id} updated: {covered} tokens in {count_tokens(summary)}")
+        except Exception as e:
+            self.counters["summary_failures"] += 1
+            logger.warning(f"Summarizing session {session_id} failed: {str(e)}")
+        finally:
+            self._summary_tasks.pop(session_id, None)
+
+    def _session_context(self, session_id: str) -> Tuple[List[Dict[str, str]], Tuple[str, int]]:
+        """Recent turns and, in summary mode, the rolling summary of a session"""
+        history = self.history.get(session_id)
+        summary = self.history.get_summary(session_id) if self.config.HISTORY_SUMMARY else ("", 0)
+        return history, summary
+
+    def admit(self, priority: int = 0) -> Reservation:
+        """
+        Admission control for an interactive chat request
+        
+        Returns:
+            Reservation: Pass it to process_message(_stream), and release it
+            if the request ends before that. Its `degraded` is True if the
+            request should be answered in the degraded OVERLOAD_MODE
+        
+        Raises:
+            Overloaded: The request should be refused
+        """
+        retry_after = self.admission.check(priority)
+        if retry_after is None:
+            ADMISSIONS.inc(decision="admitted")
+            return self.admission.reserve()
+        if self.config.OVERLOAD_MODE == "retrieval":
+            # Answered without generating, so it never joins the queue
+            ADMISSIONS.inc(decision="degraded")
+            return Reservation(None, degraded=True)
+        if self.config.OVERLOAD_MODE == "fallback" and self.config.FALLBACK_MODEL_NAME:
+            ADMISSIONS.inc(decision="degraded")
+            return self.admission.reserve(degraded=True)
+        ADMISSIONS.inc(decision="rejected")
+        raise Overloaded("Server is at capacity", retry_after)
+
+    def _model(self, degraded: bool) -> str:
+        """Model answering a request; degraded requests in fallback mode use the smaller one"""
+        if degraded and self.config.OVERLOAD_MODE == "fallback" and self.config.FALLBACK_MODEL_NAME:
+            return self.config.FALLBACK_MODEL_NAME
+        return self.config.MODEL_NAME
+
+    def _deadline(self) -> float:
+        return time.monotonic() + self.config.REQUEST_TIMEOUT_SECONDS
+
+    async def process_message(self, message: str, session_id: str = DEFAULT_SESSION, priority: int = 0,
+                              trace_id: Optional[str] = None, degraded: bool = False,
+                              reservation: Optional[Reservation] = None) -> Dict[str, Any]:
+        """
+        Process user message
+        
+        Args:
+            message: User message
+            session_id: Conversation the message belongs to
+            priority: Scheduling priority for generation, lower is served first
+            trace_id: Id logged with the request's stage timings (generated if missing)
+            degraded: Answer in the OVERLOAD_MODE, as decided by admit()
+            reservation: What admit() returned, released once the request is queued
+        """
+        trace = Trace(trace_id)
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            deadline = self._deadline()
+            logger.info(f"[trace {trace.trace_id}] Received user message: '{message}'")
             
-            assistant_response = response['message']['content']
+            # Search for relevant context
+            version = self.knowledge_base.version
+            embedding, context_docs, ready_answer = await self._retrieve(message, trace, degraded)
             
-            # Update conversation history
-            self.conversation_history.extend([
-                {"role": "user", "content": message},
-                {"role": "assistant", "content": assistant_response}
-            ])
+            prompt_docs = context_docs
+            if ready_answer is not None:
+                assistant_response = ready_answer
+            else:
+                messages, prompt_docs = self._build_messages(
+                    message, context_docs, *self._session_context(session_id), trace
+                )
+                
+                # Get model response
+                if reservation is not None:
+                    reservation.release()
+                async with self.scheduler.slot(priority, deadline) as wait:
+                    trace.record("queue_wait", wait)
+                    response = await _within_deadline(
+                        self.client.chat(
+                            model=self._model(degraded),
+                            messages=messages,
+                            keep_alive=self.config.OLLAMA_KEEP_ALIVE
+                        ),
+                        deadline
+                    )
+                
+                self._record_generation(trace, response)
+                assistant_response = response['message']['content']
+                if not degraded:
+                    self._cache_answer(embedding, context_docs, version, assistant_response)
             
-            # Limit history length
-            if len(self.conversation_history) > self.config.MAX_HISTORY_LENGTH:
-                self.conversation_history = self.conversation_history[-self.config.MAX_HISTORY_LENGTH:]
+            self._remember(session_id, message, assistant_response)
             
             return {
                 "status": "success",
                 "response": assistant_response,
-                "sources": [doc['source'] for doc in context_docs]
+                "sources": self._sources(prompt_docs),
+                "degraded": degraded,
+                "trace_id": trace.trace_id
             }
             
         except Exception as e:
-            logger.error(f"Error processing message: {str(e)}")
+            ERRORS.inc(type=type(e).__name__)
+            logger.error(f"[trace {trace.trace_id}] Error processing message: {str(e)}")
             return {
                 "status": "error",
-                "error": str(e)
+                "error": str(e),
+                "trace_id": trace.trace_id
+            }
+        finally:
+            if reservation is not None:
+                reservation.release()
+            REQUESTS_IN_FLIGHT.dec()
+            trace.record("total", time.perf_counter() - start)
+
+    async def process_message_stream(self, message: str, session_id: str = DEFAULT_SESSION, priority: int = 0,
+                                     trace_id: Optional[str] = None,
+                                     degraded: bool = False,
+                                     reservation: Optional[Reservation] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process user message, yielding events as the model generates
+        
+        Yields a "sources" event first, then one "token" event per generated
+        chunk and a final "done" event with timing metrics. Failures are
+        reported as a single "error" event. `reservation` is released as in
+        process_message.
+        """
+        trace = Trace(trace_id)
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            logger.info(f"[trace {trace.trace_id}] Received user message (stream): '{message}'")
+            deadline = self._deadline()
+            
+            version = self.knowledge_base.version
+            embedding, context_docs, ready_answer = await self._retrieve(message, trace, degraded)
+            prompt_docs = context_docs
+            if ready_answer is None:
+                messages, prompt_docs = self._build_messages(
+                    message, context_docs, *self._session_context(session_id), trace
+                )
+            yield {"type": "sources", "sources": self._sources(prompt_docs), "trace_id": trace.trace_id}
+            
+            if ready_answer is not None:
+                self._remember(session_id, message, ready_answer)
+                yield {"type": "token", "content": ready_answer}
+                yield {
+                    "type": "done",
+                    "ttft": time.perf_counter() - start,
+                    "tokens": 0,
+                    "tokens_per_sec": 0.0,
+                    "generated": False,
+                    "degraded": degraded
+                }
+                return
+            
+            parts: List[str] = []
+            first_token_at: Optional[float] = None
+            eval_count: Optional[int] = None
+            
+            if reservation is not None:
+                reservation.release()
+            async with self.scheduler.slot(priority, deadline) as wait:
+                trace.record("queue_wait", wait)
+                # The deadline also bounds generation, as in process_message
+                stream = await _within_deadline(
+                    self.client.chat(
+                        model=self._model(degraded),
+                        messages=messages,
+                        stream=True,
+                        keep_alive=self.config.OLLAMA_KEEP_ALIVE
+                    ),
+                    deadline
+                )
+                async for chunk in _until_deadline(stream, deadline):
+                    content = chunk['message']['content']
+                    if content:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        parts.append(content)
+                        yield {"type": "token", "content": content}
+                    if chunk.get('done'):
+                        eval_count = chunk.get('eval_count')
+                        self._record_generation(trace, chunk)
+            
+            end = time.perf_counter()
+            assistant_response = "".join(parts)
+            self._remember(session_id, message, assistant_response)
+            if not degraded:
+                self._cache_answer(embedding, context_docs, version, assistant_response)
+            
+            # Ollama reports eval_count on the final chunk; fall back to chunk count
+            tokens = eval_count if eval_count is not None else len(parts)
+            ttft = (first_token_at or end) - start
+            generation_time = end - (first_token_at or end)
+            tokens_per_sec = tokens / generation_time if generation_time > 0 else 0.0
+            trace.record("ttft", ttft)
+            logger.info(
+                f"[trace {trace.trace_id}] Stream finished: ttft={ttft:.3f}s tokens={tokens} "
+                f"tokens/sec={tokens_per_sec:.1f} total={end - start:.3f}s"
+            )
+            
+            yield {
+                "type": "done",
+                "ttft": ttft,
+                "tokens": tokens,
+                "tokens_per_sec": tokens_per_sec,
+                "degraded": degraded
             }
+            
+        except Exception as e:
+            ERRORS.inc(type=type(e).__name__)
+            logger.error(f"[trace {trace.trace_id}] Error processing message: {str(e)}")
+            yield {"type": "error", "error": str(e), "trace_id": trace.trace_id}
+        finally:
+            if reservation is not None:
+                reservation.release()
+            REQUESTS_IN_FLIGHT.dec()
+            trace.record("total", time.perf_counter() - start)
 
-    def clear_history(self):
+    async def process_messages(self, messages: List[str], priority: int = BATCH_PRIORITY,
+                               trace_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answer a batch of independent messages, yielding results as they finish
+        
+        Stateless: no session history is read or written. Every
+        BATCH_RETRIEVAL_SIZE messages are embedded with one encode call and
+        searched with one vector store query; generations then run at most
+        BATCH_CONCURRENCY at a time, behind interactive requests. Answers go
+        to the answer cache, so a replay also warms it.
+        
+        Yields one "result" event per message (with its index, in completion
+        order) and a final "summary" event with batch throughput.
+        """
+        trace = Trace(trace_id)
+        start = time.perf_counter()
+        logger.info(f"[trace {trace.trace_id}] Received batch of {len(messages)} messages")
+        limit = asyncio.Semaphore(self.config.BATCH_CONCURRENCY)
+        results: asyncio.Queue = asyncio.Queue()
+        tasks: List[asyncio.Task] = []
+        
+        async def retrieve_all() -> None:
+            size = max(1, self.config.BATCH_RETRIEVAL_SIZE)
+            for offset in range(0, len(messages), size):
+                chunk = messages[offset:offset + size]
+                chunk_start = time.perf_counter()
+                version = self.knowledge_base.version
+                try:
+                    with trace.stage("embed"):
+                        embeddings = await self.run_blocking(self.knowledge_base.embed_queries, chunk)
+                    timings: Dict[str, float] = {}
+                    retrieved = await self.run_blocking(
+                        self.knowledge_base.search_many, chunk, self.config.CONTEXT_LENGTH, embeddings, timings
+                    )
+                    for stage, name in (("dense", "vector_query"), ("keyword", "keyword_query"), ("fusion", "fusion")):
+                        if stage in timings:
+                            trace.record(name, timings[stage])
+                except Exception as e:
+                    ERRORS.inc(type=type(e).__name__)
+                    logger.error(f"[trace {trace.trace_id}] Batch retrieval failed: {str(e)}")
+                    for index in range(offset, offset + len(chunk)):
+                        results.put_nowait(self._batch_error(index, e, chunk_start))
+                    continue
+                for i, (message, embedding, docs) in enumerate(zip(chunk, embeddings, retrieved)):
+                    tasks.append(asyncio.create_task(self._answer_batch_item(
+                        offset + i, message, embedding, docs, version, chunk_start, limit, priority, results
+                    )))
+        
+        producer = asyncio.create_task(retrieve_all())
+        totals = {"succeeded": 0, "failed": 0, "generated": 0, "tokens": 0}
+        try:
+            for _ in range(len(messages)):
+                result = await results.get()
+                if result["status"] == "success":
+                    totals["succeeded"] += 1
+                    totals["generated"] += result["generated"]
+                    totals["tokens"] += result["tokens"]
+                else:
+                    totals["failed"] += 1
+                yield result
+        finally:
+            # Runs early if the consumer stops reading, e.g. a client disconnect
+            producer.cancel()
+            for task in tasks:
+                task.cancel()
+        
+        elapsed = time.perf_counter() - start
+        trace.record("batch_total", elapsed)
+        logger.info(
+            f"[trace {trace.trace_id}] Batch finished: {len(messages)} messages in {elapsed:.2f}s "
+            f"({totals['failed']} failed, {totals['generated']} generated)"
+        )
+        yield {
+            "type": "summary",
+            "items": len(messages),
+            **totals,
+            "elapsed_s": elapsed,
+            "items_per_sec": len(messages) / elapsed if elapsed > 0 else 0.0,
+            "tokens_per_sec": totals["tokens"] / elapsed if elapsed > 0 else 0.0,
+            "trace_id": trace.trace_id
+        }
+
+    async def _answer_batch_item(self, index: int, message: str, embedding: List[float],
+                                 retrieved: List[Dict[str, Any]], version: int, start: float,
+                                 limit: asyncio.Semaphore, priority: int, results: asyncio.Queue) -> None:
+        """Answer one message of a batch and put its result on the queue"""
+        try:
+            context_docs, ready_answer = self._ready_answer(embedding, retrieved)
+            prompt_docs = context_docs
+            tokens, wait, generation_time = 0, 0.0, 0.0
+            if ready_answer is not None:
+                answer = ready_answer
+            else:
+                messages, prompt_docs = self._build_messages(message, context_docs, [])
+                async with limit:
+                    deadline = self._deadline()
+                    async with self.scheduler.slot(priority, deadline) as wait:
+                        generation_start = time.perf_counter()
+                        response = await _within_deadline(
+                            self.client.chat(
+                                model=self.config.MODEL_NAME,
+                                messages=messages,
+                                keep_alive=self.config.OLLAMA_KEEP_ALIVE
+                            ),
+                            deadline
+                        )
+                        generation_time = time.perf_counter() - generation_start
+                tokens = response.get('eval_count') or 0
+                TOKENS.inc(response.get('prompt_eval_count') or 0, direction="in")
+                TOKENS.inc(tokens, direction="out")
+                answer = response['message']['content']
+                self._cache_answer(embedding, context_docs, version, answer)
+            
+            results.put_nowait({
+                "type": "result",
+                "index": index,
+                "status": "success",
+                "response": answer,
+                "sources": self._sources(prompt_docs),
+                "generated": ready_answer is None,
+                "latency_s": time.perf_counter() - start,
+                "queue_wait_s": wait,
+                "generation_s": generation_time,
+                "tokens": tokens,
+                "tokens_per_sec": tokens / generation_time if generation_time > 0 else 0.0
+            })
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            ERRORS.inc(type=type(e).__name__)
+            logger.error(f"Error answering batch message {index}: {str(e)}")
+            results.put_nowait(self._batch_error(index, e, start))
+
+    @staticmethod
+    def _batch_error(index: int, error: Exception, start: float) -> Dict[str, Any]:
+        return {
+            "type": "result",
+            "index": index,
+            "status": "error",
+            "error": str(error),
+            "latency_s": time.perf_counter() - start
+        }
+
+    def clear_history(self, session_id: str = DEFAULT_SESSION):
         """Clear conversation history"""
-        self.conversation_history = []
-        logger.info("Conversation history cleared")
+        self.history.clear(session_id)
+        logger.info(f"Conversation history cleared for session {session_id}")
+
+    def close(self):
+        """Release executors and the history store (a tenant bot only releases its knowledge base)"""
+        for task in self._summary_tasks.values():
+            task.cancel()
+        if not self._shared:
+            self._executor.shutdown(wait=False)
+            self.history.close()
+        self.knowledge_base.close()
 
 async def main():
     # Initialize bot
     bot = Chatbot()
     
     # Load knowledge files
-    documents = load_knowledge_files()
-    if documents:
-        bot.add_knowledge(documents)
-    else:
+    documents = load_knowledge_files(
+        max_tokens=bot.config.CHUNK_MAX_TOKENS,
+        overlap_tokens=bot.config.CHUNK_OVERLAP_TOKENS
+    )
+    bot.sync_knowledge(documents)
+    await bot.warm_up()
+    if not documents:
         logger.warning("No knowledge files found in knowledge directory")
     
     print("\nChatbot is ready. Type 'exit' to quit.\n")
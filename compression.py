@@ -0,0 +1,130 @@
+# compression.py
+import gzip
+import hashlib
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+def accepted_encoding(accept_encoding: str) -> Optional[str]:
+    """Best encoding the client accepts: br if brotli is installed, then gzip"""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+def _compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+def _opaque_tag(tag: str) -> str:
+    """Entity tag without its weakness prefix, for weak comparison"""
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+class CompressionMiddleware:
+    """
+    Compress single-body responses of at least minimum_size bytes
+
+    Streaming responses (SSE, NDJSON) pass through untouched: compressing
+    them would hold tokens back until a compressor block fills. Responses
+    that already carry a Content-Encoding are left alone as well.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = accepted_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Held back until the first body part shows whether to compress
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=list(start["headers"]))
+            if (message.get("more_body", False) or len(body) < self.minimum_size
+                    or "content-encoding" in headers or not _compressible(headers.get("content-type", ""))):
+                await send(start)
+                await send(message)
+                return
+
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send({**start, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
+
+class StaticAsset:
+    """
+    A file served from memory with an ETag and precompressed variants
+
+    The file is read and compressed once; requests only pick a variant, and
+    a matching If-None-Match gets an empty 304. The ETag is weak because the
+    gzip, br and identity variants share it.
+    """
+
+    def __init__(self, path: str, media_type: str, max_age: int = 300):
+        with open(path, "rb") as f:
+            body = f.read()
+        self.media_type = media_type
+        self.etag = f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.cache_control = f"public, max-age={max_age}"
+        self.variants: Dict[str, bytes] = {"identity": body, "gzip": compress(body, "gzip")}
+        if brotli is not None:
+            self.variants["br"] = compress(body, "br")
+
+    def response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match", "")
+        tags = {_opaque_tag(tag) for tag in if_none_match.split(",") if tag.strip()}
+        if _opaque_tag(self.etag) in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+
+        encoding = accepted_encoding(request.headers.get("accept-encoding", ""))
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(self.variants[encoding or "identity"], media_type=self.media_type, headers=headers)
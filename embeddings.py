@@ -0,0 +1,153 @@
+# embeddings.py
+import os
+import logging
+from typing import List, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+ENGINES = ("sentence-transformers", "onnx")
+
+def _hub_id(model_name: str) -> str:
+    """Hugging Face id of a sentence-transformers model name"""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+def embedding_signature(model_name: str, quantize: bool) -> str:
+    """
+    Identifies the vectors an engine produces
+
+    Both engines run the same model in float32 and give the same vectors
+    (see benchmarks.embeddings --parity), so only the model and int8
+    quantization change the signature.
+    """
+    return f"{_hub_id(model_name)}:{'int8' if quantize else 'fp32'}"
+
+class OnnxEmbeddingEngine:
+    """
+    Sentence embeddings with ONNX Runtime
+
+    The model is exported from Hugging Face to ONNX once (this needs torch
+    and transformers) and cached in cache_dir; later starts only load
+    onnxruntime and tokenizers. Texts are sorted by length and padded per
+    batch, so short queries are not padded to the longest text in a bulk
+    call. Output matches sentence-transformers: mean pooling over tokens,
+    then L2 normalization.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, cache_dir: str = "./knowledge_base/onnx",
+                 threads: int = 0, quantize: bool = False, max_batch: int = 64, max_length: int = 256):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model_name = _hub_id(model_name)
+        self.max_batch = max_batch
+        self.model_dir = os.path.join(cache_dir, self.model_name.replace("/", "--"))
+        model_path = os.path.join(self.model_dir, "model.onnx")
+        if not os.path.exists(model_path):
+            self._export(model_path)
+        if quantize:
+            model_path = self._quantize(model_path)
+
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        logger.info(f"ONNX embedding engine loaded from {model_path} "
+                    f"({threads or 'default'} intra-op threads)")
+
+    def _export(self, model_path: str) -> None:
+        """Export the Hugging Face model to ONNX with dynamic batch and sequence axes"""
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        logger.info(f"Exporting {self.model_name} to ONNX, this happens once")
+        os.makedirs(self.model_dir, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        model = AutoModel.from_pretrained(self.model_name)
+        model.eval()
+
+        names = ["input_ids", "attention_mask", "token_type_ids"]
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]}
+        tmp_path = f"{model_path}.tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in names),
+                tmp_path,
+                input_names=names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+        tokenizer.save_pretrained(self.model_dir)
+        os.replace(tmp_path, model_path)
+
+    def _quantize(self, model_path: str) -> str:
+        """Dynamic int8 quantization of the weights, cached next to the float model"""
+        quantized_path = os.path.join(self.model_dir, "model.int8.onnx")
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        return quantized_path
+
+    def _encode_batch(self, texts: Sequence[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(list(texts))
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64)
+        }
+        hidden = self.session.run(None, {k: v for k, v in inputs.items() if k in self._input_names})[0]
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def __call__(self, input: Sequence[str]) -> List[List[float]]:
+        if not input:
+            return []
+        # Batch texts of similar length together to keep padding small
+        order = sorted(range(len(input)), key=lambda i: len(input[i]))
+        result: List[List[float]] = [None] * len(input)
+        for start in range(0, len(order), self.max_batch):
+            indices = order[start:start + self.max_batch]
+            for i, vector in zip(indices, self._encode_batch([input[i] for i in indices])):
+                result[i] = vector.tolist()
+        return result
+
+def create_embedding_engine(engine: str = "sentence-transformers", model_name: str = DEFAULT_MODEL,
+                            threads: int = 0, quantize: bool = False, cache_dir: str = "./knowledge_base/onnx",
+                            max_batch: int = 64):
+    """
+    Build the embedding function used by KnowledgeBase
+
+    Args:
+        engine: "sentence-transformers" (PyTorch) or "onnx" (ONNX Runtime)
+        model_name: sentence-transformers model name
+        threads: Intra-op threads for inference (0 keeps the library default)
+        quantize: Use int8 dynamic quantization (onnx engine only)
+        cache_dir: Where the ONNX export is stored
+        max_batch: Texts per inference call (onnx engine)
+    """
+    if engine == "onnx":
+        return OnnxEmbeddingEngine(model_name, cache_dir, threads=threads, quantize=quantize, max_batch=max_batch)
+    if engine != "sentence-transformers":
+        raise ValueError(f"Unknown embedding engine {engine!r}, use one of {ENGINES}")
+    if quantize:
+        logger.warning("EMBEDDING_QUANTIZE only applies to the onnx engine, ignoring it")
+    if threads > 0:
+        import torch
+        # Process-wide setting; the server only runs one embedding model
+        torch.set_num_threads(threads)
+
+    from chromadb.utils import embedding_functions
+    return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
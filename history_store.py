@@ -0,0 +1,332 @@
+# history_store.py
+import sqlite3
+import threading
+import time
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION = "default"
+
+class HistoryStore(ABC):
+    """Session-keyed conversation history"""
+
+    def __init__(self, max_messages: int = 10, max_session_chars: int = 20000,
+                 max_sessions: int = 1000, session_ttl: float = 3600.0):
+        self.max_messages = max_messages
+        self.max_session_chars = max_session_chars
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.evictions = {"lru": 0, "ttl": 0, "trimmed_messages": 0}
+
+    @abstractmethod
+    def get(self, session_id: str) -> List[Dict[str, str]]:
+        """Return the messages of a session, oldest first"""
+
+    @abstractmethod
+    def append(self, session_id: str, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Append messages to a session, trimming it to its limits
+
+        Returns:
+            List[Dict[str, str]]: Messages trimmed from the session, oldest first
+        """
+
+    @abstractmethod
+    def get_summary(self, session_id: str) -> Tuple[str, int]:
+        """Return a session's rolling summary and the tokens of the turns it covers"""
+
+    @abstractmethod
+    def set_summary(self, session_id: str, summary: str, covered_tokens: int) -> None:
+        """Store a session's rolling summary; ignored if the session no longer exists"""
+
+    @abstractmethod
+    def clear(self, session_id: str) -> None:
+        """Drop a session's history"""
+
+    @abstractmethod
+    def session_count(self) -> int:
+        """Return the number of sessions held"""
+
+    def stats(self) -> Dict[str, int]:
+        """Return session count and eviction counters"""
+        return {"sessions": self.session_count(), **self.evictions}
+
+    def close(self) -> None:
+        """Release backend resources"""
+
+class InMemoryHistoryStore(HistoryStore):
+    """In-process history store with LRU and TTL eviction"""
+
+    def __init__(self, max_total_chars: int = 20_000_000, **kwargs):
+        super().__init__(**kwargs)
+        self.max_total_chars = max_total_chars
+        # session_id -> (messages, total chars, last access, summary, tokens covered by summary)
+        self._sessions: "OrderedDict[str, List]" = OrderedDict()
+        self._total_chars = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        # Sessions are kept in access order, so expired ones sit at the front
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if now - entry[2] <= self.session_ttl:
+                break
+            self._drop(session_id)
+            self.evictions["ttl"] += 1
+
+    def _drop(self, session_id: str) -> None:
+        entry = self._sessions.pop(session_id)
+        self._total_chars -= entry[1]
+
+    def _touch(self, session_id: str, now: float) -> List:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            entry = [deque(maxlen=self.max_messages), 0, now, "", 0]
+            self._sessions[session_id] = entry
+        else:
+            entry[2] = now
+            self._sessions.move_to_end(session_id)
+        return entry
+
+    def get(self, session_id: str) -> List[Dict[str, str]]:
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            entry[2] = now
+            self._sessions.move_to_end(session_id)
+            return list(entry[0])
+
+    def append(self, session_id: str, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        trimmed: List[Dict[str, str]] = []
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            entry = self._touch(session_id, now)
+            history: Deque[Dict[str, str]] = entry[0]
+
+            for message in messages:
+                if not history.maxlen:
+                    # max_messages=0 keeps no history: trimmed right away, as in SQLite
+                    trimmed.append(message)
+                    self.evictions["trimmed_messages"] += 1
+                    continue
+                if len(history) == history.maxlen:
+                    trimmed.append(history[0])
+                    dropped = len(history[0]["content"])
+                    entry[1] -= dropped
+                    self._total_chars -= dropped
+                    self.evictions["trimmed_messages"] += 1
+                history.append(message)
+                entry[1] += len(message["content"])
+                self._total_chars += len(message["content"])
+
+            # Per-session size cap, keeping at least the newest message
+            while entry[1] > self.max_session_chars and len(history) > 1:
+                removed = history.popleft()
+                trimmed.append(removed)
+                entry[1] -= len(removed["content"])
+                self._total_chars -= len(removed["content"])
+                self.evictions["trimmed_messages"] += 1
+
+            # Global caps: evict least recently used sessions
+            while len(self._sessions) > 1 and (
+                len(self._sessions) > self.max_sessions
+                or self._total_chars > self.max_total_chars
+            ):
+                oldest = next(iter(self._sessions))
+                self._drop(oldest)
+                self.evictions["lru"] += 1
+        return trimmed
+
+    def get_summary(self, session_id: str) -> Tuple[str, int]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return (entry[3], entry[4]) if entry is not None else ("", 0)
+
+    def set_summary(self, session_id: str, summary: str, covered_tokens: int) -> None:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                entry[3], entry[4] = summary, covered_tokens
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            if session_id in self._sessions:
+                self._drop(session_id)
+
+    def session_count(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, int]:
+        stats = super().stats()
+        stats["chars"] = self._total_chars
+        return stats
+
+class SQLiteHistoryStore(HistoryStore):
+    """On-disk history store backed by SQLite"""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS summaries (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                covered_tokens INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id);
+            CREATE INDEX IF NOT EXISTS sessions_access ON sessions (last_access);
+        """)
+        logger.info(f"SQLite history store opened at {path}")
+
+    def _delete_sessions(self, session_ids: List[str]) -> None:
+        self._conn.executemany("DELETE FROM messages WHERE session_id = ?", [(s,) for s in session_ids])
+        self._conn.executemany("DELETE FROM summaries WHERE session_id = ?", [(s,) for s in session_ids])
+        self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(s,) for s in session_ids])
+
+    def _expire(self, now: float) -> None:
+        expired = [row[0] for row in self._conn.execute(
+            "SELECT session_id FROM sessions WHERE last_access < ?",
+            (now - self.session_ttl,)
+        )]
+        if expired:
+            self._delete_sessions(expired)
+            self.evictions["ttl"] += len(expired)
+
+    def get(self, session_id: str) -> List[Dict[str, str]]:
+        with self._lock, self._conn:
+            now = time.time()
+            self._expire(now)
+            self._conn.execute(
+                "UPDATE sessions SET last_access = ? WHERE session_id = ?",
+                (now, session_id)
+            )
+            rows = self._conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id",
+                (session_id,)
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def append(self, session_id: str, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        trimmed: List[Dict[str, str]] = []
+        with self._lock, self._conn:
+            now = time.time()
+            self._expire(now)
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, last_access) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+                (session_id, now)
+            )
+            self._conn.executemany(
+                "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                [(session_id, m["role"], m["content"]) for m in messages]
+            )
+
+            # Trim to the newest messages that fit the count and size caps
+            rows = self._conn.execute(
+                "SELECT id, length(content) FROM messages WHERE session_id = ? ORDER BY id DESC",
+                (session_id,)
+            ).fetchall()
+            keep, chars = 0, 0
+            for _, length in rows:
+                if keep >= self.max_messages or (keep > 0 and chars + length > self.max_session_chars):
+                    break
+                keep += 1
+                chars += length
+            if keep < len(rows):
+                # rows[keep] is the newest message to drop (keep may be 0)
+                trimmed = [{"role": role, "content": content} for role, content in self._conn.execute(
+                    "SELECT role, content FROM messages WHERE session_id = ? AND id <= ? ORDER BY id",
+                    (session_id, rows[keep][0])
+                )]
+                self._conn.execute(
+                    "DELETE FROM messages WHERE session_id = ? AND id <= ?",
+                    (session_id, rows[keep][0])
+                )
+                self.evictions["trimmed_messages"] += len(rows) - keep
+
+            overflow = self.session_count() - self.max_sessions
+            if overflow > 0:
+                oldest = [row[0] for row in self._conn.execute(
+                    "SELECT session_id FROM sessions WHERE session_id != ? "
+                    "ORDER BY last_access LIMIT ?",
+                    (session_id, overflow)
+                )]
+                self._delete_sessions(oldest)
+                self.evictions["lru"] += len(oldest)
+        return trimmed
+
+    def get_summary(self, session_id: str) -> Tuple[str, int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, covered_tokens FROM summaries WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+        return (row[0], row[1]) if row else ("", 0)
+
+    def set_summary(self, session_id: str, summary: str, covered_tokens: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO summaries (session_id, summary, covered_tokens) "
+                "SELECT session_id, ?, ? FROM sessions WHERE session_id = ? "
+                "ON CONFLICT(session_id) DO UPDATE SET summary = excluded.summary, "
+                "covered_tokens = excluded.covered_tokens",
+                (summary, covered_tokens, session_id)
+            )
+
+    def clear(self, session_id: str) -> None:
+        with self._lock, self._conn:
+            self._delete_sessions([session_id])
+
+    def session_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+def create_history_store(backend: str, max_messages: int, max_session_chars: int,
+                         max_sessions: int, session_ttl: float,
+                         db_path: Optional[str] = None) -> HistoryStore:
+    """
+    Create a history store for the configured backend
+
+    Args:
+        backend: "memory" or "sqlite"
+        db_path: SQLite database file, required for the sqlite backend
+
+    Returns:
+        HistoryStore: The configured store
+    """
+    limits = dict(
+        max_messages=max_messages,
+        max_session_chars=max_session_chars,
+        max_sessions=max_sessions,
+        session_ttl=session_ttl
+    )
+    if backend == "memory":
+        return InMemoryHistoryStore(**limits)
+    if backend == "sqlite":
+        if not db_path:
+            raise ValueError("db_path is required for the sqlite history backend")
+        return SQLiteHistoryStore(db_path, **limits)
+    raise ValueError(f"Unknown history backend: {backend}")
@@ -0,0 +1,221 @@
+# index_service.py
+"""
+Shared knowledge index for multi-worker deployments
+
+Runs as one process that owns the Chroma collection, the BM25 index and
+the embedding model. It ingests the knowledge directory once at startup
+(the leader), keeps watching it for changes, and serves embedding and
+search requests to server workers, which connect via RemoteKnowledgeBase.
+
+Tenant indexes are served the same way under /t/{tenant}/: the service
+loads them on first use, evicts idle ones and is their only writer, so
+workers never open a tenant index themselves.
+
+Usage:
+    python index_service.py        # or started automatically by server.py when WORKERS > 1
+"""
+import os
+import logging
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+import numpy as np
+import uvicorn
+
+from chatbot import ChatbotConfig, local_knowledge_base
+from knowledge_loader import KnowledgeManager, KnowledgeWatcher
+from tenants import TenantManager, UnknownTenant, tenant_config
+
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+logger = logging.getLogger(__name__)
+
+app = FastAPI()
+
+class IndexHost:
+    """Holds the local knowledge base in the shape KnowledgeManager expects"""
+
+    def __init__(self, config: ChatbotConfig, embedding_function=None):
+        self.config = config
+        self.knowledge_base = local_knowledge_base(config, embedding_function)
+
+    def add_knowledge(self, documents: List[Dict[str, Any]]) -> bool:
+        return self.knowledge_base.add_documents(documents)
+
+    def close(self) -> None:
+        self.knowledge_base.close()
+
+host: Optional[IndexHost] = None
+watcher: Optional[KnowledgeWatcher] = None
+tenants: Optional[TenantManager] = None
+
+class EmbedRequest(BaseModel):
+    queries: List[str]
+
+class SearchRequest(BaseModel):
+    query: str
+    n_results: int = 3
+    query_embedding: Optional[List[float]] = None
+
+class SearchBatchRequest(BaseModel):
+    queries: List[str]
+    n_results: int = 3
+    query_embeddings: Optional[List[List[float]]] = None
+
+def _to_list(embedding) -> List[float]:
+    return np.asarray(embedding, dtype=np.float32).tolist()
+
+def build_tenant_host(name: str, directory: str) -> IndexHost:
+    """Open a tenant's index with the service's embedding model and sync its files (blocking)"""
+    tenant_host = IndexHost(tenant_config(host.config, directory), host.knowledge_base.embedding_function)
+    try:
+        report = KnowledgeManager(tenant_host).sync_directory(tenant_host.config.KNOWLEDGE_DIR)
+    except Exception:
+        tenant_host.close()
+        raise
+    logger.info(f"Tenant {name}: {report['skipped']} chunks reused, {report['embedded']} embedded")
+    return tenant_host
+
+@app.on_event("startup")
+def startup_event():
+    """Ingest the knowledge directory once and start watching it"""
+    global host, watcher, tenants
+    config = ChatbotConfig()
+    host = IndexHost(config)
+    os.makedirs(config.KNOWLEDGE_DIR, exist_ok=True)
+    manager = KnowledgeManager(host)
+    manager.sync_directory(config.KNOWLEDGE_DIR)
+    host.knowledge_base.warm_up()
+
+    watcher = KnowledgeWatcher(
+        config.KNOWLEDGE_DIR,
+        manager.reload_files,
+        interval=config.KNOWLEDGE_WATCH_INTERVAL
+    )
+    if config.KNOWLEDGE_WATCH:
+        watcher.start()
+    tenants = TenantManager(
+        build_tenant_host,
+        config.TENANTS_DIR,
+        memory_budget=config.TENANT_MEMORY_BUDGET_MB * 2 ** 20,
+        max_loaded=config.MAX_LOADED_TENANTS
+    )
+    logger.info("Index service ready")
+
+@app.on_event("shutdown")
+def shutdown_event():
+    if watcher is not None:
+        watcher.stop()
+    if tenants is not None:
+        tenants.close()
+    if host is not None:
+        host.close()
+
+# Handlers are plain functions so FastAPI runs them on its thread pool;
+# KnowledgeBase does its own read/write locking.
+
+def _embed(knowledge_base, request: EmbedRequest) -> Dict[str, Any]:
+    embeddings = knowledge_base.embed_queries(request.queries)
+    return {"embeddings": [_to_list(e) for e in embeddings], "version": knowledge_base.version}
+
+def _search(knowledge_base, request: SearchRequest) -> Dict[str, Any]:
+    timings: Dict[str, float] = {}
+    try:
+        documents = knowledge_base.search(
+            request.query,
+            request.n_results,
+            request.query_embedding,
+            timings
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"documents": documents, "timings": timings, "version": knowledge_base.version}
+
+def _search_batch(knowledge_base, request: SearchBatchRequest) -> Dict[str, Any]:
+    timings: Dict[str, float] = {}
+    try:
+        documents = knowledge_base.search_many(
+            request.queries,
+            request.n_results,
+            request.query_embeddings,
+            timings
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"documents": documents, "timings": timings, "version": knowledge_base.version}
+
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok", "version": host.knowledge_base.version}
+
+@app.post("/embed")
+def embed(request: EmbedRequest):
+    return _embed(host.knowledge_base, request)
+
+@app.post("/search")
+def search(request: SearchRequest):
+    return _search(host.knowledge_base, request)
+
+@app.post("/search/batch")
+def search_batch(request: SearchBatchRequest):
+    return _search_batch(host.knowledge_base, request)
+
+@app.post("/reload")
+def reload():
+    report = watcher.poll()
+    report["version"] = host.knowledge_base.version
+    return report
+
+@app.get("/stats")
+def stats():
+    return {
+        "version": host.knowledge_base.version,
+        "query_embedding_cache": host.knowledge_base.query_cache.stats(),
+        "retrieval_cache": host.knowledge_base.retrieval_cache.stats()
+        if host.knowledge_base.retrieval_cache is not None else None,
+        "tenants": tenants.stats()
+    }
+
+# Tenant routes hold the tenant for the whole call, so it cannot be evicted
+# mid-request, and run the blocking work on the thread pool.
+
+async def _with_tenant(tenant: str, func, request=None) -> Dict[str, Any]:
+    try:
+        tenants.directory(tenant)
+    except UnknownTenant:
+        raise HTTPException(status_code=404, detail=f"Unknown tenant {tenant}")
+    async with tenants.use(tenant) as tenant_host:
+        return await run_in_threadpool(func, tenant_host, request)
+
+@app.get("/t/{tenant}/healthz")
+async def tenant_healthz(tenant: str):
+    """Load the tenant if needed; workers call this when they open a tenant"""
+    return await _with_tenant(
+        tenant, lambda tenant_host, _: {"status": "ok", "version": tenant_host.knowledge_base.version}
+    )
+
+@app.post("/t/{tenant}/embed")
+async def tenant_embed(tenant: str, request: EmbedRequest):
+    return await _with_tenant(tenant, lambda tenant_host, r: _embed(tenant_host.knowledge_base, r), request)
+
+@app.post("/t/{tenant}/search")
+async def tenant_search(tenant: str, request: SearchRequest):
+    return await _with_tenant(tenant, lambda tenant_host, r: _search(tenant_host.knowledge_base, r), request)
+
+@app.post("/t/{tenant}/search/batch")
+async def tenant_search_batch(tenant: str, request: SearchBatchRequest):
+    return await _with_tenant(tenant, lambda tenant_host, r: _search_batch(tenant_host.knowledge_base, r), request)
+
+@app.post("/t/{tenant}/reload")
+async def tenant_reload(tenant: str):
+    def reload_files(tenant_host: IndexHost, _) -> Dict[str, Any]:
+        report = KnowledgeManager(tenant_host).reload_directory(tenant_host.config.KNOWLEDGE_DIR)
+        report["version"] = tenant_host.knowledge_base.version
+        return report
+    return await _with_tenant(tenant, reload_files)
+
+if __name__ == "__main__":
+    config = ChatbotConfig()
+    uvicorn.run(app, host="127.0.0.1", port=config.INDEX_SERVICE_PORT, workers=1, log_level="info")
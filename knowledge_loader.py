@@ -1,66 +1,219 @@
 # knowledge_loader.py
+import hashlib
 import os
-from typing import List, Dict, Any
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Deque, Iterator, Optional, Tuple
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate the number of model tokens in a text
+    
+    Counts words and punctuation marks, which tracks subword tokenizers
+    closely enough for budgeting without loading a tokenizer.
+    """
+    return len(_TOKEN_RE.findall(text))
+
+def _iter_units(text: str, max_tokens: int) -> Iterator[Tuple[str, int, bool]]:
+    """Yield (text, tokens, starts_paragraph) units no larger than max_tokens"""
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph)
+        if tokens <= max_tokens:
+            yield paragraph, tokens, True
+            continue
+        
+        # Oversized paragraph: fall back to sentences, then to word windows
+        first = True
+        for sentence in _SENTENCE_RE.split(paragraph):
+            sentence_tokens = count_tokens(sentence)
+            if sentence_tokens <= max_tokens:
+                yield sentence, sentence_tokens, first
+                first = False
+                continue
+            words = sentence.split()
+            step = max(1, len(words) * max_tokens // sentence_tokens)
+            for i in range(0, len(words), step):
+                piece = " ".join(words[i:i + step])
+                yield piece, count_tokens(piece), first
+                first = False
+
+def _tail_words(text: str, max_tokens: int) -> Tuple[str, int]:
+    """Trailing words of a text that fit in max_tokens tokens, and their token count"""
+    words: List[str] = []
+    tokens = 0
+    for word in reversed(text.split()):
+        word_tokens = count_tokens(word)
+        if tokens + word_tokens > max_tokens:
+            break
+        words.append(word)
+        tokens += word_tokens
+    return " ".join(reversed(words)), tokens
+
+def iter_chunks(text: str, max_tokens: int = 256, overlap_tokens: int = 32) -> Iterator[str]:
+    """
+    Split text into chunks of at most max_tokens tokens
+    
+    Paragraphs are kept whole where possible and consecutive chunks share
+    up to overlap_tokens tokens of trailing context: whole units where they
+    fit, topped up with the last words of the unit before them. Runs in
+    linear time.
+    
+    Args:
+        text: Text to split
+        max_tokens: Token budget of one chunk
+        overlap_tokens: Tokens repeated from the end of the previous chunk
+        
+    Yields:
+        str: Chunk text
+    """
+    current: Deque[Tuple[str, int, bool]] = deque()
+    current_tokens = 0
+    fresh = 0  # Units added since the last emitted chunk
+    
+    def render() -> str:
+        return "".join(
+            (("\n\n" if starts_paragraph else " ") if i else "") + unit
+            for i, (unit, _, starts_paragraph) in enumerate(current)
+        )
+    
+    for unit in _iter_units(text, max_tokens):
+        if current and current_tokens + unit[1] > max_tokens:
+            yield render()
+            fresh = 0
+            # Carry the tail of this chunk over as overlap
+            dropped = None
+            while current and (current_tokens > overlap_tokens or current_tokens + unit[1] > max_tokens):
+                dropped = current.popleft()
+                current_tokens -= dropped[1]
+            if dropped is not None:
+                budget = min(overlap_tokens, max_tokens - unit[1]) - current_tokens
+                tail, tail_tokens = _tail_words(dropped[0], budget)
+                if tail:
+                    current.appendleft((tail, tail_tokens, False))
+                    current_tokens += tail_tokens
+        current.append(unit)
+        current_tokens += unit[1]
+        fresh += 1
+    
+    if fresh:
+        yield render()
+
+def chunk_id(source: str, index: int, root: Optional[str] = None) -> str:
+    """
+    Id of a file's chunk: "source#index", or "source@hash#index" with a root
+
+    The short hash of the directory keeps same-named files ingested from
+    different directories from overwriting each other's chunks.
+    """
+    if root is None:
+        return f"{source}#{index}"
+    return f"{source}@{hashlib.sha1(root.encode('utf-8')).hexdigest()[:8]}#{index}"
+
 class KnowledgeLoader:
     """Loader for knowledge from text files"""
     
     @staticmethod
-    def load_from_txt(filepath: str, chunk_size: int = 1000) -> List[Dict[str, Any]]:
+    def iter_documents(text: str, source: str, mtime: Optional[float] = None,
+                       max_tokens: int = 256, overlap_tokens: int = 32,
+                       root: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream chunk documents from already-read text
+        
+        Args:
+            text: File contents
+            source: Source name stored in metadata and used in chunk ids
+            mtime: Modification time of the file, if known
+            max_tokens: Token budget of one chunk
+            overlap_tokens: Tokens shared between consecutive chunks
+            root: Absolute directory `source` is relative to, so a sync of
+                that directory can tell its own chunks apart
+            
+        Yields:
+            Dict[str, Any]: Document with a unique id from chunk_id()
+        """
+        for i, chunk in enumerate(iter_chunks(text, max_tokens, overlap_tokens)):
+            document = {
+                "id": chunk_id(source, i, root),
+                "text": chunk,
+                "metadata": {
+                    "source": source,
+                    "category": os.path.splitext(os.path.basename(source))[0],
+                    "chunk_id": i,
+                    "mtime": mtime
+                }
+            }
+            if root is not None:
+                document["metadata"]["root"] = root
+            yield document
+    
+    @staticmethod
+    def iter_from_txt(filepath: str, max_tokens: int = 256,
+                      overlap_tokens: int = 32) -> Iterator[Dict[str, Any]]:
+        """Stream chunk documents from a text file"""
+        with open(filepath, 'r', encoding='utf-8') as file:
+            text = file.read()
+        yield from KnowledgeLoader.iter_documents(
+            text, os.path.basename(filepath), os.path.getmtime(filepath), max_tokens, overlap_tokens,
+            root=os.path.dirname(os.path.abspath(filepath))
+        )
+    
+    @staticmethod
+    def load_from_txt(filepath: str, max_tokens: int = 256,
+                      overlap_tokens: int = 32) -> List[Dict[str, Any]]:
         """
         Load knowledge from a text file
         
         Args:
             filepath: Path to the file
-            chunk_size: Size of one text chunk
+            max_tokens: Token budget of one chunk
+            overlap_tokens: Tokens shared between consecutive chunks
             
         Returns:
             List[Dict[str, Any]]: List of documents for the knowledge base
         """
         try:
-            with open(filepath, 'r', encoding='utf-8') as file:
-                text = file.read()
-            
-            # Split the text into parts considering paragraphs
-            paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-            
-            # Combine small paragraphs
-            chunks = []
-            current_chunk = ""
-            
-            for paragraph in paragraphs:
-                if len(current_chunk) + len(paragraph) <= chunk_size:
-                    current_chunk += paragraph + "\n\n"
-                else:
-                    if current_chunk:
-                        chunks.append(current_chunk.strip())
-                    current_chunk = paragraph + "\n\n"
-            
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            
-            # Create documents
-            documents = [
-                {
-                    "text": chunk,
-                    "metadata": {
-                        "source": os.path.basename(filepath),
-                        "chunk_id": i
-                    }
-                }
-                for i, chunk in enumerate(chunks)
-            ]
-            
+            documents = list(KnowledgeLoader.iter_from_txt(filepath, max_tokens, overlap_tokens))
             logger.info(f"Loaded {len(documents)} documents from {filepath}")
             return documents
                 
         except Exception as e:
             logger.error(f"Error loading file {filepath}: {str(e)}")
             raise
+    
+    @staticmethod
+    def load_directory(directory: str, max_tokens: int = 256,
+                       overlap_tokens: int = 32) -> List[Dict[str, Any]]:
+        """
+        Load and chunk all .txt files from a directory
+        
+        Unreadable files are logged and skipped.
+        
+        Returns:
+            List[Dict[str, Any]]: List of documents for the knowledge base
+        """
+        documents = []
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(".txt"):
+                filepath = os.path.join(directory, filename)
+                try:
+                    documents.extend(KnowledgeLoader.load_from_txt(filepath, max_tokens, overlap_tokens))
+                except Exception:
+                    continue
+        return documents
 
 class KnowledgeManager:
     """Knowledge base manager for small businesses"""
@@ -69,6 +222,11 @@ class KnowledgeManager:
         self.chatbot = chatbot
         self.loader = KnowledgeLoader()
     
+    def _chunking(self) -> Tuple[int, int]:
+        """Chunk token budget and overlap from the chatbot config"""
+        config = self.chatbot.config
+        return config.CHUNK_MAX_TOKENS, config.CHUNK_OVERLAP_TOKENS
+    
     def load_knowledge_directory(self, directory: str) -> None:
         """
         Load all .txt files from a directory
@@ -77,11 +235,14 @@ class KnowledgeManager:
             directory: Path to the knowledge directory
         """
         try:
-            for filename in os.listdir(directory):
-                if filename.endswith('.txt'):
-                    filepath = os.path.join(directory, filename)
-                    documents = self.loader.load_from_txt(filepath)
-                    self.chatbot.add_knowledge(documents)
+            config = self.chatbot.config
+            pipeline = IngestionPipeline(
+                self.chatbot.knowledge_base,
+                *self._chunking(),
+                batch_size=config.EMBED_BATCH_SIZE,
+                read_workers=config.INGEST_READ_WORKERS
+            )
+            pipeline.run(directory)
                         
             logger.info(f"All files from {directory} have been successfully loaded")
                 
@@ -89,6 +250,355 @@ class KnowledgeManager:
             logger.error(f"Error loading directory {directory}: {str(e)}")
             raise
 
+    def sync_directory(self, directory: str) -> Dict[str, Any]:
+        """
+        Bring the index in line with a directory at startup
+        
+        Changed files are re-embedded and chunks of files that are gone from
+        the directory are deleted. Chunks ingested from other directories
+        are left alone.
+        """
+        config = self.chatbot.config
+        pipeline = IngestionPipeline(
+            self.chatbot.knowledge_base,
+            *self._chunking(),
+            batch_size=config.EMBED_BATCH_SIZE,
+            read_workers=config.INGEST_READ_WORKERS
+        )
+        return pipeline.run(directory, prune=True)
+
+    def reload_files(self, directory: str, changed: List[str], deleted: List[str]) -> Dict[str, Any]:
+        """
+        Re-chunk and re-embed touched files, swapping their chunks in atomically
+        
+        Files are identified as the ingestion pipeline does, by their path
+        relative to `directory` plus the directory itself, so only chunks
+        ingested from that directory are replaced.
+        
+        Args:
+            directory: Directory the paths are relative to
+            changed: Relative paths of added or modified files
+            deleted: Relative paths of removed files
+            
+        Returns:
+            Dict[str, Any]: Files processed, chunk counts and time taken
+        """
+        start = time.perf_counter()
+        root = os.path.abspath(directory)
+        report = {"files": 0, "embedded": 0, "reused": 0, "deleted": 0}
+        
+        for source in changed + deleted:
+            documents = []
+            if source in changed:
+                _, text, mtime = IngestionPipeline._read(os.path.join(directory, source))
+                documents = list(KnowledgeLoader.iter_documents(text, source, mtime, *self._chunking(), root=root))
+            result = self.chatbot.knowledge_base.replace_source(source, documents, root)
+            report["files"] += 1
+            for key in ("embedded", "reused", "deleted"):
+                report[key] += result[key]
+        
+        report["seconds"] = round(time.perf_counter() - start, 3)
+        logger.info(
+            f"Reloaded {report['files']} files in {report['seconds']}s: "
+            f"{report['embedded']} chunks re-embedded, {report['deleted']} deleted"
+        )
+        return report
+
+    def reload_directory(self, directory: str) -> Dict[str, Any]:
+        """
+        Re-sync every file below a directory while it is being searched
+        
+        Each file's chunks are swapped in with one replace_source, so a
+        concurrent search sees every file either before or after its update,
+        never half-applied. Files gone from the directory are removed the
+        same way. Files that cannot be read keep their chunks.
+        
+        Returns:
+            Dict[str, Any]: Files processed, chunk counts and time taken
+        """
+        start = time.perf_counter()
+        root = os.path.abspath(directory)
+        knowledge_base = self.chatbot.knowledge_base
+        report = {"files": 0, "embedded": 0, "reused": 0, "deleted": 0}
+        
+        def replace(source: str, documents: List[Dict[str, Any]]) -> None:
+            result = knowledge_base.replace_source(source, documents, root)
+            report["files"] += 1
+            for key in ("embedded", "reused", "deleted"):
+                report[key] += result[key]
+        
+        sources = set()
+        for filepath in IngestionPipeline.iter_paths(directory):
+            source = os.path.relpath(filepath, directory)
+            sources.add(source)
+            try:
+                _, text, mtime = IngestionPipeline._read(filepath)
+            except Exception as e:
+                logger.error(f"Error reading file {filepath}: {str(e)}")
+                continue
+            replace(source, list(KnowledgeLoader.iter_documents(
+                text, source, mtime, *self._chunking(), root=root
+            )))
+        gone = {
+            entry["path"] for entry in knowledge_base.manifest.values()
+            if entry.get("root") == root and entry["path"] not in sources
+        }
+        for source in sorted(gone):
+            replace(source, [])
+        
+        report["seconds"] = round(time.perf_counter() - start, 3)
+        logger.info(
+            f"Reloaded {directory} in {report['seconds']}s: "
+            f"{report['embedded']} chunks re-embedded, {report['deleted']} deleted"
+        )
+        return report
+
+class IngestionPipeline:
+    """
+    Bulk ingestion of a knowledge directory
+    
+    Files are read on a thread pool, chunked lazily and embedded in
+    fixed-size batches. At most `read_workers * 2` files are in flight and
+    only one batch of chunks is held at a time, so memory stays bounded
+    however large the corpus is.
+    """
+    
+    def __init__(self, knowledge_base, max_tokens: int = 256, overlap_tokens: int = 32,
+                 batch_size: int = 64, read_workers: int = 4, progress_interval: float = 5.0):
+        self.knowledge_base = knowledge_base
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.batch_size = batch_size
+        self.read_workers = read_workers
+        self.progress_interval = progress_interval
+        self.stats = {"files": 0, "failed": 0, "chunks": 0, "embedded": 0, "skipped": 0, "deleted": 0}
+        # Chunk count of every file read, by source
+        self._sources: Dict[str, int] = {}
+        self._start = 0.0
+        self._last_report = 0.0
+    
+    @staticmethod
+    def iter_paths(directory: str) -> Iterator[str]:
+        """Yield all .txt files below a directory"""
+        for root, _, filenames in os.walk(directory):
+            for filename in sorted(filenames):
+                if filename.endswith('.txt'):
+                    yield os.path.join(root, filename)
+    
+    @staticmethod
+    def _read(filepath: str) -> Tuple[str, str, float]:
+        with open(filepath, 'r', encoding='utf-8') as file:
+            return filepath, file.read(), os.path.getmtime(filepath)
+    
+    def _read_files(self, directory: str) -> Iterator[Tuple[str, str, float]]:
+        """Stage 1: read files on a thread pool with a bounded window"""
+        window = self.read_workers * 2
+        paths = self.iter_paths(directory)
+        with ThreadPoolExecutor(max_workers=self.read_workers, thread_name_prefix="ingest-read") as pool:
+            pending: Deque = deque()
+            for filepath in paths:
+                pending.append(pool.submit(self._read, filepath))
+                if len(pending) >= window:
+                    yield from self._collect(pending.popleft())
+            while pending:
+                yield from self._collect(pending.popleft())
+    
+    def _collect(self, future) -> Iterator[Tuple[str, str, float]]:
+        try:
+            yield future.result()
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"Error reading file: {str(e)}")
+    
+    def _iter_chunks(self, directory: str) -> Iterator[Dict[str, Any]]:
+        """Stage 2: chunk file contents as a generator"""
+        root = os.path.abspath(directory)
+        for filepath, text, mtime in self._read_files(directory):
+            self.stats["files"] += 1
+            source = os.path.relpath(filepath, directory)
+            self._sources[source] = 0
+            for document in KnowledgeLoader.iter_documents(
+                    text, source, mtime, self.max_tokens, self.overlap_tokens, root=root):
+                self._sources[source] += 1
+                yield document
+    
+    def _embed(self, batch: List[Dict[str, Any]]) -> None:
+        """Stage 3: embed and store one batch, skipping unchanged chunks"""
+        changed = self.knowledge_base.changed_documents(batch)
+        self.knowledge_base.add_documents(changed, save_manifest=False)
+        self.stats["embedded"] += len(changed)
+        self.stats["skipped"] += len(batch) - len(changed)
+    
+    def _report(self, force: bool = False) -> None:
+        now = time.perf_counter()
+        if not force and now - self._last_report < self.progress_interval:
+            return
+        self._last_report = now
+        elapsed = max(now - self._start, 1e-9)
+        logger.info(
+            f"Ingested {self.stats['files']} files, {self.stats['chunks']} chunks "
+            f"({self.stats['files'] / elapsed:.1f} docs/sec, {self.stats['chunks'] / elapsed:.1f} chunks/sec)"
+        )
+    
+    def _prune(self, directory: str) -> None:
+        """
+        Delete chunks of this directory whose file is gone or now has fewer chunks
+
+        Also drops chunks stored under an id this run did not produce (ids
+        from before roots were hashed into them).
+        """
+        if self.stats["failed"]:
+            logger.warning("Some files could not be read, keeping chunks of missing files")
+            return
+        root = os.path.abspath(directory)
+        removed = []
+        for doc_id, entry in self.knowledge_base.manifest.items():
+            if entry.get("root") != root:
+                continue
+            count = self._sources.get(entry["path"])
+            index = doc_id.rpartition("#")[2]
+            if count is None or not index.isdigit() or int(index) >= count \
+                    or doc_id != chunk_id(entry["path"], int(index), root):
+                removed.append(doc_id)
+        self.knowledge_base.delete_documents(removed)
+        self.stats["deleted"] = len(removed)
+
+    def run(self, directory: str, prune: bool = False) -> Dict[str, Any]:
+        """
+        Ingest every .txt file below a directory
+        
+        Args:
+            directory: Directory to ingest
+            prune: Also delete chunks previously ingested from this directory
+                whose files were removed or shortened since
+        
+        Returns:
+            Dict[str, Any]: File and chunk counts, elapsed time and throughput
+        """
+        self._start = self._last_report = time.perf_counter()
+        batch: List[Dict[str, Any]] = []
+        
+        # The embedding stage pulls from the generators, which is the backpressure:
+        # no file is read until the previous batch has been written
+        for document in self._iter_chunks(directory):
+            batch.append(document)
+            self.stats["chunks"] += 1
+            if len(batch) >= self.batch_size:
+                self._embed(batch)
+                batch = []
+                self._report()
+        if batch:
+            self._embed(batch)
+        if prune:
+            self._prune(directory)
+        self.knowledge_base.save_manifest()
+        self._report(force=True)
+        
+        elapsed = time.perf_counter() - self._start
+        return {
+            **self.stats,
+            "seconds": round(elapsed, 3),
+            "docs_per_sec": round(self.stats["files"] / elapsed, 2) if elapsed else 0.0,
+            "chunks_per_sec": round(self.stats["chunks"] / elapsed, 2) if elapsed else 0.0
+        }
+
+class KnowledgeWatcher:
+    """
+    Watch a knowledge directory and its subdirectories for changed .txt files
+    
+    Uses inotify through watchdog when it is installed to wake up immediately,
+    and otherwise falls back to polling file mtimes every `interval` seconds.
+    Changes are reported as on_change(directory, changed, deleted), with
+    paths relative to the directory.
+    """
+    
+    def __init__(self, directory: str, on_change: Callable[[str, List[str], List[str]], Dict[str, Any]],
+                 interval: float = 2.0):
+        self.directory = directory
+        self.on_change = on_change
+        self.interval = interval
+        # Created after the startup sync, so only later edits count as changes,
+        # whether the directory is watched or only reloaded on request
+        self._snapshot: Dict[str, float] = self._take_snapshot()
+        self._scan_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+    
+    def _take_snapshot(self) -> Dict[str, float]:
+        """Modification times of all .txt files below the directory, by relative path"""
+        snapshot = {}
+        for filepath in IngestionPipeline.iter_paths(self.directory):
+            try:
+                snapshot[os.path.relpath(filepath, self.directory)] = os.path.getmtime(filepath)
+            except OSError:
+                continue
+        return snapshot
+    
+    def _scan(self) -> Tuple[List[str], List[str]]:
+        current = self._take_snapshot()
+        changed = [p for p, mtime in current.items() if self._snapshot.get(p) != mtime]
+        deleted = [p for p in self._snapshot if p not in current]
+        self._snapshot = current
+        return changed, deleted
+    
+    def poll(self) -> Dict[str, Any]:
+        """Scan the directory once and reload anything that changed"""
+        with self._scan_lock:
+            changed, deleted = self._scan()
+            if not changed and not deleted:
+                return {"files": 0, "embedded": 0, "reused": 0, "deleted": 0, "seconds": 0.0}
+            return self.on_change(self.directory, changed, deleted)
+    
+    def start(self) -> None:
+        """Start watching in a background thread"""
+        self._stopped.clear()
+        
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+            
+            watcher = self
+            
+            class _Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    watcher._wakeup.set()
+            
+            self._observer = Observer()
+            self._observer.schedule(_Handler(), self.directory, recursive=True)
+            self._observer.start()
+            logger.info(f"Watching {self.directory} with inotify")
+        except ImportError:
+            logger.info(f"Watching {self.directory} by polling every {self.interval}s")
+        
+        self._thread = threading.Thread(target=self._run, name="knowledge-watcher", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Stop the background thread"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            if self._wakeup.wait(self.interval):
+                # Let editors finish writing before re-reading the file
+                time.sleep(0.2)
+                self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Error reloading knowledge: {str(e)}")
+
 # knowledge_format.txt - example structure of a knowledge file:
 """
 # General Information
@@ -104,27 +614,52 @@ Delivery is carried out throughout the city within 1-2 business days.
 Delivery cost depends on the area and ranges from 300 to 500 rubles.
 """
 
-# Example usage:
-if __name__ == "__main__":
-    import asyncio  # Make sure to import asyncio
-    # Assuming Chatbot class is defined elsewhere
-
-    async def main():
-        # Initialize the bot
-        bot = Chatbot()
-        
-        # Create the knowledge manager
-        knowledge_manager = KnowledgeManager(bot)
-        
-        # Load knowledge from the directory
+def main():
+    import argparse
+    import asyncio
+    from chatbot import Chatbot, ChatbotConfig, local_knowledge_base
+    
+    parser = argparse.ArgumentParser(description="Knowledge base tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    ingest = subparsers.add_parser("ingest", help="Bulk-ingest a directory of .txt files")
+    ingest.add_argument("directory")
+    ingest.add_argument("--batch-size", type=int)
+    ingest.add_argument("--workers", type=int, help="File reader threads")
+    
+    ask = subparsers.add_parser("ask", help="Load a directory and ask one question")
+    ask.add_argument("directory")
+    ask.add_argument("question")
+    
+    args = parser.parse_args()
+    config = ChatbotConfig()
+    
+    if args.command == "ingest":
+        if args.batch_size:
+            config = config.copy(update={"EMBED_BATCH_SIZE": args.batch_size})
+        # Same store, embedding model and settings the server opens
+        knowledge_base = local_knowledge_base(config)
+        pipeline = IngestionPipeline(
+            knowledge_base,
+            config.CHUNK_MAX_TOKENS,
+            config.CHUNK_OVERLAP_TOKENS,
+            batch_size=config.EMBED_BATCH_SIZE,
+            read_workers=args.workers or config.INGEST_READ_WORKERS
+        )
         try:
-            knowledge_manager.load_knowledge_directory("./knowledge")
-        except Exception as e:
-            logger.error(f"Error loading knowledge: {str(e)}")
-            return
-        
-        # Test query
-        response = await bot.process_message("When is the store open?")
-        print(f"Response: {response['response']}")
+            print(json.dumps(pipeline.run(args.directory)))
+        finally:
+            knowledge_base.close()
+        return
     
-    asyncio.run(main())
+    async def run_question():
+        bot = Chatbot(config)
+        KnowledgeManager(bot).load_knowledge_directory(args.directory)
+        response = await bot.process_message(args.question)
+        print(f"Response: {response.get('response', response.get('error'))}")
+        bot.close()
+    
+    asyncio.run(run_question())
+
+if __name__ == "__main__":
+    main()
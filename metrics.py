@@ -0,0 +1,192 @@
+# metrics.py
+import threading
+import time
+import uuid
+import logging
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric(ABC):
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Exposition lines of the metric's samples"""
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                for key, value in sorted(self._values.items())]
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Registry:
+    """Collection of metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, extra: Iterable[_Metric] = ()) -> str:
+        lines: List[str] = []
+        for metric in [*self._metrics, *extra]:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "chatbot_stage_seconds",
+    "Time spent in each stage of the chat pipeline",
+    ["stage"]
+))
+ERRORS = REGISTRY.register(Counter(
+    "chatbot_errors_total",
+    "Failed chat requests by exception type",
+    ["type"]
+))
+TOKENS = REGISTRY.register(Counter(
+    "chatbot_tokens_total",
+    "Tokens processed by the model (in = prompt, out = completion)",
+    ["direction"]
+))
+ADMISSIONS = REGISTRY.register(Counter(
+    "chatbot_admissions_total",
+    "Admission decisions for chat requests",
+    ["decision"]
+))
+SUMMARY_TOKENS_SAVED = REGISTRY.register(Counter(
+    "chatbot_summary_tokens_saved_total",
+    "Prompt tokens saved by replacing trimmed history with its summary"
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "chatbot_requests_in_flight",
+    "Chat requests currently being processed"
+))
+
+WEBSOCKETS_OPEN = REGISTRY.register(Gauge(
+    "chatbot_websockets_open",
+    "WebSocket chat connections currently open"
+))
+WEBSOCKET_REQUESTS = REGISTRY.register(Histogram(
+    "chatbot_websocket_requests",
+    "Chat messages sent over each closed WebSocket connection",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200)
+))
+
+def snapshot_gauge(name: str, help: str, values: Dict[str, float], label: str) -> Gauge:
+    """Build a one-off gauge from a dict of current values, one sample per key"""
+    gauge = Gauge(name, help, [label])
+    for key, value in values.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            gauge.set(value, **{label: key})
+    return gauge
+
+class Trace:
+    """
+    Per-request trace id with stage timings
+
+    Every recorded stage is observed in the chatbot_stage_seconds histogram
+    and logged together with the trace id.
+    """
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.stages: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        logger.info(f"[trace {self.trace_id}] {stage}={seconds * 1000:.1f}ms")
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
@@ -0,0 +1,191 @@
+# prompt.py
+import logging
+from typing import Any, Dict, List, Tuple
+
+from knowledge_loader import count_tokens
+
+logger = logging.getLogger(__name__)
+
+NO_INFORMATION_ANSWER = "I don't have this information in my knowledge base."
+BUSY_ANSWER = "I'm handling a lot of questions right now. Here is the most relevant information I found:"
+
+# Static instructions come first and never change between requests, so the
+# model server can reuse the KV cache for this prefix. Per-request context is
+# appended after it.
+SYSTEM_INSTRUCTIONS = f"""You are a professional and helpful company assistant focused on providing accurate customer service. Your responses should be based EXCLUSIVELY on the provided company knowledge base.
+
+Role and Personality:
+- Professional, friendly, and concise in communication
+- Patient and understanding with customers
+- Focused on providing accurate, helpful information
+- Natural conversational style while maintaining professionalism
+
+Response Guidelines:
+1. Knowledge Base Usage:
+    - Use ONLY information from the provided context
+    - Do not invent, assume, or extrapolate information
+    - If information is not in the context, clearly state: "{NO_INFORMATION_ANSWER[:-1]}"
+
+2. Response Structure:
+    - Start with a direct answer to the question
+    - Provide relevant details from the context if available
+    - Keep responses concise and to the point
+    - Use natural, conversational language
+
+3. Interaction Rules:
+    - Don't reference the source of your information
+    - Don't apologize for limitations
+    - Don't make promises or commitments
+    - Stay within the scope of provided information
+
+Example Responses:
+Q: "What are your working hours?"
+A: "We're open Monday to Friday, 9 AM to 6 PM."
+
+Q: "Do you offer international shipping?"
+A: "{NO_INFORMATION_ANSWER}"
+
+Remember: Always prioritize accuracy over comprehensiveness. If unsure, acknowledge the limitations of the available information.
+
+Available information:
+"""
+
+SYSTEM_INSTRUCTIONS_TOKENS = count_tokens(SYSTEM_INSTRUCTIONS)
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARY_INSTRUCTIONS = """You maintain a running summary of a customer support conversation.
+Merge the new turns into the existing summary. Keep every fact the customer gave (names, order numbers, dates, products, preferences), their open questions, and what the assistant answered or promised. Drop greetings and small talk.
+Write plain sentences in the third person, at most {max_words} words. Reply with the summary only."""
+
+def format_context_doc(doc: Dict[str, Any]) -> str:
+    """Format one retrieved chunk with its source"""
+    return f"From {doc['source']}:\n{doc['text']}"
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Cut text down to roughly max_tokens tokens on a word boundary"""
+    words = text.split()
+    kept, used = [], 0
+    for word in words:
+        tokens = count_tokens(word)
+        if used + tokens > max_tokens:
+            break
+        kept.append(word)
+        used += tokens
+    return " ".join(kept)
+
+def build_summary_messages(summary: str, turns: List[Dict[str, str]], max_tokens: int) -> List[Dict[str, str]]:
+    """Messages asking the model to fold turns into a rolling summary"""
+    transcript = "\n".join(f"{turn['role'].capitalize()}: {turn['content']}" for turn in turns)
+    return [
+        # Words run a bit below estimated tokens; leave room for punctuation
+        {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(max_words=max(20, max_tokens * 3 // 4))},
+        {"role": "user", "content": f"Existing summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"}
+    ]
+
+def retrieval_only_answer(context_docs: List[Dict[str, Any]]) -> str:
+    """Answer with the top retrieved chunk when there is no capacity to generate"""
+    if not context_docs:
+        return NO_INFORMATION_ANSWER
+    return f"{BUSY_ANSWER}\n\n{context_docs[0]['text'].strip()}"
+
+def clean_summary(text: str, max_tokens: int) -> str:
+    """Strip a generated summary and cut it to max_tokens"""
+    text = text.strip()
+    return _truncate(text, max_tokens) if count_tokens(text) > max_tokens else text
+
+class PromptBuilder:
+    """
+    Build chat messages within a token budget
+
+    The budget left after the fixed instructions and the user message is
+    split between history (at most history_budget, newest turns kept) and
+    retrieved chunks (kept in rank order until the budget runs out). A
+    rolling summary of older turns, if any, counts against history_budget
+    first.
+    """
+
+    def __init__(self, max_prompt_tokens: int = 3072, history_budget: int = 1024):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.history_budget = history_budget
+
+    def _fit_history(self, history: List[Dict[str, str]], budget: int) -> Tuple[List[Dict[str, str]], int]:
+        kept: List[Dict[str, str]] = []
+        used = 0
+        for turn in reversed(history):
+            tokens = count_tokens(turn["content"])
+            if used + tokens > budget:
+                break
+            kept.append(turn)
+            used += tokens
+        kept.reverse()
+        # Don't open the history with a reply whose question was dropped
+        if kept and kept[0]["role"] == "assistant":
+            used -= count_tokens(kept.pop(0)["content"])
+        return kept, used
+
+    def _fit_context(self, context_docs: List[Dict[str, Any]], budget: int) -> Tuple[List[Dict[str, Any]], List[str], int]:
+        used_docs: List[Dict[str, Any]] = []
+        parts: List[str] = []
+        used = 0
+        for doc in context_docs:
+            part = format_context_doc(doc)
+            tokens = count_tokens(part)
+            if used + tokens > budget:
+                if not used_docs and budget > 0:
+                    # Always keep (part of) the best match
+                    part = _truncate(part, budget)
+                    used_docs.append(doc)
+                    parts.append(part)
+                    used += count_tokens(part)
+                break
+            used_docs.append(doc)
+            parts.append(part)
+            used += tokens
+        return used_docs, parts, used
+
+    def build(self, message: str, context_docs: List[Dict[str, Any]], history: List[Dict[str, str]],
+              summary: str = "") -> Tuple[List[Dict[str, str]], List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Build the Ollama chat messages for a user message
+
+        Returns:
+            Tuple: Messages, the context documents that made it into the
+            prompt, and the token counts per section
+        """
+        message_tokens = count_tokens(message)
+        available = max(0, self.max_prompt_tokens - SYSTEM_INSTRUCTIONS_TOKENS - message_tokens)
+        history_budget = min(self.history_budget, available)
+
+        summary_messages: List[Dict[str, str]] = []
+        summary_tokens = 0
+        if summary:
+            content = SUMMARY_PREFIX + summary
+            if count_tokens(content) > history_budget:
+                content = _truncate(content, history_budget)
+            summary_tokens = count_tokens(content)
+            summary_messages.append({"role": "system", "content": content})
+
+        kept_history, history_tokens = self._fit_history(history, history_budget - summary_tokens)
+        used_docs, parts, context_tokens = self._fit_context(
+            context_docs, available - history_tokens - summary_tokens
+        )
+
+        system_prompt = SYSTEM_INSTRUCTIONS + "\n\n".join(parts)
+        messages = [
+            {"role": "system", "content": system_prompt},
+            *summary_messages,
+            *kept_history,
+            {"role": "user", "content": message}
+        ]
+        counts = {
+            "system": SYSTEM_INSTRUCTIONS_TOKENS,
+            "context": context_tokens,
+            "summary": summary_tokens,
+            "history": history_tokens,
+            "message": message_tokens,
+            "total": SYSTEM_INSTRUCTIONS_TOKENS + context_tokens + summary_tokens + history_tokens + message_tokens,
+            "dropped_chunks": len(context_docs) - len(used_docs),
+            "dropped_turns": len(history) - len(kept_history)
+        }
+        return messages, used_docs, counts
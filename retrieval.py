@@ -0,0 +1,125 @@
+# retrieval.py
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+_WORD_RE = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; digits are kept so phone numbers and SKUs match"""
+    return _WORD_RE.findall(text.casefold())
+
+class BM25Index:
+    """
+    In-process BM25 inverted index
+
+    Not thread-safe on its own: KnowledgeBase mutates it under the write
+    lock and searches it under the read lock.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Index a document, replacing any previous version"""
+        self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        self._doc_terms[doc_id] = terms
+        self._doc_lengths[doc_id] = sum(terms.values())
+        self._total_length += self._doc_lengths[doc_id]
+        for term, tf in terms.items():
+            self._postings[term][doc_id] = tf
+
+    def add_many(self, documents: Iterable[Tuple[str, str]]) -> None:
+        for doc_id, text in documents:
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: str) -> None:
+        """Drop a document from the index if present"""
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """Return (doc_id, score) pairs, best first"""
+        n_docs = len(self._doc_terms)
+        if not n_docs:
+            return []
+        avg_length = self._total_length / n_docs
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                length = self._doc_lengths[doc_id]
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked id lists with reciprocal-rank fusion
+
+    Args:
+        rankings: One list of ids per retriever, best first
+        k: RRF damping constant
+
+    Returns:
+        List[Tuple[str, float]]: (id, fused score), best first
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+def filter_relevant(documents: List[Dict[str, Any]], max_distance: float = 0.0,
+                    max_gap: float = 0.0, min_keyword_score: float = 0.0) -> List[Dict[str, Any]]:
+    """
+    Keep the retrieved chunks that clear the relevance bar
+
+    A chunk is relevant if its vector distance is at most max_distance or
+    its BM25 score is at least min_keyword_score. Among the relevant chunks,
+    in rank order, the list is cut at the first jump in distance larger than
+    max_gap (adaptive k). A zero threshold disables that check.
+
+    Args:
+        documents: Ranked search results with optional "distance" and "keyword_score"
+        max_distance: Largest distance still considered relevant
+        max_gap: Largest allowed distance increase between consecutive kept chunks
+        min_keyword_score: Smallest BM25 score that counts as relevant
+
+    Returns:
+        List[Dict[str, Any]]: Relevant chunks, in rank order
+    """
+    relevant = []
+    last_distance = None
+    for doc in documents:
+        distance = doc.get("distance")
+        keyword_match = min_keyword_score > 0 and doc.get("keyword_score", 0.0) >= min_keyword_score
+        if max_distance > 0 and not keyword_match and (distance is None or distance > max_distance):
+            continue
+        if max_gap > 0 and distance is not None and last_distance is not None \
+                and distance - last_distance > max_gap and not keyword_match:
+            break
+        if distance is not None:
+            last_distance = distance
+        relevant.append(doc)
+    return relevant
@@ -0,0 +1,198 @@
+# scheduler.py
+import asyncio
+import heapq
+import itertools
+import time
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class DeadlineExceeded(Exception):
+    """A request's deadline passed before it could be served"""
+
+class GenerationScheduler:
+    """
+    Priority queue in front of the Ollama backend
+
+    At most max_in_flight generations run at once, which should match the
+    server's OLLAMA_NUM_PARALLEL so its parallel slots stay busy without
+    queueing inside Ollama. Waiters are served lowest priority value first,
+    then in arrival order. A waiter whose deadline passes is dropped with
+    DeadlineExceeded; a cancelled waiter (e.g. the HTTP client went away)
+    leaves the queue without taking a slot.
+    """
+
+    # Weight of the latest generation in the moving average of service time
+    SERVICE_TIME_ALPHA = 0.2
+
+    def __init__(self, max_in_flight: int = 4):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self.served = 0
+        self.expired = 0
+        self.cancelled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        # Moving average of how long a generation holds its slot
+        self.service_time = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, waiter in self._queue if not waiter.done())
+
+    def queue_depth_at(self, priority: int = 0) -> int:
+        """Waiters a new request with the given priority would queue behind"""
+        return sum(1 for p, _, waiter in self._queue if p <= priority and not waiter.done())
+
+    def estimated_wait(self, priority: int = 0, pending: int = 0) -> float:
+        """
+        Expected queue wait of a new request with the given priority
+
+        Counts the waiters that would be served before it, plus the
+        `pending` requests on their way to the queue that will not find a
+        free slot, and assumes each slot turns over once per recent average
+        service time.
+        """
+        free = self.max_in_flight - self.in_flight
+        if pending < free and not self.queue_depth:
+            return 0.0
+        ahead = self.queue_depth_at(priority) + max(0, pending - free)
+        return (ahead // self.max_in_flight + 1) * self.service_time
+
+    def _grant_next(self) -> None:
+        while self._queue and self.in_flight < self.max_in_flight:
+            _, _, waiter = heapq.heappop(self._queue)
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def _acquire(self, priority: int, deadline: Optional[float]) -> float:
+        start = time.monotonic()
+        if self.in_flight < self.max_in_flight and not self.queue_depth:
+            self.in_flight += 1
+            return 0.0
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), waiter))
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted at the last moment: give the slot back
+                self._release()
+            waiter.cancel()
+            self.expired += 1
+            raise DeadlineExceeded("Request waited past its deadline for a generation slot")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            waiter.cancel()
+            self.cancelled += 1
+            raise
+        return time.monotonic() - start
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._grant_next()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0, deadline: Optional[float] = None):
+        """
+        Hold one generation slot for the duration of the block
+
+        Args:
+            priority: Lower values are served first
+            deadline: time.monotonic() value after which waiting is abandoned
+        """
+        wait = await self._acquire(priority, deadline)
+        self.served += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        start = time.monotonic()
+        try:
+            yield wait
+        finally:
+            held = time.monotonic() - start
+            if self.service_time:
+                self.service_time += self.SERVICE_TIME_ALPHA * (held - self.service_time)
+            else:
+                self.service_time = held
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, slot usage and wait times"""
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "served": self.served,
+            "expired": self.expired,
+            "cancelled": self.cancelled,
+            "wait_mean_s": self.total_wait / self.served if self.served else 0.0,
+            "wait_max_s": self.max_wait,
+            "service_time_s": self.service_time
+        }
+
+class EmbeddingBatcher:
+    """
+    Micro-batch query embeddings of concurrent requests
+
+    Requests arriving within max_wait seconds of each other (up to
+    max_batch) are embedded with a single encode call on the executor.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], List[Any]],
+                 run_blocking: Callable, max_batch: int = 32, max_wait: float = 0.005):
+        self.encode = encode
+        self.run_blocking = run_blocking
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.items = 0
+
+    async def embed(self, text: str) -> Any:
+        """Embed one query, sharing the encode call with concurrent requests"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            embeddings = await self.run_blocking(self.encode, [text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "queries": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0
+        }
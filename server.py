@@ -1,15 +1,28 @@
 # server.py
 import os
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 import uvicorn
+import asyncio
+import functools
+import json
 import logging
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
 from typing import Dict, Any, List
-from chatbot import Chatbot
+from admission import Overloaded, RateLimiter, Reservation, retry_after_header
+from chatbot import Chatbot, ChatbotConfig
+from compression import CompressionMiddleware, StaticAsset
+from metrics import ADMISSIONS, REGISTRY, WEBSOCKET_REQUESTS, WEBSOCKETS_OPEN
+from knowledge_loader import KnowledgeManager, KnowledgeWatcher
+from tenants import TenantManager, UnknownTenant, build_tenant_bot, reload_tenant
 
 # Set environment variable for tokenizers
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
@@ -21,15 +34,41 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# orjson serializes responses several times faster than the json module
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    DefaultResponse = JSONResponse
+
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False)
+
 # Create FastAPI instance
-app = FastAPI()
+app = FastAPI(default_response_class=DefaultResponse)
+
+settings = ChatbotConfig()
 
 # Create required directories
-os.makedirs("templates", exist_ok=True)
-os.makedirs("knowledge", exist_ok=True)
+KNOWLEDGE_DIR = settings.KNOWLEDGE_DIR
+os.makedirs(KNOWLEDGE_DIR, exist_ok=True)
+
+# The chat page is static: read, hashed and compressed once
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+INDEX_PAGE = StaticAsset(
+    os.path.join(STATIC_DIR, "index.html"),
+    "text/html; charset=utf-8",
+    max_age=settings.STATIC_MAX_AGE_SECONDS
+)
+app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
-# Setup templates
-templates = Jinja2Templates(directory="templates")
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_BYTES)
+
+# Per-client limits are per worker: with N workers a client gets up to N times the rate
+rate_limiter = RateLimiter(settings.RATE_LIMIT_PER_MINUTE / 60, settings.RATE_LIMIT_BURST)
 
 # Setup CORS
 app.add_middleware(
@@ -40,279 +79,482 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+SESSION_COOKIE = "chatbot_session"
+SESSION_HEADER = "X-Session-ID"
+TRACE_HEADER = "X-Request-ID"
+
 class Message(BaseModel):
     text: str
 
-def load_knowledge_files() -> List[Dict[str, Any]]:
-    """Load all .txt files from the knowledge directory"""
-    documents = []
-    knowledge_dir = "knowledge"
+class BatchMessages(BaseModel):
+    messages: List[str]
+
+def get_session_id(request: Request) -> str:
+    """Resolve the session id from the header or cookie, creating one if missing"""
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    return session_id or uuid.uuid4().hex
+
+def get_trace_id(request: Request) -> str:
+    """Use the caller's request id as trace id, or create one"""
+    return request.headers.get(TRACE_HEADER) or uuid.uuid4().hex[:16]
+
+async def cancel_on_disconnect(request: Request, coro, poll_interval: float = 0.5):
+    """
+    Await a coroutine, cancelling it if the HTTP client disconnects
     
-    # Create example file if directory is empty
-    if not os.listdir(knowledge_dir):
-        example_file = os.path.join(knowledge_dir, "example.txt")
+    Frees the request's queue position or generation slot instead of
+    finishing work nobody will read.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                logger.info("Client disconnected, request cancelled")
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
+
+def admit_chat(bot: Chatbot, client: str) -> Reservation:
+    """
+    Rate-limit the client, then run the bot's admission control
+    
+    Refusals are cheap and immediate: 429 when the client is over its rate,
+    503 when the server is at capacity, both with Retry-After.
+    
+    Returns:
+        Reservation: Counts the request against the admission limits until
+        it is queued for generation or released; `degraded` is True if it
+        should be answered in degraded mode
+    """
+    wait = rate_limiter.acquire(client)
+    if wait > 0:
+        ADMISSIONS.inc(decision="rate_limited")
+        raise HTTPException(status_code=429, detail="Too many requests", headers=retry_after_header(wait))
+    try:
+        return bot.admit()
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers=retry_after_header(e.retry_after))
+
+def client_address(request: Request) -> str:
+    """Client the rate limit applies to (uvicorn resolves X-Forwarded-For from trusted proxies)"""
+    return request.client.host if request.client else "unknown"
+
+def attach_session(response: Response, session_id: str) -> None:
+    """Echo the session id back to the client"""
+    response.headers[SESSION_HEADER] = session_id
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+
+def ensure_knowledge_files() -> None:
+    """Create an example file if the knowledge directory is empty"""
+    if not os.listdir(KNOWLEDGE_DIR):
+        example_file = os.path.join(KNOWLEDGE_DIR, "example.txt")
         with open(example_file, "w", encoding="utf-8") as f:
             f.write(""" """)
         logger.info(f"Created example file: {example_file}")
-    
-    # Load all .txt files
-    for filename in os.listdir(knowledge_dir):
-        if filename.endswith(".txt"):
-            filepath = os.path.join(knowledge_dir, filename)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    text = f.read()
-                    documents.append({
-                        "text": text,
-                        "metadata": {
-                            "source": filename,
-                            "category": filename.replace(".txt", "")
-                        }
-                    })
-                logger.info(f"Loaded file: {filename}")
-            except Exception as e:
-                logger.error(f"Error reading file {filename}: {str(e)}")
-    
-    return documents
-
-# Create HTML template if it doesn't exist
-def create_template():
-    template_path = "templates/index.html"
-    if not os.path.exists(template_path):
-        with open(template_path, "w", encoding="utf-8") as f:
-            f.write("""<!DOCTYPE html>
-<html>
-<head>
-    <title>Chat with Assistant</title>
-    <style>
-        .chat-widget {
-            position: fixed;
-            bottom: 20px;
-            right: 20px;
-            width: 350px;
-            height: 500px;
-            background: white;
-            border-radius: 10px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-            display: flex;
-            flex-direction: column;
-            overflow: hidden;
-            font-family: Arial, sans-serif;
-            transition: all 0.3s ease;
-            z-index: 1000;
-        }
-
-        .chat-widget.minimized {
-            height: 60px;
-        }
-
-        .chat-header {
-            background: #2c3e50;
-            color: white;
-            padding: 15px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            cursor: pointer;
-        }
-
-        .chat-messages {
-            flex: 1;
-            padding: 15px;
-            overflow-y: auto;
-            display: flex;
-            flex-direction: column;
-            gap: 10px;
-        }
-
-        .message {
-            max-width: 80%;
-            padding: 10px 15px;
-            border-radius: 15px;
-            margin: 5px 0;
-            word-wrap: break-word;
-        }
-
-        .user-message {
-            background: #e8f4ff;
-            margin-left: auto;
-            border-bottom-right-radius: 5px;
-        }
-
-        .bot-message {
-            background: #f0f0f0;
-            margin-right: auto;
-            border-bottom-left-radius: 5px;
-        }
-
-        .chat-input {
-            padding: 15px;
-            border-top: 1px solid #eee;
-            display: flex;
-            gap: 10px;
-        }
-
-        .chat-input input {
-            flex: 1;
-            padding: 10px;
-            border: 1px solid #ddd;
-            border-radius: 5px;
-            outline: none;
-        }
-
-        .chat-input button {
-            padding: 10px 20px;
-            background: #2c3e50;
-            color: white;
-            border: none;
-            border-radius: 5px;
-            cursor: pointer;
-            transition: background 0.3s;
-        }
-
-        .chat-input button:hover {
-            background: #34495e;
-        }
-
-        .sources {
-            font-size: 0.8em;
-            color: #666;
-            margin-top: 5px;
-        }
-    </style>
-</head>
-<body>
-    <div id="chat-widget" class="chat-widget">
-        <div class="chat-header" onclick="toggleChat()">
-            <span>Assistant</span>
-            <span class="minimize">_</span>
-        </div>
-        <div class="chat-messages" id="chat-messages"></div>
-        <div class="chat-input">
-            <input type="text" id="chat-input" placeholder="Enter your message..." onkeypress="handleKeyPress(event)">
-            <button onclick="sendMessage()">Send</button>
-        </div>
-    </div>
-
-    <script>
-        const CHAT_API_URL = '/chat';
-        
-        function toggleChat() {
-            const widget = document.getElementById('chat-widget');
-            widget.classList.toggle('minimized');
-        }
-
-        function appendMessage(text, isUser, sources = []) {
-            const messagesDiv = document.getElementById('chat-messages');
-            const messageContainer = document.createElement('div');
-            const messageDiv = document.createElement('div');
-            messageDiv.className = `message ${isUser ? 'user-message' : 'bot-message'}`;
-            messageDiv.textContent = text;
-            messageContainer.appendChild(messageDiv);
-            
-            if (!isUser && sources && sources.length > 0) {
-                const sourcesDiv = document.createElement('div');
-                sourcesDiv.className = 'sources';
-                sourcesDiv.textContent = `Sources: ${sources.join(', ')}`;
-                messageContainer.appendChild(sourcesDiv);
-            }
-            
-            messagesDiv.appendChild(messageContainer);
-            messagesDiv.scrollTop = messagesDiv.scrollHeight;
-        }
 
-        async function sendMessage() {
-            const input = document.getElementById('chat-input');
-            const message = input.value.trim();
-            
-            if (!message) return;
-            
-            appendMessage(message, true);
-            input.value = '';
-
-            try {
-                const response = await fetch(CHAT_API_URL, {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({ text: message })
-                });
-
-                const data = await response.json();
-                
-                if (data.status === 'success') {
-                    appendMessage(data.response, false, data.sources);
-                } else {
-                    appendMessage('Sorry, an error occurred. Please try again later.', false);
-                }
-            } catch (error) {
-                console.error('Error:', error);
-                appendMessage('Sorry, an error occurred. Please try again later.', false);
-            }
-        }
-
-        function handleKeyPress(event) {
-            if (event.key === 'Enter') {
-                sendMessage();
-            }
-        }
-    </script>
-</body>
-</html>""")
-        logger.info("Created index.html template")
-
-# Global variable for bot instance
+# Global variables for bot instance and knowledge watcher. `bot` is only set
+# once the knowledge base is loaded, so handlers never see a half-built bot.
 bot = None
+watcher = None
+tenants = None
+startup_task = None
+startup_error = None
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize bot on application startup"""
-    global bot
+def require_bot() -> Chatbot:
+    """Return the bot, or answer 503 while it is still starting"""
+    if bot is None:
+        if startup_error is not None:
+            raise HTTPException(status_code=503, detail=f"Bot failed to start: {startup_error}")
+        raise HTTPException(status_code=503, detail="Bot is starting", headers={"Retry-After": "5"})
+    return bot
+
+async def initialize_bot():
+    """Build the bot and its knowledge base off the event loop"""
+    global bot, watcher, tenants, startup_error
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
     try:
-        # Create template
-        create_template()
-        
-        # Initialize bot
-        bot = Chatbot()
+        # Constructing the bot imports chromadb and loads the embedding model
+        new_bot = await loop.run_in_executor(None, Chatbot)
         
-        # Load knowledge base from files
-        documents = load_knowledge_files()
-        if documents:
-            bot.add_knowledge(documents)
-            logger.info(f"Loaded {len(documents)} documents into knowledge base")
+        if new_bot.config.INDEX_SERVICE_URL:
+            # Multi-worker mode: the index service ingests and watches the knowledge directory
+            await new_bot.warm_up()
         else:
-            logger.warning("No knowledge files found in knowledge directory")
+            # Stream the knowledge files into the index in bounded batches
+            manager = KnowledgeManager(new_bot)
+            await new_bot.run_blocking(ensure_knowledge_files)
+            report = await new_bot.run_blocking(manager.sync_directory, KNOWLEDGE_DIR)
+            if report["chunks"]:
+                logger.info(
+                    f"Loaded {report['chunks']} chunks into knowledge base "
+                    f"({report['skipped']} reused, {report['embedded']} re-embedded, {report['deleted']} deleted)"
+                )
+            else:
+                logger.warning("No knowledge files found in knowledge directory")
+            
+            await new_bot.warm_up()
+            
+            watcher = KnowledgeWatcher(
+                KNOWLEDGE_DIR,
+                manager.reload_files,
+                interval=new_bot.config.KNOWLEDGE_WATCH_INTERVAL
+            )
+            if new_bot.config.KNOWLEDGE_WATCH:
+                watcher.start()
         
-        logger.info("Bot successfully initialized")
+        tenants = TenantManager(
+            functools.partial(build_tenant_bot, new_bot),
+            new_bot.config.TENANTS_DIR,
+            memory_budget=new_bot.config.TENANT_MEMORY_BUDGET_MB * 2 ** 20,
+            max_loaded=new_bot.config.MAX_LOADED_TENANTS,
+            run_blocking=new_bot.run_blocking
+        )
+        bot = new_bot
+        logger.info(f"Bot successfully initialized in {time.perf_counter() - start:.2f}s")
     except Exception as e:
+        startup_error = str(e)
         logger.error(f"Error initializing bot: {str(e)}")
-        raise
 
-@app.get("/", response_class=HTMLResponse)
+@app.on_event("startup")
+async def startup_event():
+    """
+    Start initializing the bot in the background
+    
+    The port accepts connections right away; /readyz reports when the
+    knowledge base is loaded and the bot can answer.
+    """
+    global startup_task
+    startup_task = asyncio.create_task(initialize_bot())
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving HTTP"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: the knowledge base is loaded and the bot can answer"""
+    if bot is None:
+        status = "failed" if startup_error is not None else "starting"
+        return JSONResponse(status_code=503, content={"status": status, "error": startup_error})
+    return {"status": "ready", "knowledge_version": bot.knowledge_base.version}
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release bot resources on application shutdown"""
+    if startup_task is not None and not startup_task.done():
+        startup_task.cancel()
+    if watcher is not None:
+        watcher.stop()
+    if tenants is not None:
+        tenants.close()
+    if bot is not None:
+        bot.close()
+
+@app.get("/")
 async def root(request: Request):
-    """Root route, returns HTML page"""
-    return templates.TemplateResponse("index.html", {"request": request})
+    """Root route, returns the chat page"""
+    return INDEX_PAGE.response(request)
 
 @app.post("/chat")
-async def chat(message: Message):
+async def chat(message: Message, request: Request, response: Response):
     """Handle chat messages"""
-    global bot
     try:
-        if bot is None:
-            raise HTTPException(status_code=500, detail="Bot not initialized")
-        
-        response = await bot.process_message(message.text)
-        return response
+        bot = require_bot()
+        with admit_chat(bot, client_address(request)) as reservation:
+            session_id = get_session_id(request)
+            trace_id = get_trace_id(request)
+            attach_session(response, session_id)
+            response.headers[TRACE_HEADER] = trace_id
+            return await cancel_on_disconnect(
+                request,
+                bot.process_message(message.text, session_id, trace_id=trace_id,
+                                    degraded=reservation.degraded, reservation=reservation)
+            )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing message: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-if __name__ == "__main__":
-    uvicorn.run(
-        "server:app",
-        host="0.0.0.0",
-        port=8000,
-        workers=1,
-        log_level="info"
+@app.get("/stats")
+async def stats():
+    """Report cache and history store counters"""
+    return {
+        **require_bot().stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "websockets": dict(websocket_counts),
+        "tenants": tenants.stats() if tenants is not None else None
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics of this worker"""
+    extra = bot.collect_metrics() if bot is not None else []
+    if tenants is not None:
+        extra += tenants.collect_metrics()
+    return PlainTextResponse(REGISTRY.render(extra), media_type="text/plain; version=0.0.4")
+
+@app.post("/knowledge/reload")
+async def reload_knowledge():
+    """Reload changed knowledge files and report what was updated"""
+    bot = require_bot()
+    try:
+        if watcher is None:
+            # Multi-worker mode: the index service owns the knowledge directory
+            return await bot.run_blocking(bot.knowledge_base.reload)
+        return await bot.run_blocking(watcher.poll)
+    except Exception as e:
+        logger.error(f"Error reloading knowledge: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Format a chatbot stream event as a Server-Sent Events frame"""
+    return f"event: {event['type']}\ndata: {dumps(event)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(message: Message, request: Request):
+    """Handle chat messages, streaming tokens as Server-Sent Events"""
+    bot = require_bot()
+    reservation = admit_chat(bot, client_address(request))
+    session_id = get_session_id(request)
+    trace_id = get_trace_id(request)
+
+    async def event_stream():
+        async for event in bot.process_message_stream(message.text, session_id, trace_id=trace_id,
+                                                      degraded=reservation.degraded, reservation=reservation):
+            yield format_sse(event)
+
+    # The background task also releases the reservation if the stream never ran
+    response = StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", TRACE_HEADER: trace_id},
+        background=BackgroundTask(reservation.release)
     )
+    attach_session(response, session_id)
+    return response
+
+@app.post("/chat/batch")
+async def chat_batch(batch: BatchMessages, request: Request):
+    """
+    Answer many independent messages, streaming results as NDJSON
+    
+    One JSON object per line: a "result" per message as it finishes (with
+    its index in the request) and a final "summary". No session history is
+    used or changed.
+    """
+    bot = require_bot()
+    if len(batch.messages) > bot.config.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {len(batch.messages)} messages exceeds {bot.config.BATCH_MAX_ITEMS}"
+        )
+    trace_id = get_trace_id(request)
+
+    async def lines():
+        async for result in bot.process_messages(batch.messages, trace_id=trace_id):
+            yield dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={TRACE_HEADER: trace_id})
+
+def require_tenant(tenant: str) -> Chatbot:
+    """Return the root bot if the tenant exists, or answer 404 (503 while starting)"""
+    root = require_bot()
+    try:
+        tenants.directory(tenant)
+    except UnknownTenant:
+        raise HTTPException(status_code=404, detail=f"Unknown tenant {tenant}")
+    return root
+
+def tenant_session(tenant: str, session_id: str) -> str:
+    """History key of a tenant session; tenants share the history store"""
+    return f"{tenant}:{session_id}"
+
+@app.post("/t/{tenant}/chat")
+async def tenant_chat(tenant: str, message: Message, request: Request, response: Response):
+    """Handle chat messages against a tenant's knowledge base, loading it on first use"""
+    try:
+        root = require_tenant(tenant)
+        # The generation queue is shared, so admission is decided globally
+        with admit_chat(root, client_address(request)) as reservation:
+            session_id = get_session_id(request)
+            trace_id = get_trace_id(request)
+            attach_session(response, session_id)
+            response.headers[TRACE_HEADER] = trace_id
+
+            async def answer():
+                async with tenants.use(tenant) as tenant_bot:
+                    return await tenant_bot.process_message(
+                        message.text, tenant_session(tenant, session_id), trace_id=trace_id,
+                        degraded=reservation.degraded, reservation=reservation
+                    )
+
+            return await cancel_on_disconnect(request, answer())
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing message for tenant {tenant}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/t/{tenant}/chat/stream")
+async def tenant_chat_stream(tenant: str, message: Message, request: Request):
+    """Handle a tenant's chat messages, streaming tokens as Server-Sent Events"""
+    root = require_tenant(tenant)
+    reservation = admit_chat(root, client_address(request))
+    session_id = get_session_id(request)
+    trace_id = get_trace_id(request)
+
+    async def event_stream():
+        # A cold tenant loads here, after the response has started
+        try:
+            async with tenants.use(tenant) as tenant_bot:
+                async for event in tenant_bot.process_message_stream(
+                        message.text, tenant_session(tenant, session_id), trace_id=trace_id,
+                        degraded=reservation.degraded, reservation=reservation):
+                    yield format_sse(event)
+        except Exception as e:
+            logger.error(f"Error loading tenant {tenant}: {str(e)}")
+            yield format_sse({"type": "error", "error": str(e), "trace_id": trace_id})
+
+    response = StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", TRACE_HEADER: trace_id},
+        background=BackgroundTask(reservation.release)
+    )
+    attach_session(response, session_id)
+    return response
+
+@app.post("/t/{tenant}/knowledge/reload")
+async def reload_tenant_knowledge(tenant: str):
+    """Re-sync a tenant's knowledge files, loading the tenant if needed"""
+    require_tenant(tenant)
+    try:
+        async with tenants.use(tenant) as tenant_bot:
+            return await tenant_bot.run_blocking(reload_tenant, tenant_bot)
+    except Exception as e:
+        logger.error(f"Error reloading knowledge of tenant {tenant}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Connections and chat messages over /ws/chat in this worker
+websocket_counts = {"open": 0, "connections": 0, "requests": 0}
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket):
+    """
+    Chat over one WebSocket for the whole conversation
+    
+    The client sends {"text": ...} frames, one message at a time. Each is
+    answered with the same events as /chat/stream, as JSON text frames,
+    ending with "done" or "error". The first frame tells the client its
+    session id; pass it back as ?session= to resume after a reconnect.
+    """
+    if not settings.WEBSOCKET_CHAT:
+        await websocket.close(code=1008)
+        return
+    session_id = (websocket.query_params.get("session") or websocket.headers.get(SESSION_HEADER)
+                  or websocket.cookies.get(SESSION_COOKIE) or uuid.uuid4().hex)
+    await websocket.accept()
+    if bot is None:
+        # 1013: try again later
+        await websocket.close(code=1013)
+        return
+
+    websocket_counts["open"] += 1
+    websocket_counts["connections"] += 1
+    WEBSOCKETS_OPEN.inc()
+    opened = time.perf_counter()
+    requests = 0
+    try:
+        await websocket.send_text(dumps({"type": "session", "session_id": session_id}))
+        while True:
+            try:
+                text = json.loads(await websocket.receive_text()).get("text")
+            except (ValueError, AttributeError):
+                text = None
+            if not isinstance(text, str) or not text.strip():
+                await websocket.send_text(dumps({"type": "error", "error": 'Expected {"text": "..."}'}))
+                continue
+
+            try:
+                reservation = admit_chat(bot, websocket.client.host if websocket.client else "unknown")
+            except HTTPException as e:
+                await websocket.send_text(dumps({
+                    "type": "error",
+                    "error": e.detail,
+                    "status": e.status_code,
+                    "retry_after": int(e.headers["Retry-After"])
+                }))
+                continue
+
+            requests += 1
+            websocket_counts["requests"] += 1
+            stream = bot.process_message_stream(text, session_id, trace_id=uuid.uuid4().hex[:16],
+                                                degraded=reservation.degraded, reservation=reservation)
+            try:
+                async for event in stream:
+                    await websocket.send_text(dumps(event))
+            finally:
+                # Cancels the generation if the client went away mid-answer
+                await stream.aclose()
+                reservation.release()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        websocket_counts["open"] -= 1
+        WEBSOCKETS_OPEN.dec()
+        WEBSOCKET_REQUESTS.observe(requests)
+        logger.info(
+            f"WebSocket of session {session_id} closed after {requests} requests "
+            f"in {time.perf_counter() - opened:.1f}s"
+        )
+
+def start_index_service(config: ChatbotConfig, timeout: float = 600.0) -> subprocess.Popen:
+    """
+    Start the shared index service and wait until it has ingested the knowledge base
+    
+    The service is the single leader that embeds documents; workers only
+    query it, so the index and the embedding model exist once.
+    """
+    # Resolved next to this file so the server can be started from any directory
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index_service.py")
+    process = subprocess.Popen([sys.executable, script])
+    url = f"http://127.0.0.1:{config.INDEX_SERVICE_PORT}/healthz"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Index service exited during startup")
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Index service did not become ready in time")
+
+if __name__ == "__main__":
+    config = ChatbotConfig()
+    index_service = None
+    if config.WORKERS > 1 and not config.INDEX_SERVICE_URL:
+        index_service = start_index_service(config)
+        # Workers inherit the environment and open a RemoteKnowledgeBase
+        os.environ["CHATBOT_INDEX_SERVICE_URL"] = f"http://127.0.0.1:{config.INDEX_SERVICE_PORT}"
+    try:
+        uvicorn.run(
+            "server:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=config.WORKERS,
+            timeout_keep_alive=config.HTTP_KEEP_ALIVE_SECONDS,
+            log_level="info"
+        )
+    finally:
+        if index_service is not None:
+            index_service.terminate()
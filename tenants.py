@@ -0,0 +1,232 @@
+# tenants.py
+import asyncio
+import os
+import re
+import time
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from chatbot import Chatbot, ChatbotConfig
+from knowledge_loader import KnowledgeManager
+from metrics import STAGE_SECONDS, Gauge, snapshot_gauge
+
+logger = logging.getLogger(__name__)
+
+TENANT_ID_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+class UnknownTenant(Exception):
+    """No tenant directory exists for the requested id"""
+
+def resident_bytes() -> int:
+    """Resident set size of this process, or 0 where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def tenant_config(config: ChatbotConfig, directory: str) -> ChatbotConfig:
+    """Settings of a tenant: its own knowledge files and index"""
+    return config.copy(update={
+        "KNOWLEDGE_DIR": os.path.join(directory, "knowledge"),
+        "KNOWLEDGE_BASE_DIR": os.path.join(directory, "index")
+    })
+
+def build_tenant_bot(root: Chatbot, name: str, directory: str) -> Chatbot:
+    """
+    Tenant bot sharing the root bot's client, queue and embedding model (blocking)
+
+    In multi-worker mode the index service is the only process writing
+    tenant indexes and holds the embedding model; the bot keeps just a
+    client for the tenant's routes there.
+    """
+    config = tenant_config(root.config, directory)
+    if root.config.INDEX_SERVICE_URL:
+        config = config.copy(update={"INDEX_SERVICE_URL": f"{root.config.INDEX_SERVICE_URL.rstrip('/')}/t/{name}"})
+        bot = Chatbot(config, shared=root)
+        try:
+            # Returns once the service has loaded the tenant
+            bot.knowledge_base.warm_up()
+        except Exception:
+            bot.close()
+            raise
+        return bot
+
+    bot = Chatbot(config, shared=root, embedding_function=root.knowledge_base.embedding_function)
+    try:
+        report = KnowledgeManager(bot).sync_directory(config.KNOWLEDGE_DIR)
+    except Exception:
+        bot.close()
+        raise
+    logger.info(f"Tenant {name}: {report['skipped']} chunks reused, {report['embedded']} embedded")
+    return bot
+
+def reload_tenant(bot: Chatbot) -> Dict[str, Any]:
+    """Re-sync a tenant bot's knowledge files, one file at a time (blocking)"""
+    if bot.config.INDEX_SERVICE_URL:
+        return bot.knowledge_base.reload()
+    return KnowledgeManager(bot).reload_directory(bot.config.KNOWLEDGE_DIR)
+
+class Tenant:
+    """A loaded tenant: what was built for it plus load cost and usage"""
+
+    def __init__(self, name: str, resource: Any, load_seconds: float, memory_bytes: int):
+        self.name = name
+        self.resource = resource
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+        self.active = 0
+        self.requests = 0
+        self.last_used = time.monotonic()
+
+class TenantManager:
+    """
+    Per-tenant resources, loaded on first use and evicted when idle
+
+    Tenant `name` lives in {tenants_dir}/{name}: its .txt files in
+    knowledge/ and its own collection in index/. On a tenant's first
+    request `build(name, directory)` runs on a worker thread; the server
+    builds tenant bots (build_tenant_bot), the index service tenant
+    indexes. Whatever is built must have a close() method.
+
+    The resident memory a tenant adds is measured as RSS growth while it
+    loads (loads are serialized so they do not blur each other). When the
+    loaded tenants together exceed memory_budget bytes, or there are more
+    than max_loaded of them, the least recently used idle tenants are
+    closed. Tenants with requests in flight are never evicted.
+    """
+
+    def __init__(self, build: Callable[[str, str], Any], tenants_dir: str, memory_budget: int = 0,
+                 max_loaded: int = 32, run_blocking: Optional[Callable] = None):
+        self.build = build
+        self.run_blocking = run_blocking or self._run_in_executor
+        self.tenants_dir = tenants_dir
+        self.memory_budget = memory_budget
+        self.max_loaded = max_loaded
+        self._tenants: "OrderedDict[str, Tenant]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._load_lock = asyncio.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def directory(self, name: str) -> str:
+        """Directory of an existing tenant, raising UnknownTenant otherwise"""
+        # Ids come from the URL; the pattern keeps them inside tenants_dir
+        if not TENANT_ID_RE.match(name):
+            raise UnknownTenant(name)
+        directory = os.path.join(self.tenants_dir, name)
+        if not os.path.isdir(os.path.join(directory, "knowledge")):
+            raise UnknownTenant(name)
+        return directory
+
+    @staticmethod
+    async def _run_in_executor(func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def _load(self, name: str) -> Tenant:
+        directory = self.directory(name)
+        async with self._load_lock:
+            before = resident_bytes()
+            start = time.perf_counter()
+            resource = await self.run_blocking(self.build, name, directory)
+            load_seconds = time.perf_counter() - start
+            memory = max(0, resident_bytes() - before)
+        tenant = Tenant(name, resource, load_seconds, memory)
+        self._tenants[name] = tenant
+        self.loads += 1
+        STAGE_SECONDS.observe(load_seconds, stage="tenant_load")
+        logger.info(f"Tenant {name} loaded in {load_seconds:.2f}s (+{memory / 2 ** 20:.1f} MB resident)")
+        self._evict(keep=name)
+        return tenant
+
+    async def get(self, name: str) -> Tenant:
+        """The loaded tenant, loading it first if needed"""
+        # Looped because another request may evict the tenant between the
+        # load finishing and this coroutine resuming
+        while name not in self._tenants:
+            # Concurrent first requests share one load, and a load outlives
+            # the request that started it, so what it built is never lost
+            task = self._loading.get(name)
+            if task is None:
+                task = self._loading[name] = asyncio.ensure_future(self._load(name))
+                task.add_done_callback(lambda _: self._loading.pop(name, None))
+            await asyncio.shield(task)
+        self._tenants.move_to_end(name)
+        return self._tenants[name]
+
+    @asynccontextmanager
+    async def use(self, name: str):
+        """Hold a tenant's resource for one request, protecting it from eviction"""
+        tenant = await self.get(name)
+        tenant.active += 1
+        tenant.requests += 1
+        try:
+            yield tenant.resource
+        finally:
+            tenant.active -= 1
+            tenant.last_used = time.monotonic()
+            self._evict()
+
+    def memory_bytes(self) -> int:
+        return sum(tenant.memory_bytes for tenant in self._tenants.values())
+
+    def _over_budget(self) -> bool:
+        return (len(self._tenants) > self.max_loaded > 0
+                or 0 < self.memory_budget < self.memory_bytes())
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Close least recently used idle tenants until within budget"""
+        for name in list(self._tenants):
+            if not self._over_budget():
+                return
+            tenant = self._tenants[name]
+            if tenant.active or name == keep:
+                continue
+            del self._tenants[name]
+            tenant.resource.close()
+            self.evictions += 1
+            logger.info(f"Evicted tenant {name} (idle {time.monotonic() - tenant.last_used:.0f}s, "
+                        f"{tenant.memory_bytes / 2 ** 20:.1f} MB)")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "loaded": len(self._tenants),
+            "memory_mb": round(self.memory_bytes() / 2 ** 20, 1),
+            "memory_budget_mb": round(self.memory_budget / 2 ** 20, 1),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "tenants": {
+                name: {
+                    "load_s": round(tenant.load_seconds, 3),
+                    "memory_mb": round(tenant.memory_bytes / 2 ** 20, 1),
+                    "requests": tenant.requests,
+                    "active": tenant.active,
+                    "idle_s": round(now - tenant.last_used, 1)
+                }
+                for name, tenant in self._tenants.items()
+            }
+        }
+
+    def collect_metrics(self) -> List[Any]:
+        """Per-tenant gauges for the /metrics endpoint"""
+        memory = Gauge("chatbot_tenant_memory_bytes", "Resident memory added by loading a tenant", ["tenant"])
+        load = Gauge("chatbot_tenant_load_seconds", "Cold load time of a loaded tenant", ["tenant"])
+        requests = Gauge("chatbot_tenant_requests", "Requests served since the tenant was loaded", ["tenant"])
+        for name, tenant in self._tenants.items():
+            memory.set(tenant.memory_bytes, tenant=name)
+            load.set(tenant.load_seconds, tenant=name)
+            requests.set(tenant.requests, tenant=name)
+        loaded = snapshot_gauge("chatbot_tenants", "Loaded tenants, loads and evictions",
+                                {"loaded": len(self._tenants), "loads": self.loads, "evictions": self.evictions},
+                                "field")
+        return [memory, load, requests, loaded]
+
+    def close(self) -> None:
+        for task in self._loading.values():
+            task.cancel()
+        for tenant in self._tenants.values():
+            tenant.resource.close()
+        self._tenants.clear()
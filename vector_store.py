@@ -0,0 +1,440 @@
+# vector_store.py
+import json
+import os
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DTYPES = {"int8": np.int8, "float16": np.float16}
+
+class NumpyVectorStore:
+    """
+    Quantized, memory-mapped vector store
+
+    Drop-in replacement for the parts of a Chroma collection that
+    KnowledgeBase uses (count/get/upsert/delete/query). Vectors are stored
+    as int8 (with a per-vector scale) or float16 in .npy files opened with
+    np.memmap, so they live in the page cache rather than the process heap.
+    Ids, texts and metadata live in a SQLite side table keyed by vector slot.
+
+    Search is an exact squared-L2 scan in blocks. With ivf_lists > 0, the
+    vectors are clustered with k-means once there are enough of them and a
+    query only scans the ivf_probes nearest clusters.
+
+    Not thread-safe for writes: KnowledgeBase calls upsert/delete under its
+    write lock and query/get under its read lock.
+    """
+
+    BLOCK_ROWS = 16384
+    MIN_ROWS_PER_LIST = 39  # Train IVF once every list would get this many vectors
+
+    def __init__(self, directory: str, name: str, dtype: str = "int8",
+                 ivf_lists: int = 0, ivf_probes: int = 8):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}, use one of {sorted(DTYPES)}")
+        self.dtype = dtype
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = ivf_probes
+        self.directory = os.path.join(directory, f"{name}.vectors")
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.directory, "chunks.sqlite3"), check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS chunks (
+                slot INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                document TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+
+        self.dim: Optional[int] = None
+        self._vectors: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._norms: Optional[np.memmap] = None
+        self._assign: Optional[np.memmap] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_rows = 0
+        self._load()
+
+    # Storage
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.npy")
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: Any) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _load(self) -> None:
+        stored_dtype = self._meta("dtype")
+        if stored_dtype is not None and stored_dtype != self.dtype:
+            logger.warning(f"Vector store holds {stored_dtype} vectors, {self.dtype} requested: starting empty")
+            self._reset()
+
+        slots = [row[0] for row in self._conn.execute("SELECT slot FROM chunks")]
+        self._high_water = max(slots) + 1 if slots else 0
+        self._active = np.zeros(max(self._high_water, 1), dtype=bool)
+        self._active[slots] = True
+        self._count = len(slots)
+        self._free = sorted(set(range(self._high_water)) - set(slots), reverse=True)
+
+        dim = self._meta("dim")
+        if slots and (dim is None or not os.path.exists(self._path("vectors"))):
+            logger.warning("Vector files are missing: starting empty")
+            self._reset()
+            return
+        if dim is not None and os.path.exists(self._path("vectors")):
+            self.dim = int(dim)
+            self._vectors = np.load(self._path("vectors"), mmap_mode="r+")
+            self._scales = np.load(self._path("scales"), mmap_mode="r+")
+            self._norms = np.load(self._path("norms"), mmap_mode="r+")
+            if self._vectors.shape[0] < self._high_water:
+                logger.warning("Vector file is shorter than the side table: starting empty")
+                self._reset()
+                return
+            if os.path.exists(self._path("centroids")) and os.path.exists(self._path("assign")):
+                centroids = np.load(self._path("centroids"))
+                if len(centroids) == self.ivf_lists:
+                    self._centroids = centroids
+                    self._assign = np.load(self._path("assign"), mmap_mode="r+")
+                    self._trained_rows = int(self._meta("trained_rows") or 0)
+                else:
+                    # Lists of another count cannot be probed, and with IVF off
+                    # upserts would leave them stale for a later reopen
+                    logger.info(f"Vector store has {len(centroids)} IVF lists, {self.ivf_lists} configured: "
+                                f"discarding them")
+                    self._drop_ivf()
+            # Train now if IVF was off or had another list count when saved
+            self._maybe_train_ivf()
+
+    def _reset(self) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM meta")
+        for name in ("vectors", "scales", "norms", "assign", "centroids"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        self.dim = None
+        self._vectors = self._scales = self._norms = self._assign = self._centroids = None
+        self._trained_rows = 0
+        self._high_water = 0
+        self._active = np.zeros(1, dtype=bool)
+        self._count = 0
+        self._free = []
+
+    def _grow(self, name: str, old: Optional[np.memmap], shape, dtype) -> np.memmap:
+        """Allocate a larger .npy memmap and copy the old contents over"""
+        tmp_path = self._path(f"{name}.tmp")
+        new = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+        if old is not None:
+            new[:old.shape[0]] = old
+            del old
+        new.flush()
+        os.replace(tmp_path, self._path(name))
+        return np.load(self._path(name), mmap_mode="r+")
+
+    def _ensure_capacity(self, rows: int) -> None:
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if rows > capacity:
+            capacity = max(rows, capacity * 2, 1024)
+            self._vectors = self._grow("vectors", self._vectors, (capacity, self.dim), DTYPES[self.dtype])
+            self._scales = self._grow("scales", self._scales, (capacity,), np.float32)
+            self._norms = self._grow("norms", self._norms, (capacity,), np.float32)
+            if self._assign is not None:
+                self._assign = self._grow("assign", self._assign, (capacity,), np.int32)
+        if rows > self._active.shape[0]:
+            active = np.zeros(max(rows, self._active.shape[0] * 2), dtype=bool)
+            active[:self._active.shape[0]] = self._active
+            self._active = active
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        self._high_water += 1
+        self._ensure_capacity(self._high_water)
+        return self._high_water - 1
+
+    def _quantize(self, vectors: np.ndarray):
+        """Return (codes, scales, squared norms of the dequantized vectors)"""
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+            restored = codes.astype(np.float32) * scales[:, None]
+        else:
+            scales = np.ones(len(vectors), dtype=np.float32)
+            codes = vectors.astype(np.float16)
+            restored = codes.astype(np.float32)
+        return codes, scales.astype(np.float32), np.einsum("ij,ij->i", restored, restored)
+
+    def _restore(self, slots: np.ndarray) -> np.ndarray:
+        return self._vectors[slots].astype(np.float32) * self._scales[slots][:, None]
+
+    # IVF
+
+    @staticmethod
+    def _nearest_centroid(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # ||v||^2 is the same for every centroid, so it can be left out
+        distances = np.einsum("ij,ij->i", centroids, centroids)[None, :] - 2 * vectors @ centroids.T
+        return distances.argmin(axis=1).astype(np.int32)
+
+    def _train_ivf(self, iterations: int = 10) -> None:
+        """Cluster the stored vectors with k-means and assign every slot to a list"""
+        active = np.flatnonzero(self._active[:self._high_water])
+        rng = np.random.default_rng(0)
+        sample = active if len(active) <= 256 * self.ivf_lists else \
+            np.sort(rng.choice(active, 256 * self.ivf_lists, replace=False))
+        data = self._restore(sample)
+        centroids = data[rng.choice(len(data), self.ivf_lists, replace=False)]
+        for _ in range(iterations):
+            labels = self._nearest_centroid(data, centroids)
+            for i in range(self.ivf_lists):
+                members = data[labels == i]
+                if len(members):
+                    centroids[i] = members.mean(axis=0)
+        self._centroids = centroids.astype(np.float32)
+
+        self._assign = self._grow("assign", None, (self._vectors.shape[0],), np.int32)
+        for start in range(0, self._high_water, self.BLOCK_ROWS):
+            slots = np.arange(start, min(start + self.BLOCK_ROWS, self._high_water))
+            self._assign[slots] = self._nearest_centroid(self._restore(slots), self._centroids)
+        self._assign.flush()
+        np.save(self._path("centroids"), self._centroids)
+        self._trained_rows = self._count
+        with self._db_lock, self._conn:
+            self._set_meta("trained_rows", self._trained_rows)
+        logger.info(f"IVF index trained with {self.ivf_lists} lists on {len(sample)} vectors")
+
+    def _drop_ivf(self) -> None:
+        for name in ("assign", "centroids"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        self._assign = self._centroids = None
+        self._trained_rows = 0
+        with self._db_lock, self._conn:
+            self._conn.execute("DELETE FROM meta WHERE key = 'trained_rows'")
+
+    def _maybe_train_ivf(self) -> None:
+        if self.ivf_lists <= 0 or self._count < self.ivf_lists * self.MIN_ROWS_PER_LIST:
+            return
+        # Retrain when the collection has doubled since the last training
+        if self._centroids is None or self._count > 2 * self._trained_rows:
+            self._train_ivf()
+
+    # Collection API
+
+    def count(self) -> int:
+        return self._count
+
+    def _select(self, query: str, params: Sequence[Any]) -> List[tuple]:
+        with self._db_lock:
+            return self._conn.execute(query, params).fetchall()
+
+    def _slots_of(self, ids: List[str]) -> Dict[str, int]:
+        found: Dict[str, int] = {}
+        # Stay below SQLite's bound-parameter limit
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            found.update(self._select(f"SELECT id, slot FROM chunks WHERE id IN ({placeholders})", part))
+        return found
+
+    def upsert(self, ids: List[str], embeddings: Sequence[Sequence[float]],
+               documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with self._db_lock, self._conn:
+                self._set_meta("dim", self.dim)
+                self._set_meta("dtype", self.dtype)
+        existing = self._slots_of(ids)
+        slots = []
+        for doc_id in ids:
+            slot = existing.get(doc_id)
+            if slot is None:
+                slot = self._allocate()
+                existing[doc_id] = slot
+                self._count += 1
+            slots.append(slot)
+        slots = np.asarray(slots)
+
+        codes, scales, norms = self._quantize(vectors)
+        self._vectors[slots] = codes
+        self._scales[slots] = scales
+        self._norms[slots] = norms
+        if self._assign is not None:
+            self._assign[slots] = self._nearest_centroid(vectors, self._centroids)
+        for array in (self._vectors, self._scales, self._norms, self._assign):
+            if array is not None:
+                array.flush()
+        self._active[slots] = True
+
+        rows = [(int(slot), doc_id, text, json.dumps(metadata or {}))
+                for slot, doc_id, text, metadata in zip(slots, ids, documents, metadatas)]
+        with self._db_lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (slot, id, document, metadata) VALUES (?, ?, ?, ?)", rows
+            )
+        self._maybe_train_ivf()
+
+    def delete(self, ids: List[str]) -> None:
+        slots = list(self._slots_of(ids).values())
+        if not slots:
+            return
+        with self._db_lock, self._conn:
+            self._conn.executemany("DELETE FROM chunks WHERE slot = ?", [(slot,) for slot in slots])
+        self._active[slots] = False
+        self._free.extend(slots)
+        self._count -= len(slots)
+
+    def _rows(self, rows: List[tuple], include: Sequence[str]) -> Dict[str, List[Any]]:
+        result: Dict[str, List[Any]] = {"ids": [row[1] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [row[2] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(row[3]) for row in rows]
+        return result
+
+    def get(self, ids: Optional[List[str]] = None, include: Sequence[str] = ("documents", "metadatas"),
+            limit: Optional[int] = None, offset: Optional[int] = None) -> Dict[str, List[Any]]:
+        if ids is not None:
+            rows: List[tuple] = []
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows.extend(self._select(
+                    f"SELECT slot, id, document, metadata FROM chunks WHERE id IN ({placeholders})", part
+                ))
+        else:
+            rows = self._select(
+                "SELECT slot, id, document, metadata FROM chunks ORDER BY slot LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset or 0)
+            )
+        return self._rows(rows, include)
+
+    def _candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Slots in the query's nearest IVF lists, or None to scan everything"""
+        if self._centroids is None or self._assign is None:
+            return None
+        probes = min(self.ivf_probes, len(self._centroids))
+        nearest = np.argsort(((self._centroids - query) ** 2).sum(axis=1))[:probes]
+        in_lists = np.isin(self._assign[:self._high_water], nearest)
+        return np.flatnonzero(in_lists & self._active[:self._high_water])
+
+    def _top_k(self, query: np.ndarray, n_results: int):
+        query_norm = float(query @ query)
+        candidates = self._candidates(query)
+        best_slots = np.empty(0, dtype=np.int64)
+        best_distances = np.empty(0, dtype=np.float32)
+
+        total = self._high_water if candidates is None else len(candidates)
+        for start in range(0, total, self.BLOCK_ROWS):
+            end = min(start + self.BLOCK_ROWS, total)
+            if candidates is None:
+                slots = np.arange(start, end)
+                codes = self._vectors[start:end]
+            else:
+                slots = candidates[start:end]
+                codes = self._vectors[slots]
+            dots = (codes.astype(np.float32) @ query) * self._scales[slots]
+            distances = query_norm + self._norms[slots] - 2 * dots
+            distances[~self._active[slots]] = np.inf
+
+            best_slots = np.concatenate([best_slots, slots])
+            best_distances = np.concatenate([best_distances, distances])
+            if len(best_slots) > n_results:
+                keep = np.argpartition(best_distances, n_results)[:n_results]
+                best_slots, best_distances = best_slots[keep], best_distances[keep]
+
+        order = np.argsort(best_distances)
+        order = order[np.isfinite(best_distances[order])]
+        return best_slots[order], np.maximum(best_distances[order], 0.0)
+
+    def _top_k_many(self, queries: np.ndarray, n_results: int):
+        """Exact top-k of several queries in a single pass over the vectors"""
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+        best_slots = np.empty((0, len(queries)), dtype=np.int64)
+        best_distances = np.empty((0, len(queries)), dtype=np.float32)
+
+        for start in range(0, self._high_water, self.BLOCK_ROWS):
+            end = min(start + self.BLOCK_ROWS, self._high_water)
+            dots = (self._vectors[start:end].astype(np.float32) @ queries.T) * self._scales[start:end, None]
+            distances = query_norms + self._norms[start:end, None] - 2 * dots
+            distances[~self._active[start:end]] = np.inf
+
+            slots = np.broadcast_to(np.arange(start, end)[:, None], distances.shape)
+            best_slots = np.concatenate([best_slots, slots])
+            best_distances = np.concatenate([best_distances, distances])
+            if len(best_slots) > n_results:
+                keep = np.argpartition(best_distances, n_results, axis=0)[:n_results]
+                best_slots = np.take_along_axis(best_slots, keep, axis=0)
+                best_distances = np.take_along_axis(best_distances, keep, axis=0)
+
+        found = []
+        for column in range(len(queries)):
+            order = np.argsort(best_distances[:, column])
+            order = order[np.isfinite(best_distances[order, column])]
+            found.append((best_slots[order, column], np.maximum(best_distances[order, column], 0.0)))
+        return found
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 10,
+              include: Sequence[str] = ("documents", "metadatas", "distances")) -> Dict[str, List[List[Any]]]:
+        """
+        Nearest chunks of each query embedding
+
+        Without IVF, several queries share one scan of the vectors; with IVF
+        each query scans its own partitions.
+        """
+        result: Dict[str, List[List[Any]]] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        if self._vectors is None or not self._count:
+            found = [(np.empty(0, dtype=np.int64), np.empty(0))] * len(queries)
+        elif self._centroids is None and len(queries) > 1:
+            found = self._top_k_many(queries, n_results)
+        else:
+            found = [self._top_k(query, n_results) for query in queries]
+
+        # One lookup for the chunks of all queries
+        wanted = list(dict.fromkeys(int(slot) for slots, _ in found for slot in slots))
+        by_slot = {}
+        for i in range(0, len(wanted), 500):
+            part = wanted[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            for row in self._select(
+                f"SELECT slot, id, document, metadata FROM chunks WHERE slot IN ({placeholders})", part
+            ):
+                by_slot[row[0]] = row
+
+        for slots, distances in found:
+            rows = [by_slot[int(slot)] for slot in slots if int(slot) in by_slot]
+            chunks = self._rows(rows, include)
+            result["ids"].append(chunks["ids"])
+            result["documents"].append(chunks.get("documents", []))
+            result["metadatas"].append(chunks.get("metadatas", []))
+            result["distances"].append([float(d) for slot, d in zip(slots, distances) if int(slot) in by_slot])
+        return result
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """Bytes of vector data on disk (mapped) and of in-process bookkeeping"""
+        mapped = sum(a.nbytes for a in (self._vectors, self._scales, self._norms, self._assign) if a is not None)
+        heap = self._active.nbytes + (self._centroids.nbytes if self._centroids is not None else 0)
+        return {"mapped": mapped, "heap": heap}
+
+    def close(self) -> None:
+        for array in (self._vectors, self._scales, self._norms, self._assign):
+            if array is not None:
+                array.flush()
+        with self._db_lock:
+            self._conn.close()